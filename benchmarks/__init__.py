@@ -0,0 +1,2 @@
+# Synthetic datasets (datagen.py) and the timing suite (runner.py). The
+# bench_*.py scripts next to them are still run directly as scripts.
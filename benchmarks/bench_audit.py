@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from audit import AuditStore
+
+ACTIONS = ['login', 'retrieve_patient', 'add_patient', 'remove_patient', 'count_visits', 'view_note',
+           'generate_statistics']
+ROLES = ['nurse', 'clinician', 'admin', 'management']
+
+
+def write_log(path, n_lines, n_users, start, seed=0, legacy_fraction=0.1):
+    # A mix of legacy "ts, user, role, action" lines and JSON lines, one
+    # second apart, written in blocks to keep generation fast.
+    rng = random.Random(seed)
+    users = [(f"U{i:05d}", rng.choice(ROLES)) for i in range(n_users)]
+    with open(path, 'w') as f:
+        block = []
+        for i in range(n_lines):
+            username, role = users[rng.randrange(n_users)]
+            action = rng.choice(ACTIONS)
+            timestamp = (start + timedelta(seconds=i)).isoformat()
+            if rng.random() < legacy_fraction:
+                block.append(f"{timestamp}, {username}, {role}, {action}\n")
+            else:
+                record = {'timestamp': timestamp, 'username': username, 'role': role, 'action': action,
+                          'duration_ms': round(rng.random() * 50, 3)}
+                if action == 'view_note':
+                    record['note_id'] = str(rng.randrange(100000))
+                block.append(json.dumps(record) + '\n')
+            if len(block) >= 100000:
+                f.write(''.join(block))
+                block = []
+        f.write(''.join(block))
+    return users
+
+
+def scan(path, note_id):
+    # What answering "who viewed note X" costs without the audit store.
+    needle = f'"note_id": "{note_id}"'
+    with open(path) as f:
+        return sum(1 for line in f if needle in line)
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit store ingestion and query latency")
+    parser.add_argument('--lines', type=int, default=50_000_000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--append', type=int, default=1000, help="Lines added before the incremental ingest")
+    args = parser.parse_args()
+
+    start = datetime(2024, 1, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, 'user_activity_log.txt')
+        # Half the history sits in a rotated file, as ActivityLogger leaves it.
+        _, generate = timed(write_log, log_path + '.1', args.lines // 2, args.users, start)
+        users, more = timed(write_log, log_path, args.lines - args.lines // 2, args.users,
+                            start + timedelta(seconds=args.lines // 2), seed=1)
+        generate += more
+        size = os.path.getsize(log_path) + os.path.getsize(log_path + '.1')
+
+        store = AuditStore(os.path.join(tmp, 'audit.db'))
+        added, ingest = timed(store.ingest, log_path)
+
+        with open(log_path, 'a') as f:
+            for i in range(args.append):
+                f.write(json.dumps({'timestamp': (start + timedelta(seconds=args.lines + i)).isoformat(),
+                                    'username': users[0][0], 'role': users[0][1], 'action': 'view_note',
+                                    'note_id': '42'}) + '\n')
+        appended, incremental = timed(store.ingest, log_path)
+
+        # The middle third of the history stands in for "last month".
+        month_start = start + timedelta(seconds=args.lines // 3)
+        month_end = start + timedelta(seconds=2 * args.lines // 3)
+        viewers, note_query = timed(store.summary, ('username',), action='view_note', note_id='42')
+        events, user_query = timed(store.query, username=users[1][0], since=month_start, until=month_end)
+        daily, per_day = timed(store.summary, ('username', 'day'), since=month_start, until=month_end)
+        matches, grep = timed(scan, log_path + '.1', '42')
+        store.close()
+        db_size = os.path.getsize(os.path.join(tmp, 'audit.db'))
+
+    print(f"log lines:                       {args.lines:,} ({size / 2 ** 20:,.0f} MiB, generated in {generate:.1f} s)")
+    print(f"full ingest:                     {ingest:8.1f} s ({added / ingest:,.0f} lines/s, db {db_size / 2 ** 20:,.0f} MiB)")
+    print(f"incremental ingest (+{appended:,}):    {incremental * 1000:8.1f} ms")
+    print(f"who viewed note 42:              {note_query * 1000:8.1f} ms ({len(viewers)} user(s))")
+    print(f"one user's events in a window:   {user_query * 1000:8.1f} ms ({len(events)} event(s))")
+    print(f"per user per day, window:        {per_day * 1000:8.1f} ms ({len(daily)} row(s))")
+    print(f"line scan of the rotated file:   {grep * 1000:8.1f} ms ({matches} match(es))")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from credentials import migrate
+from datagen import write_dataset
+
+CLI = os.path.join(SRC, 'cli.py')
+FINAL = os.path.join(SRC, 'FINAL_modularized.py')
+
+
+def run(command, stdin=None):
+    # Wall time of one process, start to exit.
+    t0 = time.perf_counter()
+    result = subprocess.run(command, input=stdin, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{result.stderr}")
+    return elapsed
+
+
+def median_run(repeat, command, stdin=None):
+    return statistics.median(run(command, stdin) for _ in range(repeat))
+
+
+def users_by_role():
+    users = {}
+    with open('./Credentials.csv', newline='') as f:
+        for row in csv.DictReader(f):
+            users.setdefault(row['role'], (row['username'], row['password']))
+    return users
+
+
+def cli(user, *args):
+    return [sys.executable, CLI, '-u', user[0], '-p', user[1], *args]
+
+
+def final(user):
+    return [sys.executable, FINAL, '-username', user[0], '-password', user[1]]
+
+
+def write_operations(path, count, patient_ids):
+    # Half new patients with a first visit, half visits for existing ones.
+    # New IDs start above any that datagen hands out.
+    with open(path, 'w') as f:
+        for i in range(count):
+            if i % 2:
+                operation = {'op': 'add_visit', 'patient_id': patient_ids[i % len(patient_ids)],
+                             'visit_time': '06/01/2023'}
+            else:
+                operation = {'op': 'add_patient', 'patient_id': str(10 ** 8 + i), 'gender': 'Female',
+                             'race': 'Asian', 'ethnicity': 'Hispanic', 'age': 40, 'zip_code': 53001,
+                             'insurance': 'Medicare', 'visit_time': '06/01/2023'}
+            f.write(json.dumps(operation) + '\n')
+
+
+def interactive_input(count, patient_ids):
+    # The same operations typed into FINAL_modularized.py's add_patient prompt.
+    lines = []
+    for i in range(count):
+        if i % 2:
+            lines += ['add_patient', patient_ids[i % len(patient_ids)], '06/01/2023']
+        else:
+            lines += ['add_patient', str(10 ** 8 + i), 'Female', 'Asian', 'Hispanic', '40', '53001', 'Medicare',
+                      '06/01/2023']
+    return '\n'.join(lines + ['stop']) + '\n'
+
+
+def fresh_copy(pristine, work):
+    os.chdir(pristine)
+    shutil.rmtree(work)
+    shutil.copytree(pristine, work)
+    os.chdir(work)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup and batch throughput of cli.py against FINAL_modularized.py")
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--batch', type=int, default=5000, help="Operations in the cli.py import file")
+    parser.add_argument('--interactive-batch', type=int, default=500,
+                        help="Operations typed into FINAL_modularized.py (slower, so fewer)")
+    parser.add_argument('--hashed', action='store_true', help="Log in through a hashed credential index")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        pristine = os.path.join(tmp, 'pristine')
+        write_dataset(pristine, args.patients, 10)
+        work = os.path.join(tmp, 'work')
+        shutil.copytree(pristine, work)
+        os.chdir(work)
+        try:
+            if args.hashed:
+                migrate('./Credentials.csv', './Credentials.idx')
+            users = users_by_role()
+            nurse, admin, management = users['nurse'], users['admin'], users['management']
+            with open('./Patient_data.csv', newline='') as f:
+                patient_ids = [row['Patient_ID'] for row in csv.DictReader(f)]
+            note_id = '100000'
+            # The last row is the worst case for get-patient, which scans.
+            patient_id = patient_ids[-1]
+            # Build the sidecar indexes once, as the first run of either tool would.
+            run(cli(nurse, 'get-note', note_id))
+            run(final(management))
+
+            rows = [('python -c pass', median_run(args.repeat, [sys.executable, '-c', 'pass']))]
+            rows += [
+                ('cli get-note', median_run(args.repeat, cli(nurse, 'get-note', note_id))),
+                ('cli get-patient', median_run(args.repeat, cli(nurse, 'get-patient', patient_id))),
+                ('cli count-visits', median_run(args.repeat, cli(admin, 'count-visits', '06/01/2023'))),
+                ('cli stats', median_run(args.repeat, cli(management, 'stats'))),
+                ('cli stats --group-by', median_run(args.repeat, cli(management, 'stats', '--group-by', 'gender'))),
+                ('FINAL view_note', median_run(args.repeat, final(nurse), f"view_note\n{note_id}\nstop\n")),
+                ('FINAL admin count', median_run(args.repeat, final(admin), "06/01/2023\n")),
+                ('FINAL management', median_run(args.repeat, final(management))),
+                ('cli add-visit', median_run(args.repeat, cli(nurse, 'add-visit', patient_id, '06/01/2023'))),
+            ]
+            base = rows[0][1]
+            print(f"{'startup (median of ' + str(args.repeat) + ')':26} {'wall ms':>10} {'minus python':>14}")
+            for name, seconds in rows:
+                print(f"{name:26} {seconds * 1000:10.0f} {(seconds - base) * 1000:14.0f}")
+
+            batches = []
+            fresh_copy(pristine, work)
+            write_operations('ops.jsonl', args.batch, patient_ids)
+            batches.append(('cli import', args.batch, run(cli(nurse, 'import', 'ops.jsonl'))))
+            fresh_copy(pristine, work)
+            stdin = interactive_input(args.interactive_batch, patient_ids)
+            batches.append(('FINAL interactive', args.interactive_batch, run(final(nurse), stdin)))
+            print(f"\n{'batch':26} {'ops':>8} {'seconds':>10} {'ops/s':>10}")
+            for name, count, seconds in batches:
+                print(f"{name:26} {count:8} {seconds:10.2f} {count / seconds:10.0f}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
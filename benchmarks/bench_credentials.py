@@ -0,0 +1,64 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import pandas as pd
+
+from classes import User
+from credentials import DEFAULT_ITERATIONS, CredentialIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login latency: hashed index vs Credentials.csv")
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--build-iterations', type=int, default=1,
+                        help="PBKDF2 iterations for the synthetic index (kept low so building 1M users is quick)")
+    parser.add_argument('--logins', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    users = [(f"U{i:07d}", f"P{rng.randrange(10 ** 7):07d}", rng.choice(['nurse', 'clinician', 'admin', 'management']))
+             for i in range(args.users)]
+    sample = rng.sample(users, min(args.logins, len(users)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'Credentials.csv')
+        index_path = os.path.join(tmp, 'Credentials.idx')
+        pd.DataFrame(users, columns=['username', 'password', 'role']).to_csv(csv_path)
+
+        t0 = time.perf_counter()
+        CredentialIndex.build(index_path, users, args.build_iterations)
+        build = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        user = User.from_csv(csv_path).get(sample[0][0])
+        assert user.authenticate(sample[0][1])
+        csv_login = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        index = CredentialIndex(index_path)
+        for username, password, role in sample:
+            assert index.verify(username, password) == role
+        index_login = (time.perf_counter() - t0) / len(sample)
+
+        t0 = time.perf_counter()
+        for username, _, _ in sample:
+            index.lookup(username)
+        lookup = (time.perf_counter() - t0) / len(sample)
+        index.close()
+
+    print(f"users:                     {args.users:,}")
+    print(f"index build:               {build:8.2f} s ({args.build_iterations} PBKDF2 iteration(s))")
+    print(f"CSV login (parse all):     {csv_login * 1000:8.1f} ms")
+    print(f"index verify:              {index_login * 1e6:8.1f} us")
+    print(f"index lookup only:         {lookup * 1e6:8.1f} us")
+    print(f"with the default {DEFAULT_ITERATIONS:,} iterations each verify adds the PBKDF2 cost on top of the lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from classes import Patient, PatientDatabase
+from datagen import write_patient_file
+from storage import CSVStore
+from visits import VisitStore
+
+
+def legacy_load(file_path):
+    df = pd.read_csv(file_path)
+    patients = {}
+    for _, row in df.iterrows():
+        patient = Patient(row['Patient_ID'], row['Gender'], row['Race'], row['Ethnicity'],
+                          row['Age'], row['Zip_code'], row['Insurance'])
+        for col in df.columns:
+            if col.startswith("Visit_ID"):
+                index = col.split("_")[-1]
+                patient.add_visit(row[col], row.get(f"Visit_time_{index}", ""))
+        patients[patient.patient_id] = patient
+    return patients
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Patient_data.csv load time")
+    parser.add_argument('--patients', type=int, default=100_000)
+    parser.add_argument('--visits', type=int, default=50)
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'Patient_data.csv')
+        write_patient_file(path, args.patients, args.visits)
+        db = PatientDatabase.__new__(PatientDatabase)
+        db.store = CSVStore(path)
+        db.visit_store = VisitStore()
+
+        t0 = time.perf_counter()
+        patients = db.load_patients()
+        vectorized = time.perf_counter() - t0
+        print(f"patients x visits:  {args.patients:,} x {args.visits}")
+        print(f"vectorized load:    {vectorized:8.2f} s")
+
+        if not args.skip_legacy:
+            t0 = time.perf_counter()
+            legacy = legacy_load(path)
+            elapsed = time.perf_counter() - t0
+            print(f"iterrows load:      {elapsed:8.2f} s  ({elapsed / vectorized:.1f}x slower)")
+            for pid in list(legacy)[:1000]:
+                assert [(v['Visit_ID'], v['Visit_time']) for v in legacy[pid].visits] == \
+                       [(v['Visit_ID'], v['Visit_time']) for v in patients[pid].visits]
+
+
+if __name__ == "__main__":
+    main()
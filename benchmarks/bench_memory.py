@@ -0,0 +1,87 @@
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from classes import PatientDatabase
+from datagen import write_patient_file
+from storage import CSVStore
+from visits import VisitStore
+
+
+class DictPatient:
+    # The previous representation: a regular object with a __dict__ and one
+    # {'Visit_ID', 'Visit_time'} dict per visit.
+    def __init__(self, patient_id, gender, race, ethnicity, age, zip_code, insurance):
+        self.patient_id = patient_id
+        self.gender = gender
+        self.race = race
+        self.ethnicity = ethnicity
+        self.age = age
+        self.zip_code = zip_code
+        self.insurance = insurance
+        self.visits = []
+
+
+def load_dicts(store):
+    patients = {}
+    for row, visits in store.load_patients():
+        patient = DictPatient(*row)
+        patient.visits = [{'Visit_ID': visit_id, 'Visit_time': visit_time} for visit_id, visit_time in visits]
+        patients[patient.patient_id] = patient
+    return patients
+
+
+def load_compact(store):
+    db = PatientDatabase.__new__(PatientDatabase)
+    db.store = store
+    db.visit_store = VisitStore()
+    return db.load_patients()
+
+
+def measure(loader, store):
+    # Bytes still allocated once loading is done, i.e. what the patients keep.
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    patients = loader(store)
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return patients, retained, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory held by dict-based vs array-backed patients")
+    parser.add_argument('--patients', type=int, default=100_000)
+    parser.add_argument('--visits', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'Patient_data.csv')
+        write_patient_file(path, args.patients, args.visits)
+        store = CSVStore(path)
+
+        results = []
+        for name, loader in (('dict visits', load_dicts), ('array visits', load_compact)):
+            patients, retained, peak, elapsed = measure(loader, store)
+            results.append((name, retained, peak, elapsed))
+            del patients
+        store.close()
+
+    visits = args.patients * args.visits
+    print(f"patients x visits: {args.patients:,} x {args.visits} ({visits:,} visits)")
+    for name, retained, peak, elapsed in results:
+        print(f"{name:13}  retained {retained / 2 ** 20:8.1f} MiB ({retained / visits:5.1f} B/visit)  "
+              f"peak {peak / 2 ** 20:8.1f} MiB  load {elapsed:6.2f} s")
+    print(f"reduction:     {results[0][1] / results[1][1]:.1f}x less retained memory")
+
+
+if __name__ == "__main__":
+    main()
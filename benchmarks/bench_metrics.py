@@ -0,0 +1,77 @@
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import metrics
+from classes import PatientDatabase
+from datagen import write_dataset
+
+
+def per_call(func, number):
+    # Best of five, in nanoseconds per call.
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def noop():
+    pass
+
+
+def with_timer():
+    with metrics.timed('bench.with'):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of the metrics instrumentation, disabled and enabled")
+    parser.add_argument('--calls', type=int, default=200_000)
+    parser.add_argument('--patients', type=int, default=5000)
+    parser.add_argument('--max-overhead-ns', type=float, default=500,
+                        help="Fail when a disabled @timed adds more than this per call")
+    args = parser.parse_args()
+
+    decorated = metrics.timed('bench.noop')(noop)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dataset(tmp, args.patients, 10)
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            db = PatientDatabase('./Patient_data.csv')
+            db.visit_index()
+            cases = [
+                ('empty function', noop, decorated),
+                ('with timed()', noop, with_timer),
+                ('count_visits_on_date', lambda: PatientDatabase.count_visits_on_date.__wrapped__(db, '06/01/2023'),
+                 lambda: db.count_visits_on_date('06/01/2023')),
+                ('get_note_by_id', lambda: PatientDatabase.get_note_by_id.__wrapped__(db, '100000'),
+                 lambda: db.get_note_by_id('100000')),
+            ]
+            for name, plain, instrumented in cases:
+                calls = args.calls if name in ('empty function', 'with timed()') else args.calls // 10
+                metrics.enable(False)
+                base = per_call(plain, calls)
+                off = per_call(instrumented, calls)
+                metrics.enable(True)
+                on = per_call(instrumented, calls)
+                metrics.enable(False)
+                rows.append((name, base, off, on))
+            # The decorator is what sits on the hot paths; the context manager
+            # is only used around once-per-load steps.
+            failed = rows[0][2] - rows[0][1] > args.max_overhead_ns
+        finally:
+            os.chdir(cwd)
+
+    print(f"{'':22} {'plain':>10} {'disabled':>10} {'enabled':>10}   (ns per call)")
+    for name, base, off, on in rows:
+        print(f"{name:22} {base:10.0f} {off:10.0f} {on:10.0f}   disabled adds {off - base:+.0f} ns")
+    if failed:
+        print(f"FAIL: a disabled @timed added more than {args.max_overhead_ns:.0f} ns per call")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
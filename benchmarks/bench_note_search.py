@@ -0,0 +1,73 @@
+import argparse
+import csv
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from datagen import write_dataset, write_notes
+from note_search import NoteSearch
+
+QUERIES = [
+    ('term', 'hydrocephalus'),
+    ('OR', 'hydrocephalus OR chordoma'),
+    ('AND', 'hydrocephalus AND pain'),
+    ('NOT', 'chordoma NOT spinal'),
+    ('phrase', '"spinal fluid"'),
+    ('prefix', 'mening*'),
+]
+
+
+def scan(path, term):
+    # Linear baseline: read every note and look for the word.
+    with open(path, newline='') as f:
+        return sum(1 for row in csv.DictReader(f) if term in row['Note_text'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Note search query latency")
+    parser.add_argument('--notes', type=int, default=200_000)
+    parser.add_argument('--append', type=int, default=1000, help="Notes appended before the incremental sync")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'Notes.csv')
+        # Every query term is one of datagen's medical terms, each of which
+        # appears in about one note in seventy.
+        patient_visits = write_dataset(tmp, max(args.notes // 20, 1), 2, args.notes)
+        size = os.path.getsize(path)
+
+        index = NoteSearch(path)
+        t0 = time.perf_counter()
+        index.sync()
+        build = time.perf_counter() - t0
+
+        write_notes(path, patient_visits, args.append, start=args.notes, mode='a')
+        t0 = time.perf_counter()
+        appended = index.sync()
+        incremental = time.perf_counter() - t0
+
+        print(f"notes:             {args.notes:,} ({size / 2 ** 20:,.0f} MiB)")
+        print(f"index build:       {build:8.1f} s (index {os.path.getsize(index.index_path) / 2 ** 20:,.0f} MiB)")
+        print(f"incremental sync:  {incremental * 1000:8.1f} ms for {appended:,} appended note(s)")
+        for name, query in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                results = index.search(query)
+                timings.append(time.perf_counter() - t0)
+            print(f"{name:18} {statistics.median(timings) * 1000:8.2f} ms median ({len(results)} result(s), "
+                  f"query {query})")
+        index.close()
+
+        t0 = time.perf_counter()
+        matches = scan(path, 'hydrocephalus')
+        print(f"linear scan:       {(time.perf_counter() - t0) * 1000:8.1f} ms ({matches} match(es))")
+
+
+if __name__ == "__main__":
+    main()
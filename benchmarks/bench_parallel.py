@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from datagen import write_patient_file
+from parallel import count_days
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel visit statistics scaling")
+    parser.add_argument('--patients', type=int, default=200_000)
+    parser.add_argument('--visits', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--partition-mb', type=float, default=8.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'Patient_data.csv')
+        write_patient_file(path, args.patients, args.visits)
+        size = os.path.getsize(path) / 2 ** 20
+        print(f"file: {size:.1f} MiB, {args.patients * args.visits:,} visits, {os.cpu_count()} CPU(s)")
+        baseline = None
+        expected = None
+        for workers in args.workers:
+            t0 = time.perf_counter()
+            counts = count_days(path, workers, int(args.partition_mb * 2 ** 20))
+            elapsed = time.perf_counter() - t0
+            if expected is None:
+                expected, baseline = counts, elapsed
+            assert counts == expected, f"{workers} worker(s) gave different counts"
+            visits = sum(counts.values())
+            print(f"{workers:2d} worker(s): {elapsed:7.2f} s  {visits / elapsed / 1e6:6.2f} M visits/s  "
+                  f"{size / elapsed:7.1f} MiB/s  speedup {baseline / elapsed:4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
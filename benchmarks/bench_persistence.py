@@ -0,0 +1,54 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from classes import PatientDatabase
+from datagen import write_patient_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Journal appends vs full rewrites")
+    parser.add_argument('--patients', type=int, default=20_000)
+    parser.add_argument('--visits', type=int, default=10)
+    parser.add_argument('--writes', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'Patient_data.csv')
+        write_patient_file(path, args.patients, args.visits)
+        shutil.copy(path, path + '.orig')
+        open(os.path.join(tmp, 'Notes.csv'), 'w').write(",Patient_ID,Visit_ID,Note_ID,Note_text\n")
+        os.chdir(tmp)
+
+        db = PatientDatabase(path, compact_every=args.writes + 1)
+        patient_ids = list(db.patients)
+        t0 = time.perf_counter()
+        for i in range(args.writes):
+            db.add_visit(patient_ids[i % len(patient_ids)], f"J{i}", "01/02/2024")
+        journal = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        db.compact()
+        compact = time.perf_counter() - t0
+
+        shutil.copy(path + '.orig', path)
+        db = PatientDatabase(path)
+        rewrites = max(args.writes // 20, 1)
+        t0 = time.perf_counter()
+        for i in range(rewrites):
+            db.patients[patient_ids[i]].add_visit(f"R{i}", "01/02/2024")
+            db.save_patient_data()
+        rewrite = time.perf_counter() - t0
+
+    print(f"database:            {args.patients:,} patients x {args.visits} visits")
+    print(f"journal append:      {args.writes / journal:10.1f} writes/s")
+    print(f"full rewrite:        {rewrites / rewrite:10.1f} writes/s")
+    print(f"one compaction:      {compact * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from datagen import write_dataset
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+class Client:
+    # One keep-alive HTTP/1.1 connection.
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.token = None
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, method, path, body=None):
+        data = b'' if body is None else json.dumps(body).encode('utf-8')
+        headers = f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(data)}\r\n"
+        if self.token is not None:
+            headers += f"Authorization: Bearer {self.token}\r\n"
+        self.writer.write(headers.encode('latin-1') + b'\r\n' + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        payload = json.loads(await self.reader.readexactly(length))
+        return status, payload
+
+    def close(self):
+        self.writer.close()
+
+
+def make_workload(rng, patient_ids, note_ids, write_share):
+    day = f"{rng.randrange(1, 13):02d}/{rng.randrange(1, 29):02d}/{rng.randrange(2020, 2025)}"
+    roll = rng.random()
+    if roll < write_share:
+        return 'add_visit', 'POST', f"/patients/{rng.choice(patient_ids)}/visits", {'visit_time': day}
+    roll = (roll - write_share) / (1 - write_share)
+    if roll < 0.5:
+        return 'get_patient', 'GET', f"/patients/{rng.choice(patient_ids)}", None
+    if roll < 0.75:
+        return 'count_visits', 'GET', f"/visits/count?date={day}", None
+    return 'get_note', 'GET', f"/notes/{rng.choice(note_ids)}", None
+
+
+async def run_client(host, port, seed, deadline, patient_ids, note_ids, write_share, latencies):
+    rng = random.Random(seed)
+    client = await Client.connect(host, port)
+    _, payload = await client.request('POST', '/login', {'username': 'bench', 'password': 'bench'})
+    client.token = payload['token']
+    while time.perf_counter() < deadline:
+        name, method, path, body = make_workload(rng, patient_ids, note_ids, write_share)
+        t0 = time.perf_counter()
+        status, _ = await client.request(method, path, body)
+        latencies.setdefault(name, []).append(time.perf_counter() - t0)
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} returned {status}")
+    client.close()
+
+
+async def load_test(host, port, args, patient_ids, note_ids):
+    latencies = {}
+    deadline = time.perf_counter() + args.duration
+    t0 = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, seed, deadline, patient_ids, note_ids, args.write_share,
+                                      latencies)
+                           for seed in range(args.concurrency)))
+    return latencies, time.perf_counter() - t0
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for server.py: p50/p99 latency and requests per second")
+    parser.add_argument('--patients', type=int, default=100_000)
+    parser.add_argument('--visits', type=int, default=10)
+    parser.add_argument('--notes', type=int, default=50_000)
+    parser.add_argument('--concurrency', type=int, default=16, help="Simultaneous keep-alive connections")
+    parser.add_argument('--duration', type=float, default=15.0, help="Seconds to run")
+    parser.add_argument('--write-share', type=float, default=0.1, help="Fraction of requests that add a visit")
+    parser.add_argument('--server-workers', type=int, default=4)
+    parser.add_argument('--compact-every', type=int, default=50000, help="Passed to server.py")
+    parser.add_argument('--port', type=int, default=8099)
+    args = parser.parse_args()
+
+    host = '127.0.0.1'
+    with tempfile.TemporaryDirectory() as tmp:
+        patient_visits = write_dataset(tmp, args.patients, args.visits, args.notes)
+        with open(os.path.join(tmp, 'Credentials.csv'), 'w') as f:
+            f.write("username,password,role\nbench,bench,nurse\n")
+        server = subprocess.Popen([sys.executable, os.path.join(SRC, 'server.py'), '--host', host,
+                                   '--port', str(args.port), '--workers', str(args.server_workers),
+                                   '--compact-every', str(args.compact_every)],
+                                  cwd=tmp, stdout=subprocess.PIPE, text=True)
+        try:
+            t0 = time.perf_counter()
+            server.stdout.readline()
+            startup = time.perf_counter() - t0
+            patient_ids = list(patient_visits)
+            note_ids = [str(100000 + i) for i in range(args.notes)]
+            latencies, elapsed = asyncio.run(load_test(host, args.port, args, patient_ids, note_ids))
+        finally:
+            server.terminate()
+            server.wait()
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"data:        {args.patients:,} patients x {args.visits} visits, {args.notes:,} notes "
+          f"(server ready in {startup:.1f} s)")
+    print(f"load:        {args.concurrency} connections for {elapsed:.1f} s, {args.write_share:.0%} writes, "
+          f"{os.cpu_count()} CPU(s) shared by client and server")
+    print(f"throughput:  {total / elapsed:,.0f} requests/s ({total:,} requests)")
+    everything = [value for values in latencies.values() for value in values]
+    for name, values in sorted(latencies.items()) + [('all', everything)]:
+        print(f"{name:13} p50 {statistics.median(values) * 1000:7.2f} ms   "
+              f"p99 {percentile(values, 0.99) * 1000:7.2f} ms   max {max(values) * 1000:8.1f} ms   "
+              f"({len(values):,} requests)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from classes import PatientDatabase
+from datagen import write_patient_file
+from streaming import StreamingStatistics
+
+
+def measure(fn):
+    # Timings are taken under tracemalloc, which slows allocation-heavy code.
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def in_memory(path):
+    return PatientDatabase(path).visits_per_day()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming vs in-memory visit statistics")
+    parser.add_argument('--patients', type=int, default=100_000)
+    parser.add_argument('--visits', type=int, default=20)
+    parser.add_argument('--chunksize', type=int, default=20_000)
+    parser.add_argument('--budget-mb', type=float, default=200.0,
+                        help="Fail if the streaming peak exceeds this many MiB")
+    parser.add_argument('--skip-in-memory', action='store_true',
+                        help="Only run the streaming path (for files too big to load)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'Patient_data.csv')
+        write_patient_file(path, args.patients, args.visits)
+        size = os.path.getsize(path) / 2 ** 20
+        open(os.path.join(tmp, 'Notes.csv'), 'w').write(",Patient_ID,Visit_ID,Note_ID,Note_text\n")
+        os.chdir(tmp)
+
+        streamed, stream_time, stream_peak = measure(
+            lambda: StreamingStatistics(path, args.chunksize).visits_per_day())
+        if not args.skip_in_memory:
+            loaded, load_time, load_peak = measure(lambda: in_memory(path))
+            assert streamed == loaded, "streaming and in-memory results differ"
+
+    print(f"file:        {size:8.1f} MiB ({args.patients:,} patients x {args.visits} visits)")
+    if not args.skip_in_memory:
+        print(f"in-memory:   {load_time:8.2f} s   peak {load_peak:8.1f} MiB")
+    print(f"streaming:   {stream_time:8.2f} s   peak {stream_peak:8.1f} MiB (chunksize {args.chunksize:,})")
+    if stream_peak > args.budget_mb:
+        print(f"streaming peak exceeds the {args.budget_mb} MiB budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
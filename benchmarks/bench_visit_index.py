@@ -0,0 +1,77 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from classes import Patient
+from visit_index import VisitIndex
+from visits import VisitStore
+
+
+def make_patients(n_visits, visits_per_patient, seed=0):
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    patients = {}
+    store = VisitStore()
+    for pid in range(n_visits // visits_per_patient):
+        patient = Patient(pid, 'Female', 'White', 'Hispanic', 40, 53703, 'Medicare', visit_store=store)
+        for _ in range(visits_per_patient):
+            day = start + timedelta(days=rng.randrange(5 * 365))
+            patient.add_visit(rng.randrange(10 ** 6), day.strftime("%m/%d/%Y") + " 09:30")
+        patients[pid] = patient
+    return patients
+
+
+def legacy_count(values, target_date):
+    count = 0
+    for val in values:
+        try:
+            if datetime.strptime(val.split()[0], "%m/%d/%Y").strftime("%m/%d/%Y") == target_date:
+                count += 1
+        except ValueError:
+            continue
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Visit index vs per-query scan")
+    parser.add_argument('--visits', type=int, default=1_000_000)
+    parser.add_argument('--per-patient', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+
+    patients = make_patients(args.visits, args.per_patient)
+    values = [v['Visit_time'] for p in patients.values() for v in p.visits]
+    target = "06/15/2022"
+
+    t0 = time.perf_counter()
+    expected = legacy_count(values, target)
+    legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    index = VisitIndex.from_patients(patients)
+    build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(args.queries):
+        got = index.count_on(target)
+    query = (time.perf_counter() - t0) / args.queries
+    assert got == expected, (got, expected)
+
+    t0 = time.perf_counter()
+    index.daily_counts()
+    histogram = time.perf_counter() - t0
+
+    print(f"visits:              {len(values):,}")
+    print(f"legacy scan/query:   {legacy * 1000:10.1f} ms")
+    print(f"index build (once):  {build * 1000:10.1f} ms")
+    print(f"index count_on:      {query * 1e6:10.1f} us  ({legacy / query:,.0f}x)")
+    print(f"index daily_counts:  {histogram * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import csv
+import os
+import random
+import sys
+from datetime import date, datetime, time, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from utils import generate_random_id
+
+# Category values as they appear in data/Patient_data.csv.
+GENDERS = ['Male', 'Female', 'Non-binary']
+RACES = ['White', 'Black', 'Asian', 'Native American', 'Pacific Islanders', 'Unknown']
+ETHNICITIES = ['Hispanic', 'Non-Hispanic']
+INSURANCES = ['Medicare', 'Medicaid', 'Blueshield', 'Not Available']
+ROLES = ['admin', 'management', 'nurse', 'clinician']
+TERMS = ['patient', 'history', 'pain', 'fever', 'normal', 'follow', 'up', 'admitted', 'discharged',
+         'surgery', 'fluid', 'spinal', 'tumour', 'shunt', 'infection', 'antibiotics', 'day', 'week',
+         'hydrocephalus', 'chordoma', 'meningioma', 'pressure', 'drain', 'culture', 'negative', 'positive']
+END_DATE = date(2024, 12, 31)
+
+
+# (format, weight) of the visit times written with messy=True. None leaves
+# the time blank. The formats are the ones dates.py reads.
+MESSY_FORMATS = [("%m/%d/%Y", 70), ("%m/%d/%Y %H:%M", 10), ("%Y-%m-%d", 10), ("%Y-%m-%d %H:%M:%S", 5), (None, 5)]
+
+
+def write_patients(path, n_patients, n_visits, years=5, end_date=END_DATE, messy=False):
+    # Every patient gets n_visits visits spread over the `years` years up to
+    # end_date. With messy=True, visit times come in mixed formats, some are
+    # blank, and one patient in ten has fewer visits, leaving empty slots.
+    # Returns {patient_id: [visit_id, ...]} for write_notes.
+    first_day = end_date - timedelta(days=365 * years - 1)
+    patient_ids = random.sample(range(10000, 10000 + 10 * n_patients), n_patients)
+    formats, weights = zip(*MESSY_FORMATS)
+    visits = {}
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        header = ['Patient_ID', 'Gender', 'Race', 'Ethnicity', 'Age', 'Zip_code', 'Insurance']
+        for idx in range(1, n_visits + 1):
+            header += [f"Visit_ID_{idx}", f"Visit_time_{idx}"]
+        writer.writerow(header)
+        for patient_id in patient_ids:
+            row = [patient_id, random.choice(GENDERS), random.choice(RACES), random.choice(ETHNICITIES),
+                   random.randrange(1, 100), random.randrange(53000, 54000), random.choice(INSURANCES)]
+            count = random.randrange(n_visits + 1) if messy and random.random() < 0.1 else n_visits
+            visit_ids = [random.randrange(100000, 10 ** 6) for _ in range(count)]
+            for visit_id in visit_ids:
+                day = first_day + timedelta(days=random.randrange(365 * years))
+                if messy:
+                    fmt = random.choices(formats, weights)[0]
+                    moment = datetime.combine(day, time(random.randrange(8, 18), random.randrange(60)))
+                    row += [visit_id, moment.strftime(fmt) if fmt else '']
+                else:
+                    row += [visit_id, day.strftime("%m/%d/%Y")]
+            row += ['', ''] * (n_visits - count)
+            writer.writerow(row)
+            visits[patient_id] = visit_ids
+    return visits
+
+
+def write_notes(path, visits, n_notes, words_per_note=70, start=0, mode='w'):
+    # Each note belongs to a visit of a generated patient. Note IDs are
+    # numbers, as in data/Notes.csv, and the leading column is the index
+    # pandas wrote out. mode='a' with start past the existing notes appends.
+    vocabulary = TERMS + [generate_random_id().lower() for _ in range(5000)]
+    patient_ids = list(visits)
+    with open(path, mode, newline='') as f:
+        writer = csv.writer(f)
+        if mode == 'w':
+            writer.writerow(['', 'Patient_ID', 'Visit_ID', 'Note_ID', 'Note_text'])
+        for i in range(start, start + n_notes):
+            patient_id = random.choice(patient_ids)
+            visit_id = random.choice(visits[patient_id]) if visits[patient_id] else ''
+            words = random.choices(vocabulary, k=max(1, int(random.gauss(words_per_note, words_per_note / 3))))
+            writer.writerow([i, patient_id, visit_id, 100000 + i, ' '.join(words) + '.'])
+
+
+def write_credentials(path, n_users):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['', 'username', 'password', 'role'])
+        for i in range(n_users):
+            writer.writerow([i, generate_random_id(), generate_random_id(), ROLES[i % len(ROLES)]])
+
+
+def write_dataset(directory, patients=10000, visits=10, notes=None, words_per_note=70, users=100, seed=0,
+                  messy=False):
+    # Writes Patient_data.csv, Notes.csv and Credentials.csv into directory
+    # and returns {patient_id: [visit_id, ...]}. generate_random_id draws
+    # from the module-level generator, so seeding it makes the whole dataset
+    # reproducible.
+    random.seed(seed)
+    os.makedirs(directory, exist_ok=True)
+    patient_visits = write_patients(os.path.join(directory, 'Patient_data.csv'), patients, visits, messy=messy)
+    write_notes(os.path.join(directory, 'Notes.csv'), patient_visits,
+                notes if notes is not None else 2 * patients, words_per_note)
+    write_credentials(os.path.join(directory, 'Credentials.csv'), users)
+    return patient_visits
+
+
+def write_patient_file(path, patients, visits, seed=0, messy=False):
+    # Patient_data.csv alone, for benchmarks that need no notes or users.
+    random.seed(seed)
+    return write_patients(path, patients, visits, messy=messy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic Patient_data.csv, Notes.csv and Credentials.csv")
+    parser.add_argument('directory')
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--visits', type=int, default=10, help="Visits per patient")
+    parser.add_argument('--notes', type=int, default=None, help="Number of notes (default: 2 per patient)")
+    parser.add_argument('--words-per-note', type=int, default=70)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--messy', action='store_true',
+                        help="Mixed visit time formats, blank times and patients with fewer visits")
+    args = parser.parse_args()
+    write_dataset(args.directory, args.patients, args.visits, args.notes, args.words_per_note, args.users, args.seed,
+                  args.messy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, ROOT)
+
+from benchmarks.datagen import END_DATE, write_dataset
+from classes import PatientDatabase
+
+SIDECARS = ['Patient_data.csv.agg', 'Patient_data.csv.journal', 'Notes.csv.idx']
+
+
+def timed(repeat, func, *args):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        runs.append(time.perf_counter() - t0)
+    return runs
+
+
+def remove_sidecars():
+    for name in SIDECARS:
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def cold_load():
+    remove_sidecars()
+    PatientDatabase('./Patient_data.csv')
+
+
+def run_suite(repeat, lookups, seed):
+    # Runs in the dataset directory, like the application. Each entry is
+    # (name, operations per run, run times in seconds).
+    rng = random.Random(seed)
+    results = [('load_cold', 1, timed(repeat, cold_load))]
+    results.append(('load', 1, timed(repeat, PatientDatabase, './Patient_data.csv')))
+    db = PatientDatabase('./Patient_data.csv')
+    results.append(('save_patient_data', 1, timed(repeat, db.save_patient_data)))
+
+    def build_index():
+        db._visit_index = None
+        db.visit_index()
+
+    results.append(('visit_index_build', 1, timed(repeat, build_index)))
+    end = datetime(END_DATE.year, END_DATE.month, END_DATE.day)
+    dates = [(end - timedelta(days=rng.randrange(5 * 365))).strftime("%m/%d/%Y") for _ in range(lookups)]
+    results.append(('count_visits_on_date', lookups,
+                    timed(repeat, lambda: [db.count_visits_on_date(day) for day in dates])))
+    with open('./Notes.csv', newline='') as f:
+        note_ids = [row['Note_ID'] for row in csv.DictReader(f)]
+    sample = [rng.choice(note_ids) for _ in range(lookups)] if note_ids else []
+    results.append(('get_note_by_id', len(sample), timed(repeat, lambda: [db.get_note_by_id(n) for n in sample])))
+    results.append(('visits_per_day_all', 1, timed(repeat, db.visits_per_day)))
+    results.append(('visits_per_day_365', 1, timed(repeat, db.visits_per_day, end - timedelta(days=365), end)))
+    results.append(('visit_statistics_grouped', 1,
+                    timed(repeat, db.visit_statistics, None, None, ('gender', 'race'), False)))
+    db.store.close()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    params = {'patients': args.patients, 'visits': args.visits, 'notes': args.notes,
+              'words_per_note': args.words_per_note, 'seed': args.seed, 'repeat': args.repeat,
+              'lookups': args.lookups, 'data': args.data}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.data is None:
+            t0 = time.perf_counter()
+            write_dataset(tmp, args.patients, args.visits, args.notes, args.words_per_note, seed=args.seed)
+            print(f"generated dataset in {time.perf_counter() - t0:.1f} s")
+        else:
+            # The suite rewrites Patient_data.csv, so it works on copies.
+            for name in ('Patient_data.csv', 'Notes.csv'):
+                shutil.copy(os.path.join(args.data, name), tmp)
+        os.chdir(tmp)
+        try:
+            results = run_suite(args.repeat, args.lookups, args.seed)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'results': {name: {'ops': ops, 'median': statistics.median(runs), 'min': min(runs), 'runs': runs}
+                    for name, ops, runs in results}
+    }
+    for name, result in report['results'].items():
+        print(f"{name:26} median {result['median'] * 1000:10.2f} ms   min {result['min'] * 1000:10.2f} ms"
+              f"   ({result['ops']} op(s) per run)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+def compare(args):
+    # A case regresses when its median grows by more than the threshold and
+    # by more than min_delta seconds, which keeps sub-millisecond noise out.
+    with open(args.baseline) as f:
+        old = json.load(f)
+    with open(args.current) as f:
+        new = json.load(f)
+    if old['params'] != new['params']:
+        print(f"warning: runs used different parameters:\n  {old['params']}\n  {new['params']}")
+    regressions = 0
+    for name in old['results']:
+        if name not in new['results']:
+            print(f"{name:26} missing from {args.current}")
+            continue
+        before = old['results'][name]['median']
+        after = new['results'][name]['median']
+        ratio = after / before if before else float('inf')
+        status = ''
+        if ratio > 1 + args.threshold and after - before > args.min_delta:
+            status = 'REGRESSION'
+            regressions += 1
+        elif ratio < 1 / (1 + args.threshold) and before - after > args.min_delta:
+            status = 'faster'
+        print(f"{name:26} {before * 1000:10.2f} ms -> {after * 1000:10.2f} ms   {ratio:6.2f}x   {status}")
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time PatientDatabase operations on synthetic data")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run the suite and optionally write the results as JSON")
+    run_parser.add_argument('--patients', type=int, default=10000)
+    run_parser.add_argument('--visits', type=int, default=10, help="Visits per patient")
+    run_parser.add_argument('--notes', type=int, default=None, help="Number of notes (default: 2 per patient)")
+    run_parser.add_argument('--words-per-note', type=int, default=70)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--lookups', type=int, default=1000, help="Dates and note IDs looked up per run")
+    run_parser.add_argument('--data', default=None,
+                            help="Time copies of the Patient_data.csv and Notes.csv in this directory instead")
+    run_parser.add_argument('--output', '-o', default=None)
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown (0.2 = 20%%)")
+    compare_parser.add_argument('--min-delta', type=float, default=0.002, help="Ignore changes below this many seconds")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,101 @@
 import argparse
+import sys
 from datetime import datetime, timedelta
-import pandas as pd
-from classes import PatientDatabase, User
+from classes import PatientDatabase, Patient
+from dates import summarize
+from journal import journal_is_empty
+import metrics
 from authentication import authenticate_user
+from parallel import ParallelStatistics
+from streaming import DEFAULT_CHUNKSIZE, StreamingStatistics
 from utils import generate_random_id
 
 def main():
     parser = argparse.ArgumentParser(description="Patient Management System")
     parser.add_argument('-username', required=True, help="Username for authentication")
     parser.add_argument('-password', required=True, help="Password for authentication")
+    parser.add_argument('--stream', action='store_true',
+                        help="Compute visit statistics by streaming Patient_data.csv in chunks instead of loading it")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help="Rows per chunk in --stream mode (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes for visit statistics; above 1, Patient_data.csv is "
+                             "split into partitions counted in parallel (default: %(default)s)")
+    parser.add_argument('--metrics', action='store_true', help="Print operation latencies on exit")
+    parser.add_argument('--profile', nargs='?', const='', metavar='FILE',
+                        help="Profile the session with cProfile, print the slowest calls on exit and "
+                             "optionally save the stats to FILE")
     args = parser.parse_args()
 
-    users = User.from_csv('./Credentials.csv')
-
-    user = users.get(args.username)
-    if user is None or not user.authenticate(args.password):
-        print("Invalid credentials. Access denied.")
+    metrics.enable(args.metrics)
+    profiler = metrics.Profiler() if args.profile is not None else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        run(args)
+    finally:
+        if profiler is not None:
+            profiler.report(args.profile)
+        if args.metrics:
+            print(metrics.registry.report(), file=sys.stderr)
+
+
+def report_unparsed(stats):
+    # One summary line instead of a message per unreadable visit time.
+    summary = summarize(stats.unparsed_visit_times)
+    if summary:
+        print(f"\nNote: {summary}")
+
+
+def statistics_source(args, role, path='./Patient_data.csv'):
+    # Returns (patient_db, stats). Streamed and parallel counts read only
+    # the CSV snapshot, so they stand in for the database only for the
+    # read-only roles and only while nothing is journaled; otherwise the
+    # database is loaded, which replays the journal.
+    if role in ['management', 'admin'] and (args.stream or args.workers > 1) and journal_is_empty(path):
+        if args.workers > 1:
+            return None, ParallelStatistics(path, args.workers)
+        return None, StreamingStatistics(path, args.chunksize)
+    patient_db = PatientDatabase(path)
+    return patient_db, patient_db
+
+
+def run(args):
+    user = authenticate_user(args.username, args.password)
+    if user is None:
         return
 
-    patient_db = PatientDatabase('./Patient_data.csv')
-
+    patient_db, stats = statistics_source(args, user.role)
 
     if user.role == 'management':
         print("Generating temporal trend of patient visits...")
 
-        df = pd.read_csv('./Patient_data.csv')
-        visits_per_day = {}
-
-        visit_time_columns = [col for col in df.columns if col.startswith("Visit_time_")]
-
-        for col in visit_time_columns:
-            for val in df[col].dropna():
-                val = str(val).strip()
-                if val:
-                    visit_date = val.split()[0]
-                    visits_per_day[visit_date] = visits_per_day.get(visit_date, 0) + 1
+        visits_per_day = stats.visits_per_day()
 
         print("\nDaily Patient Visit Counts:")
         if not visits_per_day:
             print("No visit times found.")
         else:
-            for date in sorted(visits_per_day.keys()):
-                print(f"{date}: {visits_per_day[date]} visit(s)")
+            for date, count in visits_per_day.items():
+                print(f"{date}: {count} visit(s)")
 
     if user.role == 'management':
-        df = pd.read_csv('./Patient_data.csv')
-        visit_time_columns = [col for col in df.columns if col.startswith("Visit_time_")]
-
         current_date = datetime.now()
-        start_date = (current_date - timedelta(days=365)).strftime("%m/%d/%Y")
-        end_date = current_date.strftime("%m/%d/%Y")
-
-        print(f"Counting visits from {start_date} to {end_date}...")
+        start_date = current_date - timedelta(days=365)
 
-        visits_per_day = {}
+        print(f"Counting visits from {start_date.strftime('%m/%d/%Y')} to {current_date.strftime('%m/%d/%Y')}...")
 
-        for col in visit_time_columns:
-            for val in df[col].dropna():
-                val = str(val).strip()
-                if val:
-                    try:
-                        visit_datetime = datetime.strptime(val.split()[0], "%m/%d/%Y")
-                        visit_date = visit_datetime.strftime("%m/%d/%Y")
-
-                        if start_date <= visit_date <= end_date:
-                            visits_per_day[visit_date] = visits_per_day.get(visit_date, 0) + 1
-                    except ValueError:
-                        print(f"Skipping unrecognized date format: {val}")
-                        continue
+        visits_per_day = stats.visits_per_day(start_date, current_date)
 
         print("\nTotal Visits in the Last Year:")
         if not visits_per_day:
             print("No visits found in the specified range.")
         else:
-            for date in sorted(visits_per_day.keys()):
-                print(f"{date}: {visits_per_day[date]} visit(s)")
+            for date, count in visits_per_day.items():
+                print(f"{date}: {count} visit(s)")
+        report_unparsed(stats)
 
     if user.role == 'admin':
-        df = pd.read_csv('./Patient_data.csv')
-        visit_time_columns = [col for col in df.columns if col.startswith("Visit_time")]
-
         date_input = input("Enter date (MM/DD/YYYY): ").strip()
         try:
             target_date = datetime.strptime(date_input, "%m/%d/%Y").strftime("%m/%d/%Y")
@@ -87,35 +103,25 @@ def main():
             print("Invalid date format. Please use MM/DD/YYYY.")
             return
 
-        visit_count = 0
-        for col in visit_time_columns:
-            for val in df[col].dropna():
-                val = str(val).strip() 
-
-                if val:
-                    try:
-                        visit_date = datetime.strptime(val.split()[0], "%m/%d/%Y").strftime("%m/%d/%Y")
-                    
-                        if visit_date == target_date:
-                            visit_count += 1
-                    except ValueError:
-                        print(f"Skipping unrecognized date format: {val}")
-                        continue
+        visit_count = stats.count_visits_on_date(target_date)
 
         print(f"\nTotal visits on {target_date}: {visit_count} visit(s)")
+        report_unparsed(stats)
         return
 
 
     if user.role in ['nurse', 'clinician']:
+        report_unparsed(patient_db)
         while True:
-            action = input("Enter action (add_patient, remove_patient, retrieve_patient, count_visits, view_note, stop): ")
+            action = input("Enter action (add_patient, remove_patient, retrieve_patient, count_visits, view_note, "
+                           "search_notes, stop): ")
             if action == 'add_patient':
                 patient_id = input("Enter Patient_ID: ").strip()
-                if patient_id in patient_db.patients:
+                existing = patient_db.get_patient(patient_id)
+                if existing is not None:
                     visit_time = input("Enter Visit_time: ")
                     visit_id = generate_random_id()
-                    patient_db.patients[patient_id].add_visit(visit_id, visit_time)
-                    patient_db.save_patient_data()
+                    patient_db.add_visit(existing.patient_id, visit_id, visit_time)
                     print(f"Visit added for patient {patient_id}.")
                 else:
                     gender = input("Enter gender: ")
@@ -128,21 +134,20 @@ def main():
                     visit_time = input("Enter Visit_time: ")
                     visit_id = generate_random_id()
                     new_patient.add_visit(visit_id, visit_time)
-                    patient_db.patients[patient_id] = new_patient
-                    patient_db.save_patient_data()
+                    patient_db.add_patient(new_patient)
                     print(f"New patient {patient_id} added.")
             elif action == 'remove_patient':
                 patient_id = input("Enter Patient_ID: ").strip()
-                if patient_id in patient_db.patients:
-                    del patient_db.patients[patient_id]
-                    patient_db.save_patient_data()
+                patient = patient_db.get_patient(patient_id)
+                if patient is not None:
+                    patient_db.remove_patient(patient.patient_id)
                     print(f"Patient {patient_id} removed.")
                 else:
                     print("Patient not found.")
             elif action == 'retrieve_patient':
                 patient_id = input("Enter Patient_ID: ").strip()
-                if patient_id in patient_db.patients:
-                    patient = patient_db.patients[patient_id]
+                patient = patient_db.get_patient(patient_id)
+                if patient is not None:
                     print(f"Patient ID: {patient.patient_id}, Gender: {patient.gender}, Race: {patient.race}, "
                           f"Ethnicity: {patient.ethnicity}, Age: {patient.age}, Zip Code: {patient.zip_code}, "
                           f"Insurance: {patient.insurance}")
@@ -151,47 +156,42 @@ def main():
                 else:
                     print("Patient not found.")
             elif action == 'count_visits':
-                df = pd.read_csv('./Patient_data.csv')
-                visit_time_columns = [col for col in df.columns if col.startswith("Visit_time")]
-
                 date_input = input("Enter date (MM/DD/YYYY): ").strip()
                 try:
                     target_date = datetime.strptime(date_input, "%m/%d/%Y").strftime("%m/%d/%Y")
                 except ValueError:
                     print("Invalid date format. Please use MM/DD/YYYY.")
-                    return
-
-                visit_count = 0
-                for col in visit_time_columns:
-                    for val in df[col].dropna():
-                        val = str(val).strip() 
-
-                        if val:
-                            try:
-                                visit_date = datetime.strptime(val.split()[0], "%m/%d/%Y").strftime("%m/%d/%Y")
-                    
-                                if visit_date == target_date:
-                                    visit_count += 1
-                            except ValueError:
-                                print(f"Skipping unrecognized date format: {val}")
-                                continue
+                    continue
+
+                visit_count = stats.count_visits_on_date(target_date)
 
                 print(f"\nTotal visits on {target_date}: {visit_count} visit(s)")
-                return
             elif action == 'view_note':
                 note_id = input("Enter Note_ID to view: ").strip()
 
                 if not note_id:
                     print("No Note_ID entered. Please try again.")
-                else:
-                    note = patient_db.get_note_by_id(note_id) 
+                    continue
+                note = patient_db.get_note_by_id(note_id)
                 if note:
                     print(f"\n📄 Clinical Note (ID: {note_id}):\n{'-'*40}")
                     print(note)
                     print('-'*40 + '\n')
                 else:
                     print(f"No clinical note found with Note_ID: {note_id}\n")
+            elif action == 'search_notes':
+                query = input('Search notes (words, "phrases", AND, OR, NOT): ').strip()
+                try:
+                    results = patient_db.search_notes(query)
+                except ValueError as e:
+                    print(e)
+                    continue
+                if not results:
+                    print("No matching notes.")
+                for note_id, patient_id, visit_id, score in results:
+                    print(f"Note {note_id} (patient {patient_id}, visit {visit_id}): score {score}")
             elif action == 'stop':
+                patient_db.compact()
                 break
             else:
                 print("Invalid action. Please try again.")
@@ -0,0 +1,150 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_STOP = object()
+
+
+class ActivityLogger:
+    # Queues activity records and writes them as JSON lines from a background
+    # thread, in batches of batch_size or every flush_interval seconds. Each
+    # batch is one O_APPEND write made under an exclusive lock, so records from
+    # concurrent processes never interleave. The file is rotated to
+    # path.1 ... path.<backup_count> once it would grow past max_bytes.
+    # Records that cannot be written are reported on stderr and retried, up
+    # to max_pending of them.
+    def __init__(self, path, batch_size=100, flush_interval=0.5, max_bytes=5 * 2 ** 20, backup_count=5,
+                 max_pending=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='activity-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, action, username, role, duration=None, **details):
+        record = {
+            'timestamp': datetime.now().isoformat(),
+            'username': username,
+            'role': role,
+            'action': action,
+            'duration_ms': None if duration is None else round(duration * 1000, 3)
+        }
+        record.update(details)
+        self._queue.put(record)
+
+    def flush(self):
+        # Returns once the writer has tried to write everything logged so
+        # far, or at once if the writer thread is gone.
+        done = threading.Event()
+        self._queue.put(done)
+        while not done.wait(0.1):
+            if not self._thread.is_alive():
+                return
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        # A failed write keeps its records for the next attempt, made after
+        # flush_interval or on flush, instead of ending the thread.
+        batch = []
+        deadline = None
+        failing = False
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP or isinstance(item, threading.Event):
+                batch = self._write_batch(batch)
+                if item is _STOP:
+                    if batch:
+                        print(f"activity log: dropped {len(batch)} record(s) that could not be written",
+                              file=sys.stderr)
+                    return
+                item.set()
+            else:
+                if item is not None:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                full = len(batch) >= self.batch_size and not failing
+                if not batch or not (full or time.monotonic() >= deadline):
+                    continue
+                batch = self._write_batch(batch)
+            failing = bool(batch)
+            deadline = time.monotonic() + self.flush_interval if batch else None
+
+    def _write_batch(self, batch):
+        # Returns the records still to be written.
+        if not batch:
+            return batch
+        try:
+            self._write(batch)
+            return []
+        except Exception as e:
+            print(f"activity log: cannot write {len(batch)} record(s) to {self.path}: {e}", file=sys.stderr)
+        if len(batch) > self.max_pending:
+            dropped = len(batch) - self.max_pending
+            print(f"activity log: dropped the {dropped} oldest record(s)", file=sys.stderr)
+            batch = batch[dropped:]
+        return batch
+
+    def _write(self, records):
+        data = ''.join(json.dumps(record, default=str) + '\n' for record in records).encode('utf-8')
+        fd = self._open_locked()
+        try:
+            if os.fstat(fd).st_size and os.fstat(fd).st_size + len(data) > self.max_bytes:
+                self._rotate()
+                os.close(fd)
+                fd = None
+                fd = self._open_locked()
+            os.write(fd, data)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def _open_locked(self):
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            if fcntl is None:
+                return fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Another process may have rotated the file while we waited.
+            try:
+                if os.stat(self.path).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
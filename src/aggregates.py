@@ -0,0 +1,220 @@
+import argparse
+import bisect
+import json
+import os
+import struct
+import sys
+from collections import Counter
+
+import numpy as np
+
+from dates import format_day, parse_day, to_ordinal
+
+DIMENSIONS = ('gender', 'race', 'ethnicity', 'insurance', 'zip_code')
+
+# Saved aggregate: MAGIC, the length of a JSON header holding the signature
+# and the distinct group keys, the header, then three int32 columns (day,
+# key number, count) with one entry per cell, grouped by day.
+MAGIC = b'VISAGG01'
+HEADER = struct.Struct('<8sQ')
+
+
+def patient_key(patient):
+    # Values are stored as strings so that a zip code typed into the UI and
+    # the same zip code read back from the CSV as an int land in one group.
+    key = []
+    for dimension in DIMENSIONS:
+        value = getattr(patient, dimension)
+        key.append(None if value is None or value != value else str(value))
+    return tuple(key)
+
+
+class VisitAggregate:
+    # Visit counts per day, broken down by every combination of DIMENSIONS
+    # that occurs on that day. Kept up to date as visits are added and
+    # patients removed, so range and group-by queries cost O(days).
+    def __init__(self):
+        self._days = {}
+        self._sorted_days = None
+        self._load = self._rebuild = None
+        self._changes = []
+
+    @classmethod
+    def deferred(cls, load, rebuild):
+        # Nothing is read until the counts are first needed. load() returns
+        # the saved aggregate or None; changes made before then are added on
+        # top of it. Without one, rebuild() makes an aggregate that already
+        # includes them.
+        aggregate = cls()
+        aggregate._days = None
+        aggregate._load, aggregate._rebuild = load, rebuild
+        return aggregate
+
+    @property
+    def days(self):
+        if self._days is None:
+            loaded = self._load()
+            if loaded is None:
+                self._days = self._rebuild().days
+            else:
+                self._days = loaded.days
+                for day, key, delta in self._changes:
+                    self.add(day, key, delta)
+            self._load = self._rebuild = None
+            self._changes = []
+        return self._days
+
+    @classmethod
+    def from_patients(cls, patients):
+        aggregate = cls()
+        for patient in patients.values():
+            aggregate.add_patient(patient)
+        return aggregate
+
+    def add_patient(self, patient, sign=1):
+        key = patient_key(patient)
+        for day in patient.visits.days():
+            self.add(day, key, sign)
+
+    def remove_patient(self, patient):
+        self.add_patient(patient, sign=-1)
+
+    def add_visit(self, patient, visit_time):
+        self.add(parse_day(visit_time), patient_key(patient), 1)
+
+    def add(self, day, key, delta):
+        if day is None:
+            return
+        if self._days is None:
+            self._changes.append((day, key, delta))
+            return
+        counts = self.days.get(day)
+        if counts is None:
+            counts = self.days[day] = Counter()
+            self._sorted_days = None
+        counts[key] += delta
+        if counts[key] <= 0:
+            del counts[key]
+            if not counts:
+                del self.days[day]
+                self._sorted_days = None
+
+    def _days_between(self, start, end):
+        if self._sorted_days is None:
+            self._sorted_days = sorted(self.days)
+        lo = 0 if start is None else bisect.bisect_left(self._sorted_days, to_ordinal(start))
+        hi = len(self._sorted_days) if end is None else bisect.bisect_right(self._sorted_days, to_ordinal(end))
+        return self._sorted_days[lo:hi]
+
+    def query(self, start=None, end=None, group_by=(), per_day=True):
+        positions = []
+        for dimension in group_by:
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{dimension}'. Choose from: {', '.join(DIMENSIONS)}")
+            positions.append(DIMENSIONS.index(dimension))
+        result = {}
+        for day in self._days_between(start, end):
+            prefix = (format_day(day),) if per_day else ()
+            for key, count in self.days[day].items():
+                group = prefix + tuple(key[i] for i in positions)
+                result[group] = result.get(group, 0) + count
+        return result
+
+    def visits_per_day(self, start=None, end=None):
+        return {group[0]: count for group, count in self.query(start, end).items()}
+
+    def diff(self, other):
+        differences = []
+        for day in sorted(set(self.days) | set(other.days)):
+            mine = self.days.get(day, Counter())
+            theirs = other.days.get(day, Counter())
+            for key in set(mine) | set(theirs):
+                if mine.get(key, 0) != theirs.get(key, 0):
+                    differences.append((format_day(day), key,
+                                        mine.get(key, 0), theirs.get(key, 0)))
+        return differences
+
+    def save(self, path, signature):
+        keys = {}
+        days, key_numbers, counts = [], [], []
+        for day, cells in self.days.items():
+            for key, count in cells.items():
+                days.append(day)
+                key_numbers.append(keys.setdefault(key, len(keys)))
+                counts.append(count)
+        header = json.dumps({'signature': signature, 'keys': list(keys)}).encode('utf-8')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            for column in (days, key_numbers, counts):
+                f.write(np.array(column, dtype='<i4').tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, signature):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, header_size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            return None
+        try:
+            header = json.loads(data[HEADER.size:HEADER.size + header_size])
+        except ValueError:
+            return None
+        if header.get('signature') != signature:
+            return None
+        columns = np.frombuffer(data, dtype='<i4', offset=HEADER.size + header_size)
+        if len(columns) % 3:
+            return None
+        days, key_numbers, counts = columns.reshape(3, -1)
+        keys = [tuple(key) for key in header['keys']]
+        aggregate = cls()
+        starts = np.flatnonzero(np.diff(days)) + 1
+        for day, numbers, day_counts in zip(days[np.r_[0, starts]].tolist() if len(days) else [],
+                                            np.split(key_numbers, starts), np.split(counts, starts)):
+            aggregate._days[day] = Counter(dict(zip(map(keys.__getitem__, numbers.tolist()), day_counts.tolist())))
+        return aggregate
+
+
+def check(file_path, repair=False):
+    from classes import PatientDatabase
+
+    patient_db = PatientDatabase(file_path)
+    rebuilt = VisitAggregate.from_patients(patient_db.patients)
+    differences = patient_db.aggregate.diff(rebuilt)
+    if not differences:
+        print("Visit aggregate is consistent with the patient data.")
+        return True
+    print(f"Found {len(differences)} inconsistent aggregate cell(s):")
+    for day, key, stored, expected in differences:
+        print(f"{day} {dict(zip(DIMENSIONS, key))}: stored {stored}, rebuilt {expected}")
+    if repair:
+        # Fold the journal into the snapshot first: the stored aggregate must
+        # describe the snapshot, or replaying the journal would count twice.
+        patient_db.aggregate = rebuilt
+        patient_db.compact()
+        patient_db.save_aggregate()
+        print("Aggregate rebuilt from raw data.")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily visit aggregate tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check_parser = subparsers.add_parser('check', help="Rebuild the aggregate from raw data and compare")
+    check_parser.add_argument('--patients', default='./Patient_data.csv')
+    check_parser.add_argument('--repair', action='store_true', help="Replace the stored aggregate if it differs")
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        sys.exit(0 if check(args.patients, args.repair) else 1)
+
+
+if __name__ == "__main__":
+    main()
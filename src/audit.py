@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY, ts REAL, day TEXT, username TEXT, role TEXT, action TEXT,
+    duration_ms REAL, note_id TEXT, patient_id TEXT, details TEXT
+);
+CREATE TABLE IF NOT EXISTS ingest_state (
+    device INTEGER, inode INTEGER, offset INTEGER, PRIMARY KEY (device, inode)
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_user ON events (username, ts);
+CREATE INDEX IF NOT EXISTS events_action ON events (action, ts);
+CREATE INDEX IF NOT EXISTS events_note ON events (note_id) WHERE note_id IS NOT NULL;
+"""
+GROUP_COLUMNS = ('username', 'role', 'action', 'day', 'note_id', 'patient_id')
+BATCH_LINES = 50000
+
+
+def parse_time(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(value.strip()).timestamp()
+
+
+def parse_line(line):
+    # JSON lines come from ActivityLogger; older logs are
+    # "timestamp, username, role, action".
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        if line.startswith('{'):
+            record = json.loads(line)
+        else:
+            timestamp, username, role, action = line.split(', ', 3)
+            record = {'timestamp': timestamp, 'username': username, 'role': role, 'action': action}
+        timestamp = record.pop('timestamp')
+        moment = datetime.fromisoformat(timestamp)
+    except (ValueError, KeyError, TypeError):
+        return None
+    username = record.pop('username', None)
+    role = record.pop('role', None)
+    action = record.pop('action', None)
+    duration = record.pop('duration_ms', None)
+    note_id = record.pop('note_id', None)
+    patient_id = record.pop('patient_id', None)
+    return (moment.timestamp(), timestamp[:10], username, role, action, duration,
+            None if note_id is None else str(note_id), None if patient_id is None else str(patient_id),
+            json.dumps(record) if record else None)
+
+
+def log_files(log_path, max_backups=100):
+    # Oldest first, so events are ingested roughly in time order.
+    files = [f"{log_path}.{index}" for index in range(max_backups, 0, -1) if os.path.exists(f"{log_path}.{index}")]
+    if os.path.exists(log_path):
+        files.append(log_path)
+    return files
+
+
+class AuditStore:
+    # Indexed copy of user_activity_log.txt. Each log file is tracked by
+    # device and inode with the byte offset read so far, so ingestion only
+    # reads new lines and a rotated file is recognised under its new name.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def ingest(self, log_path):
+        added = 0
+        seen = []
+        for path in log_files(log_path):
+            stat = os.stat(path)
+            seen.append((stat.st_dev, stat.st_ino))
+            added += self._ingest_file(path)
+        # Forget files that have rotated out, so a reused inode starts from 0.
+        with self.conn:
+            for device, inode in self.conn.execute("SELECT device, inode FROM ingest_state").fetchall():
+                if (device, inode) not in seen:
+                    self.conn.execute("DELETE FROM ingest_state WHERE device = ? AND inode = ?", (device, inode))
+        return added
+
+    def _ingest_file(self, path):
+        stat = os.stat(path)
+        row = self.conn.execute("SELECT offset FROM ingest_state WHERE device = ? AND inode = ?",
+                                (stat.st_dev, stat.st_ino)).fetchone()
+        offset = row[0] if row is not None else 0
+        if offset > stat.st_size:
+            offset = 0
+        added = 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                lines = f.readlines(BATCH_LINES * 128)
+                if not lines:
+                    break
+                if not lines[-1].endswith(b'\n'):
+                    # Leave a partially written last line for the next run.
+                    f.seek(-len(lines[-1]), os.SEEK_CUR)
+                    lines.pop()
+                    if not lines:
+                        break
+                events = [event for event in (parse_line(line.decode('utf-8', 'replace')) for line in lines)
+                          if event is not None]
+                offset = f.tell()
+                with self.conn:
+                    self.conn.executemany("INSERT INTO events (ts, day, username, role, action, duration_ms, "
+                                          "note_id, patient_id, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", events)
+                    self.conn.execute("INSERT OR REPLACE INTO ingest_state VALUES (?, ?, ?)",
+                                      (stat.st_dev, stat.st_ino, offset))
+                added += len(events)
+        return added
+
+    def _where(self, username=None, role=None, action=None, since=None, until=None, note_id=None,
+               patient_id=None):
+        clauses, params = [], []
+        for column, value in (('username', username), ('role', role), ('action', action),
+                              ('note_id', note_id), ('patient_id', patient_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(str(value))
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(parse_time(since))
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(parse_time(until))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit=None, **filters):
+        where, params = self._where(**filters)
+        sql = f"SELECT ts, username, role, action, duration_ms, note_id, patient_id FROM events{where} ORDER BY ts"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [(datetime.fromtimestamp(ts).isoformat(sep=' '),) + tuple(rest)
+                for ts, *rest in self.conn.execute(sql, params)]
+
+    def summary(self, group_by=('username', 'day'), **filters):
+        for column in group_by:
+            if column not in GROUP_COLUMNS:
+                raise ValueError(f"Cannot group by '{column}'. Choose from: {', '.join(GROUP_COLUMNS)}")
+        where, params = self._where(**filters)
+        columns = ", ".join(group_by)
+        sql = f"SELECT {columns}, COUNT(*) FROM events{where} GROUP BY {columns} ORDER BY {columns}"
+        return self.conn.execute(sql, params).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit queries over the user activity log")
+    parser.add_argument('--log', default='./user_activity_log.txt', help="Activity log path")
+    parser.add_argument('--db', help="Audit database path (default: <log>.audit.db)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('ingest', help="Read new log lines into the audit database")
+    for name, help_text in (('query', "List matching events"), ('summary', "Count matching events per group")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--user')
+        sub.add_argument('--role')
+        sub.add_argument('--action')
+        sub.add_argument('--note-id')
+        sub.add_argument('--patient-id')
+        sub.add_argument('--since', help="Start time, inclusive (ISO format, e.g. 2025-05-01)")
+        sub.add_argument('--until', help="End time, exclusive (ISO format)")
+        sub.add_argument('--no-ingest', action='store_true', help="Skip reading new log lines first")
+        if name == 'query':
+            sub.add_argument('--limit', type=int)
+        else:
+            sub.add_argument('--group-by', default='username,day',
+                             help=f"Comma-separated columns from: {', '.join(GROUP_COLUMNS)}")
+    args = parser.parse_args()
+
+    store = AuditStore(args.db or args.log + '.audit.db')
+    if args.command == 'ingest' or not args.no_ingest:
+        added = store.ingest(args.log)
+        if args.command == 'ingest':
+            print(f"Ingested {added} new event(s).")
+            return
+
+    filters = dict(username=args.user, role=args.role, action=args.action, note_id=args.note_id,
+                   patient_id=args.patient_id, since=args.since, until=args.until)
+    if args.command == 'query':
+        for event in store.query(limit=args.limit, **filters):
+            print(", ".join("" if value is None else str(value) for value in event))
+    else:
+        group_by = [column.strip() for column in args.group_by.split(',') if column.strip()]
+        for row in store.summary(group_by, **filters):
+            print(", ".join("" if value is None else str(value) for value in row))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
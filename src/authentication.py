@@ -1,10 +1,32 @@
-from classes import User
+import os
+import sys
+from cache import get_users, shared_cache
+from credentials import CredentialIndex, User, index_is_current, index_path_for
 
+_warned_stale = set()
 
-def authenticate_user(username, password):
-    users = User.from_csv('./Credentials.csv')
-    user = users.get(username)
+
+def find_user(username, password, credentials_path='./Credentials.csv'):
+    # Prefer the hashed credential index when it has been built and the CSV
+    # has not been edited since; otherwise fall back to the plaintext CSV.
+    index_path = index_path_for(credentials_path)
+    if index_is_current(credentials_path, index_path):
+        index = shared_cache.get('credentials', index_path, CredentialIndex)
+        role = index.verify(username, password)
+        return None if role is None else User(username, None, role)
+    if os.path.exists(index_path) and index_path not in _warned_stale:
+        _warned_stale.add(index_path)
+        print(f"warning: {credentials_path} changed after {index_path} was built; using the CSV until "
+              f"'python credentials.py migrate' is run again", file=sys.stderr)
+    user = get_users(credentials_path).get(username)
     if user is None or not user.authenticate(password):
+        return None
+    return user
+
+
+def authenticate_user(username, password):
+    user = find_user(username, password)
+    if user is None:
         print("Invalid credentials. Access denied.")
         return None
     return user
@@ -0,0 +1,112 @@
+import os
+import threading
+from collections import OrderedDict
+
+from credentials import User
+from metrics import registry
+
+
+def file_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def close_all(values):
+    # Entries dropped from the cache hold open files and maps.
+    for value in values:
+        close = getattr(value, 'close', None)
+        if close is not None:
+            close()
+
+
+class DataCache:
+    # Process-wide cache of loaded data files, keyed by kind and absolute path.
+    # An entry is reused while the files it was loaded from keep the same
+    # mtime and size; least recently used entries are evicted past max_entries.
+    # Entries that are replaced or evicted are closed.
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.RLock()
+
+    def get(self, kind, path, loader, watch=()):
+        key = (kind, os.path.abspath(path))
+        paths = (path,) + tuple(watch)
+        with self._lock:
+            value = self._lookup(key, paths)
+            if value is not None:
+                return value
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        # Load under a lock of its own, so a slow file only blocks callers
+        # waiting for that same file.
+        with key_lock:
+            with self._lock:
+                value = self._lookup(key, paths)
+                if value is not None:
+                    return value
+                self.misses += 1
+            registry.incr(f'cache.{kind}.misses')
+            signature = file_signature(paths)
+            value = loader(path)
+            with self._lock:
+                stale = self._entries.pop(key, None)
+                stale = [stale[1]] if stale is not None else []
+                self._entries[key] = (signature, value, paths)
+                while len(self._entries) > self.max_entries:
+                    evicted, (_, old, _) = self._entries.popitem(last=False)
+                    self._loading.pop(evicted, None)
+                    stale.append(old)
+        close_all(stale)
+        return value
+
+    def _lookup(self, key, paths):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != file_signature(paths):
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        registry.incr(f'cache.{key[0]}.hits')
+        return entry[1]
+
+    def refresh(self, path):
+        # Our own write already updated the cached object, so only restamp the
+        # signature instead of reloading it on the next lookup.
+        path = os.path.abspath(path)
+        with self._lock:
+            for key, (_, value, paths) in list(self._entries.items()):
+                if key[1] == path:
+                    self._entries[key] = (file_signature(paths), value, paths)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is not None:
+                path = os.path.abspath(path)
+            keys = [key for key in self._entries if path is None or key[1] == path]
+            stale = [self._entries.pop(key)[1] for key in keys]
+        close_all(stale)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+shared_cache = DataCache()
+
+
+def get_database(path, cache=shared_cache):
+    # Imported here so credential lookups do not pay for pandas.
+    from classes import PatientDatabase
+    return cache.get('database', path, PatientDatabase, watch=(path + '.journal',))
+
+
+def get_users(path, cache=shared_cache):
+    return cache.get('users', path, User.from_csv)
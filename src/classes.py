@@ -1,27 +1,31 @@
+import os
+import threading
+from array import array
 import pandas as pd
 from datetime import datetime
+from aggregates import VisitAggregate
+from credentials import User
+from dates import to_ordinal
+from journal import id_candidates
+from metrics import registry, timed
+from storage import PATIENT_COLUMNS, open_store
+from visit_index import VisitIndex
+from visits import VisitList, VisitStore
 
+SNIPPET_LENGTH = 80
 
-class User:
-    def __init__(self, username, password, role):
-        self.username = username
-        self.password = password
-        self.role = role
 
-    @classmethod
-    def from_csv(cls, file_path):
-        df = pd.read_csv(file_path)
-        users = {}
-        for _, row in df.iterrows():
-            users[row['username']] = cls(row['username'], row['password'], row['role'])
-        return users
-
-    def authenticate(self, input_password):
-        return self.password == input_password
+def note_snippet(text, length=SNIPPET_LENGTH):
+    return (text or '').strip().split('\n', 1)[0][:length]
 
 
 class Patient:
-    def __init__(self, patient_id, gender, race, ethnicity, age, zip_code, insurance):
+    # Visits live in a VisitStore shared by every patient of a database;
+    # the patient only keeps the offsets of its own visits.
+    __slots__ = ('patient_id', 'gender', 'race', 'ethnicity', 'age', 'zip_code', 'insurance',
+                 '_visit_store', '_visit_offsets')
+
+    def __init__(self, patient_id, gender, race, ethnicity, age, zip_code, insurance, visit_store=None):
         self.patient_id = patient_id
         self.gender = gender
         self.race = race
@@ -29,77 +33,293 @@ class Patient:
         self.age = age
         self.zip_code = zip_code
         self.insurance = insurance
-        self.visits = []
+        self._visit_store = visit_store if visit_store is not None else VisitStore()
+        self._visit_offsets = array('q')
+
+    @property
+    def visits(self):
+        return VisitList(self._visit_store, self._visit_offsets)
 
     def add_visit(self, visit_id, visit_time):
-        self.visits.append({'Visit_ID': visit_id, 'Visit_time': visit_time})
+        self._visit_offsets.append(self._visit_store.append(visit_id, visit_time))
+
+    def add_visits(self, visits):
+        self._visit_offsets.extend(self._visit_store.extend(visits))
 
 
 class PatientDatabase:
-    def __init__(self, file_path):
+    def __init__(self, file_path, compact_every=1000, store=None):
         self.file_path = file_path
-        self.patients = self.load_patients_from_csv()
-        self.notes = self.load_notes_from_csv('./Notes.csv')
+        self.compact_every = compact_every
+        self.store = store if store is not None else open_store(file_path)
+        self.lock = threading.RLock()
+        self.aggregate_path = file_path + '.agg'
+        with timed('db.load_notes'):
+            self.notes = self.store.load_notes()
+        self._load()
 
-    def load_patients_from_csv(self):
-        df = pd.read_csv(self.file_path)
+    def _load(self):
+        # Reads the snapshot and replays the journal. Called again if another
+        # process rewrites the snapshot while this database is open.
+        with self.store.locked():
+            self.visit_store = VisitStore()
+            # An indexed store answers lookups and counts itself, so its
+            # patients are only read into memory once something needs all of them.
+            self._patients = None if self.store.indexed else self.load_patients()
+            self._visit_index = None
+            # Read on the first statistics query rather than here: most
+            # sessions never ask for one.
+            self._aggregate_signature = self._snapshot_signature()
+            self.aggregate = VisitAggregate.deferred(self._load_aggregate, self._rebuild_aggregate)
+            with timed('db.replay_journal'):
+                for record in self.store.pending_records():
+                    self._apply(record, self._find_patient(record['Patient_ID']))
+
+    def _sync(self):
+        # Called with the store locked before writing: picks up what other
+        # processes (cli.py) wrote since this database last looked.
+        if self.store.changed():
+            self._load()
+            return
+        for record in self.store.new_records():
+            self._apply(record, self._find_patient(record['Patient_ID']))
+
+    @property
+    def patients(self):
+        with self.lock:
+            if self._patients is None:
+                self._patients = self.load_patients()
+            return self._patients
+
+    @timed('db.load_patients')
+    def load_patients(self):
+        # Every visit time is parsed in one pass over the whole column.
+        rows, bounds, visit_ids, visit_times = self.store.load_patient_table()
+        with timed('db.parse_visits'):
+            first = self.visit_store.extend_columns(visit_ids, visit_times).start
         patients = {}
-        for _, row in df.iterrows():
-            patient = Patient(
-                patient_id=row['Patient_ID'],
-                gender=row['Gender'],
-                race=row['Race'],
-                ethnicity=row['Ethnicity'],
-                age=row['Age'],
-                zip_code=row['Zip_code'],
-                insurance=row['Insurance']
-            )
-            visits = []
-            for col in df.columns:
-                if col.startswith("Visit_ID"):
-                    index = col.split("_")[-1]
-                    visit_data = {
-                        'Visit_ID': row[col],
-                        'Visit_time': row.get(f"Visit_time_{index}", "")
-                    }
-                    visits.append(visit_data)
-            patient.visits = visits
+        for i, row in enumerate(rows):
+            patient = Patient(*row, visit_store=self.visit_store)
+            patient._visit_offsets.extend(range(first + bounds[i], first + bounds[i + 1]))
             patients[patient.patient_id] = patient
         return patients
 
-    def load_notes_from_csv(self, notes_path):
-        df = pd.read_csv(notes_path)
-        notes = {}
-        for _, row in df.iterrows():
-            notes[str(row['Note_ID'])] = row['Note_text']
-        return notes
+    @property
+    def unparsed_visit_times(self):
+        # Counter of visit times that have no date, left out of visit counts.
+        return self.visit_store.unparsed
 
+    @timed('db.save_patient_data')
     def save_patient_data(self):
-        patient_data = []
-        for patient in self.patients.values():
-            row = {
-                'Patient_ID': patient.patient_id,
-                'Gender': patient.gender,
-                'Race': patient.race,
-                'Ethnicity': patient.ethnicity,
-                'Age': patient.age,
-                'Zip_code': patient.zip_code,
-                'Insurance': patient.insurance
-            }
-            for idx, visit in enumerate(patient.visits, 1):
-                row[f"Visit_ID_{idx}"] = visit.get('Visit_ID')
-                row[f"Visit_time_{idx}"] = visit.get('Visit_time')
-            patient_data.append(row)
-        df = pd.DataFrame(patient_data)
-        df.to_csv(self.file_path, index=False)
+        with self.lock, self.store.locked():
+            # The journal is cleared below, so every record in it has to be
+            # in memory first, including those other processes appended.
+            self._sync()
+            self.store.save_patients(self.patients)
+            self.save_aggregate()
+
+    def _snapshot_signature(self):
+        stat = os.stat(self.file_path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    @timed('db.load_aggregate')
+    def _load_aggregate(self):
+        return VisitAggregate.load(self.aggregate_path, self._aggregate_signature)
+
+    @timed('db.rebuild_aggregate')
+    def _rebuild_aggregate(self):
+        aggregate = VisitAggregate.from_patients(self.patients)
+        # Saved only while the data still matches the snapshot it came from.
+        if not self.store.pending and self._snapshot_signature() == self._aggregate_signature:
+            self._write_aggregate(aggregate)
+        return aggregate
+
+    def save_aggregate(self):
+        # The stored aggregate describes the snapshot only; journal records are
+        # replayed through _apply on load, which keeps it up to date.
+        self._write_aggregate(self.aggregate)
+
+    def _write_aggregate(self, aggregate):
+        # A deferred aggregate is read during save(), against the old signature.
+        signature = self._snapshot_signature()
+        try:
+            aggregate.save(self.aggregate_path, signature)
+        except OSError:
+            pass
+        self._aggregate_signature = signature
+
+    def compact(self):
+        if self.store.pending:
+            registry.incr('db.compactions')
+            if self.store.indexed:
+                # The changes are committed already; only the saved aggregate
+                # is behind.
+                with self.lock:
+                    self.save_aggregate()
+                    self.store.checkpoint()
+            else:
+                self.save_patient_data()
+
+    @timed('db.add_patient')
+    def add_patient(self, patient):
+        self._record({
+            'op': 'add_patient',
+            'Patient_ID': patient.patient_id,
+            'Gender': patient.gender,
+            'Race': patient.race,
+            'Ethnicity': patient.ethnicity,
+            'Age': patient.age,
+            'Zip_code': patient.zip_code,
+            'Insurance': patient.insurance,
+            'visits': [[visit.get('Visit_ID'), visit.get('Visit_time')] for visit in patient.visits]
+        })
+
+    @timed('db.add_visit')
+    def add_visit(self, patient_id, visit_id, visit_time):
+        self._record({'op': 'add_visit', 'Patient_ID': patient_id, 'Visit_ID': visit_id, 'Visit_time': visit_time})
+
+    @timed('db.remove_patient')
+    def remove_patient(self, patient_id):
+        self._record({'op': 'remove_patient', 'Patient_ID': patient_id})
 
+    @timed('db.apply_batch')
+    def apply_batch(self, records):
+        # Applies many journal-style records in memory and writes them all
+        # with one save, instead of journaling and fsyncing each one. Nothing
+        # reaches the file until that save, which replaces it atomically.
+        with self.lock, self.store.locked():
+            self._sync()
+            # The batch is saved by rewriting every patient, so they all have
+            # to be in memory first.
+            self.patients
+            for record in records:
+                self._apply(record, self._find_patient(record['Patient_ID']))
+            self.save_patient_data()
+
+    def _record(self, record):
+        with self.lock, self.store.locked():
+            self._sync()
+            # Looked up before the store changes: a SQLite store has deleted a
+            # removed patient by the time the record is applied.
+            patient = self._find_patient(record['Patient_ID'])
+            if patient is not None:
+                record['Patient_ID'] = patient.patient_id
+            self.store.record(record)
+            self._apply(record, patient)
+            if self.store.pending >= self.compact_every:
+                self.compact()
+
+    def _apply(self, record, patient):
+        # patient is the current patient with the record's ID, or None. The
+        # visit index, once built, is updated in place rather than rebuilt, so
+        # a write does not make the next count scan every visit.
+        op = record['op']
+        patients = self._patients
+        index = self._visit_index
+        if op == 'add_patient':
+            if patient is None:
+                patient = Patient(*[record[col] for col in PATIENT_COLUMNS], visit_store=self.visit_store)
+                for visit_id, visit_time in record['visits']:
+                    patient.add_visit(visit_id, visit_time)
+                if patients is not None:
+                    patients[patient.patient_id] = patient
+                self.aggregate.add_patient(patient)
+                if index is not None:
+                    for visit_id, day in zip(patient.visits.ids(), patient.visits.days()):
+                        index.add(patient.patient_id, visit_id, day)
+        elif op == 'add_visit':
+            if patient is not None and record['Visit_ID'] not in patient.visits.ids():
+                patient.add_visit(record['Visit_ID'], record['Visit_time'])
+                self.aggregate.add_visit(patient, record['Visit_time'])
+                if index is not None:
+                    index.add(patient.patient_id, record['Visit_ID'], patient.visits.days()[-1])
+        elif op == 'remove_patient':
+            if patient is not None:
+                if patients is not None:
+                    patients.pop(patient.patient_id, None)
+                self.aggregate.remove_patient(patient)
+                if index is not None:
+                    index.remove_patient(patient.patient_id, patient.visits.days().count(None))
+
+    @timed('db.get_patient')
+    def get_patient(self, patient_id):
+        if self.store.indexed:
+            return self._query_patient(patient_id)
+        return self._find_patient(patient_id)
+
+    def _find_patient(self, patient_id):
+        if self._patients is None:
+            return self._query_patient(patient_id)
+        for key in id_candidates(patient_id):
+            patient = self._patients.get(key)
+            if patient is not None:
+                return patient
+        return None
+
+    def _query_patient(self, patient_id):
+        # One indexed lookup; the patient returned is a copy with its own visits.
+        for key in id_candidates(patient_id):
+            found = self.store.get_patient(key)
+            if found is not None:
+                row, visits = found
+                patient = Patient(*row)
+                patient.add_visits(visits)
+                return patient
+        return None
+
+    def visit_index(self):
+        with self.lock:
+            if self._visit_index is None:
+                with timed('db.build_visit_index'):
+                    self._visit_index = VisitIndex.from_patients(self.patients)
+            return self._visit_index
+
+    @timed('db.count_visits_on_date')
     def count_visits_on_date(self, date):
-        count = 0
-        for patient in self.patients.values():
-            for visit in patient.visits:
-                if visit.get('Visit_time', '').startswith(date):
-                    count += 1
-        return count
+        if self.store.indexed:
+            day = to_ordinal(date)
+            return self.store.count_visits_between(day, day)
+        return self.visit_index().count_on(date)
+
+    @timed('db.count_visits_between')
+    def count_visits_between(self, start, end):
+        if self.store.indexed:
+            return self.store.count_visits_between(to_ordinal(start), to_ordinal(end))
+        return self.visit_index().count_between(start, end)
 
+    @timed('db.visits_per_day')
+    def visits_per_day(self, start=None, end=None):
+        with self.lock:
+            return self.aggregate.visits_per_day(start, end)
+
+    @timed('db.visit_statistics')
+    def visit_statistics(self, start=None, end=None, group_by=(), per_day=True):
+        with self.lock:
+            return self.aggregate.query(start, end, group_by, per_day)
+
+    @timed('db.get_note_by_id')
     def get_note_by_id(self, note_id):
         return self.notes.get(note_id, None)
+
+    @timed('db.search_notes')
+    def search_notes(self, query, limit=20):
+        # (note_id, patient_id, visit_id, score) for notes matching a query
+        # such as: hydrocephalus OR chordoma, "spinal fluid" NOT shunt
+        return self.store.search_notes(query, limit)
+
+    def search_note_snippets(self, query, limit=20):
+        # search_notes results with the start of each note's first line
+        # added, for listing hits without opening every note.
+        return [(note_id, patient_id, visit_id, score, note_snippet(self.get_note_by_id(note_id)))
+                for note_id, patient_id, visit_id, score in self.search_notes(query, limit)]
+
+    def get_note_ids_for_patient(self, patient_id):
+        return self.notes.for_patient(patient_id)
+
+    def get_note_ids_for_visit(self, visit_id):
+        return self.notes.for_visit(visit_id)
+
+    def close(self):
+        with self.lock:
+            self.notes.close()
+            self.store.close()
@@ -0,0 +1,487 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from authentication import find_user
+from journal import PatientJournal, id_candidates, id_key, id_text, journal_is_empty
+
+# Headless command-line interface. Each command imports only the modules it
+# uses and reads only the files it needs: get-note never touches
+# Patient_data.csv, and pandas is only imported for visit statistics, for
+# SQLite files and for import, which loads the whole database.
+
+CARE = ('nurse', 'clinician')
+ROLES = {
+    'count-visits': CARE + ('admin',),
+    'stats': ('management',),
+    'get-patient': CARE,
+    'add-visit': CARE,
+    'get-note': CARE,
+    'import': CARE,
+}
+# Same as storage.SQLITE_EXTENSIONS; storage imports pandas.
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+PATIENT_FIELDS = ['gender', 'race', 'ethnicity', 'age', 'zip_code', 'insurance']
+PATIENT_COLUMNS = ['Patient_ID', 'Gender', 'Race', 'Ethnicity', 'Age', 'Zip_code', 'Insurance']
+MAX_ERRORS = 20
+
+
+class CommandError(Exception):
+    pass
+
+
+def is_sqlite(path):
+    return os.path.splitext(path)[1].lower() in SQLITE_EXTENSIONS
+
+
+def output(args, text, data):
+    print(json.dumps(data) if args.json else text)
+
+
+def parse_date(value, name='date'):
+    from dates import format_day, to_ordinal
+    try:
+        return format_day(to_ordinal(value))
+    except ValueError:
+        raise CommandError(f"{name} must be a date in MM/DD/YYYY format, not {value!r}")
+
+
+def report_unparsed(stats):
+    from dates import summarize
+    summary = summarize(getattr(stats, 'unparsed_visit_times', {}) or {})
+    if summary:
+        print(f"Note: {summary}", file=sys.stderr)
+
+
+def load_database(args):
+    from classes import PatientDatabase
+    return PatientDatabase(args.patients)
+
+
+# Single patients, read without loading the database.
+
+def scan_snapshot(path, wanted):
+    # The snapshot is scanned with the csv module, which for one patient is
+    # much cheaper than a pandas load of every row.
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        id_col = header.index('Patient_ID') if 'Patient_ID' in header else 0
+        for row in reader:
+            if len(row) > id_col and id_text(row[id_col]) == wanted:
+                values = dict(zip(header, row))
+                patient = {column: values.get(column, '') for column in PATIENT_COLUMNS}
+                patient['visits'] = []
+                for column in header:
+                    if column.startswith('Visit_ID_'):
+                        visit_id = values.get(column, '')
+                        visit_time = values.get('Visit_time_' + column.split('_')[-1], '')
+                        if visit_id or visit_time:
+                            patient['visits'].append([visit_id, visit_time])
+                return patient, id_key(wanted)
+    return None, None
+
+
+def read_patient(args, patient_id, journal=None):
+    # (patient dict, key) with the journaled changes applied, or (None, None).
+    if journal is None:
+        journal = PatientJournal(args.patients + '.journal')
+    wanted = id_text(patient_id)
+    # Locked so that a compaction cannot swap the snapshot and clear the
+    # journal between the two reads.
+    with journal.locked():
+        patient, key = scan_snapshot(args.patients, wanted)
+        records = journal.replay()
+    # Matched the way PatientDatabase matches journal records to patients.
+    for record in records:
+        if id_text(record['Patient_ID']) != wanted:
+            continue
+        # The same rules as PatientDatabase._apply.
+        if record['op'] == 'add_patient' and patient is None:
+            patient = {column: record[column] for column in PATIENT_COLUMNS}
+            patient['visits'] = [list(visit) for visit in record['visits']]
+            key = record['Patient_ID']
+        elif record['op'] == 'add_visit' and patient is not None:
+            if str(record['Visit_ID']) not in [str(visit_id) for visit_id, _ in patient['visits']]:
+                patient['visits'].append([record['Visit_ID'], record['Visit_time']])
+        elif record['op'] == 'remove_patient':
+            patient, key = None, None
+    return patient, key
+
+
+def read_sqlite_patient(args, patient_id):
+    from storage import SQLiteStore
+    store = SQLiteStore(args.patients)
+    found = None
+    try:
+        for key in id_candidates(patient_id):
+            found = store.get_patient(key)
+            if found is not None:
+                break
+    finally:
+        store.close()
+    if found is None:
+        return None, None
+    row, visits = found
+    patient = dict(zip(PATIENT_COLUMNS, row))
+    patient['visits'] = [list(visit) for visit in visits]
+    return patient, row[0]
+
+
+def get_patient(args):
+    read = read_sqlite_patient if is_sqlite(args.patients) else read_patient
+    patient, _ = read(args, args.patient_id)
+    if patient is None:
+        raise CommandError(f"Patient {args.patient_id} not found")
+    lines = [f"Patient ID: {patient['Patient_ID']}, Gender: {patient['Gender']}, Race: {patient['Race']}, "
+             f"Ethnicity: {patient['Ethnicity']}, Age: {patient['Age']}, Zip Code: {patient['Zip_code']}, "
+             f"Insurance: {patient['Insurance']}"]
+    lines += [f"Visit ID: {visit_id}, Visit Time: {visit_time}" for visit_id, visit_time in patient['visits']]
+    output(args, '\n'.join(lines), patient)
+    return 'retrieve_patient', {'patient_id': args.patient_id}
+
+
+def add_visit(args):
+    # Appends one record to the journal, which the next load replays; the
+    # database itself is not loaded.
+    from utils import generate_random_id
+    record = {'op': 'add_visit', 'Patient_ID': None, 'Visit_ID': args.visit_id or generate_random_id(),
+              'Visit_time': args.visit_time}
+
+    def check(patient):
+        if patient is None:
+            raise CommandError(f"Patient {args.patient_id} not found")
+        if str(record['Visit_ID']) in [str(visit_id) for visit_id, _ in patient['visits']]:
+            raise CommandError(f"Patient {args.patient_id} already has a visit {record['Visit_ID']}")
+
+    if is_sqlite(args.patients):
+        from storage import SQLiteStore
+        patient, record['Patient_ID'] = read_sqlite_patient(args, args.patient_id)
+        check(patient)
+        store = SQLiteStore(args.patients)
+        try:
+            store.record(record)
+        finally:
+            store.close()
+    else:
+        journal = PatientJournal(args.patients + '.journal')
+        try:
+            # Held from the read to the append, so an open database cannot
+            # compact in between and clear the record before it has read it.
+            with journal.locked():
+                patient, record['Patient_ID'] = read_patient(args, args.patient_id, journal)
+                check(patient)
+                journal.append(record)
+        finally:
+            journal.close()
+    output(args, f"Visit {record['Visit_ID']} added for patient {args.patient_id}.",
+           {'patient_id': record['Patient_ID'], 'Visit_ID': record['Visit_ID'], 'Visit_time': args.visit_time})
+    return 'add_patient', {'patient_id': args.patient_id}
+
+
+def get_note(args):
+    if is_sqlite(args.patients):
+        from storage import SQLiteStore
+        store = SQLiteStore(args.patients)
+        notes = store.load_notes()
+    else:
+        from note_store import NoteStore
+        store = notes = NoteStore(args.notes)
+    try:
+        note = notes.get(args.note_id)
+    finally:
+        store.close()
+    if note is None:
+        raise CommandError(f"No clinical note found with Note_ID: {args.note_id}")
+    output(args, note, {'note_id': args.note_id, 'note_text': note})
+    return 'view_note', {'note_id': args.note_id}
+
+
+# Visit statistics.
+
+def statistics_source(args):
+    # Without journaled changes the CSV snapshot is the whole truth, so
+    # counts are streamed from it; otherwise the database is loaded, which
+    # replays the journal.
+    if not is_sqlite(args.patients) and journal_is_empty(args.patients):
+        from streaming import StreamingStatistics
+        return StreamingStatistics(args.patients)
+    return load_database(args)
+
+
+def load_aggregate(args):
+    # The stored aggregate answers group-by queries when it matches the
+    # snapshot and nothing is journaled; otherwise it comes from a load.
+    if not is_sqlite(args.patients) and journal_is_empty(args.patients):
+        from aggregates import VisitAggregate
+        stat = os.stat(args.patients)
+        aggregate = VisitAggregate.load(args.patients + '.agg', [stat.st_mtime_ns, stat.st_size])
+        if aggregate is not None:
+            return aggregate
+    return load_database(args).aggregate
+
+
+def count_visits(args):
+    start = parse_date(args.date)
+    end = parse_date(args.end, 'end') if args.end else start
+    if is_sqlite(args.patients):
+        from dates import to_ordinal
+        from storage import SQLiteStore
+        store = SQLiteStore(args.patients)
+        try:
+            count = store.count_visits_between(to_ordinal(start), to_ordinal(end))
+        finally:
+            store.close()
+    else:
+        stats = statistics_source(args)
+        count = stats.count_visits_between(start, end)
+        report_unparsed(stats)
+    span = start if start == end else f"{start} to {end}"
+    output(args, f"Total visits on {span}: {count} visit(s)", {'start': start, 'end': end, 'count': count})
+    return 'count_visits', {'start': start, 'end': end}
+
+
+def stats(args):
+    start = parse_date(args.start, 'start') if args.start else None
+    end = parse_date(args.end, 'end') if args.end else None
+    group_by = [value for value in args.group_by.split(',') if value] if args.group_by else []
+    if not group_by:
+        source = statistics_source(args)
+        counts = source.visits_per_day(start, end)
+        report_unparsed(source)
+        if args.per_day:
+            lines = [f"{day}: {count} visit(s)" for day, count in counts.items()] or ["No visits found."]
+            output(args, '\n'.join(lines), {'visits_per_day': counts})
+            return 'generate_statistics', {}
+        groups = {(): sum(counts.values())}
+    else:
+        try:
+            groups = load_aggregate(args).query(start, end, group_by, args.per_day)
+        except ValueError as e:
+            raise CommandError(str(e))
+    columns = (['date'] if args.per_day else []) + group_by + ['count']
+    rows = [list(group) + [count] for group, count in groups.items()]
+    if args.json:
+        output(args, None, {'columns': columns, 'rows': rows})
+    else:
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows(rows)
+    return 'generate_statistics', {'group_by': ','.join(group_by)}
+
+
+# Batch operation files.
+
+def read_operations(path):
+    # (line number, operation dict) for every line of a .jsonl file or row
+    # of a .csv file. Empty CSV cells are left out, like absent JSON keys.
+    operations = []
+    if os.path.splitext(path)[1].lower() == '.csv':
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                operations.append((reader.line_num, {key: value for key, value in row.items()
+                                                     if key and value not in (None, '')}))
+        return operations
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                operation = json.loads(line)
+            except ValueError as e:
+                operation = f"not valid JSON ({e})"
+            operations.append((line_number, operation))
+    return operations
+
+
+def batch_records(db, operations):
+    # Journal-style records for PatientDatabase.apply_batch, plus a list of
+    # (line number, message) for every operation that cannot be applied.
+    # Operations are checked against the database as it will be when their
+    # turn comes, so a file may add a patient and then visits for it.
+    from utils import generate_random_id
+    patients = {}  # str(Patient_ID) -> [key, visit IDs as strings], or None once removed
+    records, errors = [], []
+
+    def current(patient_id):
+        text = str(patient_id).strip()
+        if text not in patients:
+            patient = db.get_patient(text)
+            patients[text] = None if patient is None else \
+                [patient.patient_id, {str(visit_id) for visit_id in patient.visits.ids()}]
+        return patients[text]
+
+    for line_number, operation in operations:
+        if not isinstance(operation, dict):
+            errors.append((line_number, operation if isinstance(operation, str) else "expected a JSON object"))
+            continue
+        op = operation.get('op')
+        patient_id = str(operation.get('patient_id', '')).strip()
+        if op not in ('add_patient', 'add_visit', 'remove_patient'):
+            errors.append((line_number, f"'op' must be add_patient, add_visit or remove_patient, not {op!r}"))
+            continue
+        if not patient_id:
+            errors.append((line_number, "'patient_id' is required"))
+            continue
+        patient = current(patient_id)
+        visit_id = operation.get('visit_id') or generate_random_id()
+        visit_time = operation.get('visit_time')
+        if op == 'add_patient':
+            if patient is not None:
+                errors.append((line_number, f"patient {patient_id} already exists; add a visit instead"))
+                continue
+            record = {'op': op, 'Patient_ID': id_key(patient_id), 'visits': []}
+            for field, column in zip(PATIENT_FIELDS, PATIENT_COLUMNS[1:]):
+                record[column] = operation.get(field)
+            if visit_time:
+                record['visits'].append([visit_id, visit_time])
+            patients[patient_id] = [record['Patient_ID'], {str(visit_id) for visit_id, _ in record['visits']}]
+        elif patient is None:
+            errors.append((line_number, f"patient {patient_id} not found"))
+            continue
+        elif op == 'add_visit':
+            if not visit_time:
+                errors.append((line_number, "'visit_time' is required"))
+                continue
+            if str(visit_id) in patient[1]:
+                errors.append((line_number, f"patient {patient_id} already has a visit {visit_id}"))
+                continue
+            record = {'op': op, 'Patient_ID': patient[0], 'Visit_ID': visit_id, 'Visit_time': visit_time}
+            patient[1].add(str(visit_id))
+        else:
+            record = {'op': op, 'Patient_ID': patient[0]}
+            patients[patient_id] = None
+        records.append(record)
+    return records, errors
+
+
+def import_operations(args):
+    # All or nothing: every operation is checked before any is applied, and
+    # the result is written with one save.
+    started = time.perf_counter()
+    try:
+        operations = read_operations(args.file)
+    except OSError as e:
+        raise CommandError(f"Cannot read {args.file}: {e}")
+    db = load_database(args)
+    loaded = time.perf_counter()
+    records, errors = batch_records(db, operations)
+    if errors:
+        for line_number, message in errors[:MAX_ERRORS]:
+            print(f"{args.file}:{line_number}: {message}", file=sys.stderr)
+        if len(errors) > MAX_ERRORS:
+            print(f"... and {len(errors) - MAX_ERRORS} more", file=sys.stderr)
+        raise CommandError(f"{len(errors)} invalid operation(s); nothing was changed")
+    counts = {op: 0 for op in ('add_patient', 'add_visit', 'remove_patient')}
+    for record in records:
+        counts[record['op']] += 1
+    if not args.dry_run and records:
+        db.apply_batch(records)
+    finished = time.perf_counter()
+    verb = 'Checked' if args.dry_run else 'Applied'
+    output(args, f"{verb} {len(records)} operation(s): {counts['add_patient']} patient(s) added, "
+                 f"{counts['add_visit']} visit(s) added, {counts['remove_patient']} patient(s) removed "
+                 f"(load {loaded - started:.2f} s, apply and save {finished - loaded:.2f} s)",
+           dict(counts, applied=0 if args.dry_run else len(records)))
+    return 'import', dict(counts, file=args.file, dry_run=args.dry_run)
+
+
+COMMANDS = {
+    'count-visits': count_visits,
+    'stats': stats,
+    'get-patient': get_patient,
+    'add-visit': add_visit,
+    'get-note': get_note,
+    'import': import_operations,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Patient Management System, non-interactive")
+    parser.add_argument('-u', '--username', required=True)
+    parser.add_argument('-p', '--password', required=True)
+    parser.add_argument('--patients', default='./Patient_data.csv',
+                        help="Patient_data.csv, or a SQLite database (default: %(default)s)")
+    parser.add_argument('--notes', default='./Notes.csv')
+    parser.add_argument('--credentials', default='./Credentials.csv')
+    parser.add_argument('--log', default='./user_activity_log.txt', help="Activity log; empty to not log")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    parser.add_argument('--metrics', action='store_true', help="Print operation latencies on exit")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    count_parser = subparsers.add_parser('count-visits', help="Visits on a date, or from DATE to --end")
+    count_parser.add_argument('date')
+    count_parser.add_argument('--end')
+
+    stats_parser = subparsers.add_parser('stats', help="Visits per day, optionally grouped")
+    stats_parser.add_argument('--start')
+    stats_parser.add_argument('--end')
+    stats_parser.add_argument('--group-by', help="Comma-separated: gender, race, ethnicity, insurance, zip_code")
+    stats_parser.add_argument('--no-per-day', dest='per_day', action='store_false',
+                              help="Total over the range instead of one row per day")
+
+    patient_parser = subparsers.add_parser('get-patient', help="Print a patient and their visits")
+    patient_parser.add_argument('patient_id')
+
+    visit_parser = subparsers.add_parser('add-visit', help="Add a visit to an existing patient")
+    visit_parser.add_argument('patient_id')
+    visit_parser.add_argument('visit_time')
+    visit_parser.add_argument('--visit-id', help="Default: a random ID")
+
+    note_parser = subparsers.add_parser('get-note', help="Print a clinical note")
+    note_parser.add_argument('note_id')
+
+    import_parser = subparsers.add_parser(
+        'import', help="Apply the operations in a .jsonl or .csv file in one transaction")
+    import_parser.add_argument('file')
+    import_parser.add_argument('--dry-run', action='store_true', help="Check the operations without applying them")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        import metrics
+        metrics.enable()
+    logger = None
+    if args.log:
+        from activity_log import ActivityLogger
+        logger = ActivityLogger(args.log)
+    try:
+        try:
+            user = find_user(args.username, args.password, args.credentials)
+        except OSError as e:
+            print(f"error: cannot read credentials: {e}", file=sys.stderr)
+            return 1
+        role = None if user is None else user.role
+        if role is None:
+            if logger is not None:
+                logger.log('failed_login', args.username, 'Unknown', source='cli')
+            print("Invalid credentials. Access denied.", file=sys.stderr)
+            return 1
+        if role not in ROLES[args.command]:
+            print(f"Role '{role}' may not run {args.command}.", file=sys.stderr)
+            return 1
+        started = time.perf_counter()
+        try:
+            action, details = COMMANDS[args.command](args)
+        except (CommandError, OSError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+        if logger is not None:
+            logger.log(action, args.username, role, time.perf_counter() - started, source='cli', **details)
+        return 0
+    finally:
+        if logger is not None:
+            logger.close()
+        if args.metrics:
+            import metrics
+            print(metrics.registry.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import argparse
+import csv
+import hashlib
+import hmac
+import mmap
+import os
+import struct
+
+MAGIC = b'CREDIDX1'
+HEADER = struct.Struct('<8sIQ')
+SLOT = struct.Struct('<QQ')
+LENGTH = struct.Struct('<H')
+SALT_BYTES = 16
+HASH_BYTES = 32
+DEFAULT_ITERATIONS = 100000
+
+
+def key_hash(username):
+    return int.from_bytes(hashlib.blake2b(username.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def hash_password(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations, HASH_BYTES)
+
+
+class User:
+    __slots__ = ('username', 'password', 'role')
+
+    def __init__(self, username, password, role):
+        self.username = username
+        self.password = password
+        self.role = role
+
+    @classmethod
+    def from_csv(cls, file_path):
+        # pandas is imported here so logins through the index never load it.
+        import pandas as pd
+        df = pd.read_csv(file_path)
+        return {
+            username: cls(username, password, role)
+            for username, password, role in zip(df['username'].tolist(), df['password'].tolist(), df['role'].tolist())
+        }
+
+    def authenticate(self, input_password):
+        # pandas reads a blank password as NaN, which never matches.
+        if not isinstance(self.password, str):
+            return False
+        return hmac.compare_digest(self.password.encode('utf-8'), str(input_password).encode('utf-8'))
+
+
+class CredentialIndex:
+    # Binary credential file: a header, an open-addressing hash table of
+    # (username hash, record offset) slots, then one record per user holding
+    # the username, role, salt and PBKDF2-SHA256 hash. A lookup reads one or
+    # two slots and one record through mmap instead of parsing every user.
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.iterations, self.slot_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a credential index")
+        self._dummy_salt = os.urandom(SALT_BYTES)
+
+    def _read_record(self, offset):
+        (name_length,) = LENGTH.unpack_from(self._map, offset)
+        offset += LENGTH.size
+        username = self._map[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        (role_length,) = LENGTH.unpack_from(self._map, offset)
+        offset += LENGTH.size
+        role = self._map[offset:offset + role_length].decode('utf-8')
+        offset += role_length
+        salt = self._map[offset:offset + SALT_BYTES]
+        digest = self._map[offset + SALT_BYTES:offset + SALT_BYTES + HASH_BYTES]
+        return username, role, salt, digest
+
+    def lookup(self, username):
+        wanted = key_hash(username)
+        slot = wanted % self.slot_count
+        for _ in range(self.slot_count):
+            stored, offset = SLOT.unpack_from(self._map, HEADER.size + slot * SLOT.size)
+            if offset == 0:
+                return None
+            if stored == wanted:
+                record = self._read_record(offset)
+                if record[0] == username:
+                    return record
+            slot = (slot + 1) % self.slot_count
+        return None
+
+    def verify(self, username, password):
+        # Unknown users still pay for one hash, so timing does not reveal
+        # which usernames exist.
+        record = self.lookup(username)
+        if record is None:
+            hash_password(password, self._dummy_salt, self.iterations)
+            return None
+        _, role, salt, digest = record
+        if hmac.compare_digest(hash_password(password, salt, self.iterations), digest):
+            return role
+        return None
+
+    def __len__(self):
+        count = 0
+        for slot in range(self.slot_count):
+            if SLOT.unpack_from(self._map, HEADER.size + slot * SLOT.size)[1]:
+                count += 1
+        return count
+
+    def close(self):
+        self._map.close()
+
+    @staticmethod
+    def build(path, users, iterations=DEFAULT_ITERATIONS):
+        records = []
+        for username, password, role in users:
+            username, role = str(username), str(role)
+            salt = os.urandom(SALT_BYTES)
+            name_bytes = username.encode('utf-8')
+            role_bytes = role.encode('utf-8')
+            records.append((username, LENGTH.pack(len(name_bytes)) + name_bytes +
+                            LENGTH.pack(len(role_bytes)) + role_bytes +
+                            salt + hash_password(str(password), salt, iterations)))
+        # Keep the table at most half full so probe chains stay short.
+        slot_count = max(2 * len(records), 1)
+        slots = bytearray(slot_count * SLOT.size)
+        offset = HEADER.size + len(slots)
+        body = []
+        for username, record in records:
+            wanted = key_hash(username)
+            slot = wanted % slot_count
+            while SLOT.unpack_from(slots, slot * SLOT.size)[1]:
+                slot = (slot + 1) % slot_count
+            SLOT.pack_into(slots, slot * SLOT.size, wanted, offset)
+            body.append(record)
+            offset += len(record)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, iterations, slot_count))
+            f.write(slots)
+            f.write(b''.join(body))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def index_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + '.idx'
+
+
+def index_is_current(csv_path, index_path):
+    # An index built before the CSV was last edited is missing those edits.
+    # Once the CSV is deleted the index is all there is.
+    try:
+        index_mtime = os.stat(index_path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+    try:
+        return os.stat(csv_path).st_mtime_ns <= index_mtime
+    except FileNotFoundError:
+        return True
+
+
+def migrate(csv_path, index_path, iterations=DEFAULT_ITERATIONS):
+    with open(csv_path, newline='') as f:
+        users = [(row['username'], row['password'], row['role']) for row in csv.DictReader(f)]
+    CredentialIndex.build(index_path, users, iterations)
+    print(f"Wrote {len(users)} hashed credential(s) to {index_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hashed credential index tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="Hash the passwords in Credentials.csv into an index")
+    migrate_parser.add_argument('--csv', default='./Credentials.csv')
+    migrate_parser.add_argument('--out', help="Index path (default: next to the CSV, with an .idx extension)")
+    migrate_parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate(args.csv, args.out or index_path_for(args.csv), args.iterations)
+
+
+if __name__ == "__main__":
+    main()
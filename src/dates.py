@@ -0,0 +1,204 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = "%m/%d/%Y"
+# Formats tried in order. A visit time that prints back exactly in the
+# format it parsed with is stored as epoch seconds plus the index of that
+# format; the first three are the ones the application itself writes.
+FORMATS = ('%m/%d/%Y', '%m/%d/%Y %H:%M', '%m/%d/%Y %H:%M:%S',
+           '%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S')
+# Anything left is read by the date in its first word, the way visit days
+# were always read, so "5/3/2023 10:00 AM" still counts on 05/03/2023.
+FALLBACK_FORMATS = ('%m/%d/%Y', '%Y-%m-%d')
+RAW = -1  # has a date, but the text is kept because no format reprints it
+MISSING = -2  # empty slot
+INVALID = -3  # text without a date
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+SECONDS_PER_DAY = 86400
+CACHE_SIZE = 100000
+# Below this many values, strptime is cheaper than a pandas round trip.
+VECTORIZE_FROM = 64
+
+# Visit times repeat heavily, so each distinct string is parsed once per
+# process: string -> (epoch seconds, code).
+_parsed = {}
+_formatted = {}
+
+
+def has_date(code):
+    return code >= RAW
+
+
+def day_of(epoch):
+    return epoch // SECONDS_PER_DAY + EPOCH_ORDINAL
+
+
+def _parse_one(value):
+    for code, fmt in enumerate(FORMATS):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return int((parsed - EPOCH).total_seconds()), code if parsed.strftime(fmt) == value else RAW
+    words = value.split()
+    for fmt in FALLBACK_FORMATS:
+        try:
+            parsed = datetime.strptime(words[0], fmt) if words else None
+        except ValueError:
+            continue
+        if parsed is not None:
+            return int((parsed - EPOCH).total_seconds()), RAW
+    return 0, INVALID
+
+
+def _parse_column(strings):
+    # Same rules as _parse_one over a Series of distinct strings, one
+    # pd.to_datetime call per format on whatever is still unparsed.
+    epochs = np.zeros(len(strings), dtype=np.int64)
+    codes = np.full(len(strings), INVALID, dtype=np.int8)
+    left = np.ones(len(strings), dtype=bool)
+    attempts = [(code, fmt, strings) for code, fmt in enumerate(FORMATS)]
+    first_words = strings.str.split().str[0]
+    attempts += [(RAW, fmt, first_words) for fmt in FALLBACK_FORMATS]
+    for code, fmt, column in attempts:
+        positions = np.flatnonzero(left)
+        if len(positions) == 0:
+            break
+        subset = column.iloc[positions]
+        parsed = pd.to_datetime(subset, format=fmt, errors='coerce')
+        ok = parsed.notna().to_numpy()
+        if not ok.any():
+            continue
+        positions = positions[ok]
+        parsed = parsed[ok]
+        epochs[positions] = parsed.to_numpy().astype('datetime64[s]').astype(np.int64)
+        if code == RAW:
+            codes[positions] = RAW
+        else:
+            exact = (parsed.dt.strftime(fmt) == subset[ok]).to_numpy()
+            codes[positions] = np.where(exact, code, RAW)
+        left[positions] = False
+    return epochs, codes
+
+
+def _remember(strings, epochs, codes):
+    if len(_parsed) + len(strings) > CACHE_SIZE:
+        _parsed.clear()
+    _parsed.update(zip(strings, zip(epochs.tolist(), codes.tolist())))
+
+
+def parse_times(values):
+    # Parses a column of visit times into (int64 epoch seconds, int8 codes).
+    # Each distinct value is looked up once; values not seen before are parsed
+    # together. Codes are a FORMATS index, RAW, MISSING or INVALID.
+    if len(values) < VECTORIZE_FROM:
+        results = [parse_time(value) for value in values]
+        return (np.array([epoch for epoch, _ in results], dtype=np.int64),
+                np.array([code for _, code in results], dtype=np.int8))
+    positions, uniques = pd.factorize(pd.Series(values, dtype=object))
+    # factorize numbers missing values -1, which picks the extra last slot.
+    unique_epochs = np.zeros(len(uniques) + 1, dtype=np.int64)
+    unique_codes = np.full(len(uniques) + 1, INVALID, dtype=np.int8)
+    unique_codes[-1] = MISSING
+    todo = []
+    for i, value in enumerate(uniques):
+        if not isinstance(value, str):
+            continue
+        hit = _parsed.get(value)
+        if hit is None:
+            todo.append(i)
+        else:
+            unique_epochs[i], unique_codes[i] = hit
+    if todo:
+        strings = [uniques[i] for i in todo]
+        epochs, codes = _parse_column(pd.Series(strings, dtype=object))
+        unique_epochs[todo] = epochs
+        unique_codes[todo] = codes
+        _remember(strings, epochs, codes)
+    return unique_epochs[positions], unique_codes[positions]
+
+
+def parse_time(value):
+    if isinstance(value, str):
+        hit = _parsed.get(value)
+        if hit is None:
+            hit = _parse_one(value)
+            if len(_parsed) >= CACHE_SIZE:
+                _parsed.clear()
+            _parsed[value] = hit
+        return hit
+    if value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and value != value):
+        return 0, MISSING
+    return 0, INVALID
+
+
+def parse_day(value):
+    # Day ordinal of a visit time, or None when it has no date.
+    epoch, code = parse_time(value)
+    return day_of(epoch) if has_date(code) else None
+
+
+def parse_days(values, unparsed=None):
+    # Day ordinals of the values that have a date. Text without one is
+    # tallied in the `unparsed` Counter when given.
+    epochs, codes = parse_times(values)
+    dated = codes >= RAW
+    if unparsed is not None:
+        tally_unparsed(values, codes, unparsed)
+    return epochs[dated] // SECONDS_PER_DAY + EPOCH_ORDINAL
+
+
+def visit_days(values):
+    # Day ordinal of every value, None where there is no date.
+    epochs, codes = parse_times(values)
+    return [day_of(epoch) if has_date(code) else None for epoch, code in zip(epochs.tolist(), codes.tolist())]
+
+
+def tally_unparsed(values, codes, unparsed):
+    for i in np.flatnonzero(codes == INVALID).tolist():
+        value = values[i]
+        if not isinstance(value, str) or value.strip():
+            unparsed[value] += 1
+
+
+def to_ordinal(value):
+    # Day ordinal of a date given to a query: a date, a datetime or a string
+    # in one of FORMATS. Raises ValueError for anything else.
+    if not isinstance(value, str):
+        return value.toordinal()
+    epoch, code = parse_time(value.strip())
+    if not has_date(code):
+        raise ValueError(f"time data {value!r} does not match format {DATE_FORMAT!r}")
+    return day_of(epoch)
+
+
+def format_day(ordinal):
+    text = _formatted.get(ordinal)
+    if text is None:
+        if len(_formatted) >= CACHE_SIZE:
+            _formatted.clear()
+        text = _formatted[ordinal] = date.fromordinal(ordinal).strftime(DATE_FORMAT)
+    return text
+
+
+def format_time(epoch, code):
+    key = (epoch, code)
+    text = _formatted.get(key)
+    if text is None:
+        if len(_formatted) >= CACHE_SIZE:
+            _formatted.clear()
+        text = _formatted[key] = (EPOCH + timedelta(seconds=epoch)).strftime(FORMATS[code])
+    return text
+
+
+def summarize(unparsed, limit=5):
+    # One line for every visit time that has no date, or None.
+    total = sum(unparsed.values())
+    if not total:
+        return None
+    examples = ', '.join(f"{value!r} ({count})" for value, count in unparsed.most_common(limit))
+    more = '' if len(unparsed) <= limit else f", and {len(unparsed) - limit} other value(s)"
+    return f"{total} visit time(s) could not be parsed and are left out of visit counts: {examples}{more}"
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def id_text(patient_id):
+    # The form patient IDs are compared in. pandas reads IDs as ints, or as
+    # strings once any ID in the file is not a number, while typed-in IDs
+    # are strings and cli.py journals numeric ones as ints.
+    text = str(patient_id).strip()
+    return str(int(text)) if text.lstrip('-').isdigit() else text
+
+
+def id_key(patient_id):
+    # The form a new ID is stored in: an int when it is numeric, as pandas
+    # reads the IDs in the CSV.
+    text = id_text(patient_id)
+    return int(text) if text.lstrip('-').isdigit() else text
+
+
+def id_candidates(patient_id):
+    # Keys to try, in order, for an ID that may be stored in either form.
+    yield patient_id
+    key = id_key(patient_id)
+    if isinstance(key, int):
+        yield key
+    yield id_text(patient_id)
+
+
+def journal_is_empty(patients_path):
+    journal_path = patients_path + '.journal'
+    return not os.path.exists(journal_path) or os.path.getsize(journal_path) == 0
+
+
+def fsync_directory(path):
+    # Make a rename durable. Not every platform lets us open a directory.
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_csv(df, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        df.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(path)
+
+
+class PatientJournal:
+    # Append-only log of patient mutations, one JSON record per line.
+    # Each append is fsynced before the change is applied in memory.
+    # cli.py appends from other processes, so appends, reads and the clear
+    # after a compaction all happen under an exclusive lock on path + '.lock'
+    # (the journal itself is deleted by clear). offset is how far this
+    # journal has read or written the file; read_new returns the records
+    # other processes appended after it.
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.offset = 0
+        self._file = None
+        self._lock = threading.RLock()
+        self._lock_fd = None
+        self._depth = 0
+
+    @contextmanager
+    def locked(self):
+        # Reentrant, so a compaction can run inside a locked append.
+        with self._lock:
+            if self._depth == 0 and fcntl is not None:
+                if self._lock_fd is None:
+                    self._lock_fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._lock_fd is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def append(self, record):
+        data = (json.dumps(record) + "\n").encode('utf-8')
+        with self.locked():
+            if self._file is not None and not self._is_current(self._file):
+                # Another process cleared the journal after a compaction.
+                self.close()
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+            caught_up = self._file.seek(0, os.SEEK_END) == self.offset
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.count += 1
+            if caught_up:
+                self.offset += len(data)
+
+    def replay(self):
+        with self.locked():
+            records, self.offset = self._read_from(0)
+            self.count = len(records)
+            return records
+
+    def read_new(self):
+        with self.locked():
+            try:
+                if os.stat(self.path).st_size == self.offset:
+                    return []
+            except FileNotFoundError:
+                self.offset = 0
+                return []
+            records, self.offset = self._read_from(self.offset)
+            self.count += len(records)
+            return records
+
+    def _read_from(self, offset):
+        # (complete records from offset on, offset after the last of them)
+        records = []
+        if not os.path.exists(self.path):
+            return records, 0
+        good_offset = offset
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                good_offset += len(line)
+            torn = f.seek(0, os.SEEK_END) != good_offset
+        if torn:
+            # A crash interrupted the last append; drop the partial record so
+            # new appends do not get glued onto it.
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+                os.fsync(f.fileno())
+        return records, good_offset
+
+    def _is_current(self, f):
+        try:
+            return os.stat(self.path).st_ino == os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def clear(self):
+        with self.locked():
+            self.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+                fsync_directory(self.path)
+            self.count = 0
+            self.offset = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with self._lock:
+            if self._depth == 0 and self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
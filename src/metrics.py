@@ -0,0 +1,185 @@
+import cProfile
+import functools
+import math
+import pstats
+import sys
+import threading
+from time import perf_counter
+
+# Histogram buckets start at 1 microsecond and grow by 2 ** (1/8), about 9%,
+# so a percentile is off by at most one bucket width and memory stays small.
+MIN_SECONDS = 1e-6
+GROWTH = 2 ** 0.125
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        bucket = int(math.log(seconds / MIN_SECONDS, GROWTH)) if seconds > MIN_SECONDS else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        # Upper edge of the bucket holding the value at this rank.
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(MIN_SECONDS * GROWTH ** (bucket + 1), self.max)
+        return self.max
+
+
+class Registry:
+    # Counters and latency histograms keyed by operation name. Nothing is
+    # recorded until the registry is enabled.
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def snapshot(self):
+        # {name: {count, mean, p50, p95, max}} in seconds, plus the counters.
+        with self._lock:
+            latencies = {
+                name: {'count': h.count, 'mean': h.total / h.count, 'p50': h.percentile(0.5),
+                       'p95': h.percentile(0.95), 'max': h.max}
+                for name, h in self.histograms.items()
+            }
+            return latencies, dict(self.counters)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def report(self):
+        latencies, counters = self.snapshot()
+        lines = [f"{'operation':32} {'count':>8} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}"]
+        for name, row in sorted(latencies.items()):
+            lines.append(f"{name:32} {row['count']:8} {row['p50'] * 1000:10.2f} {row['p95'] * 1000:10.2f} "
+                         f"{row['max'] * 1000:10.2f}")
+        for name, value in sorted(counters.items()):
+            lines.append(f"{name:32} {value:8}")
+        return '\n'.join(lines)
+
+
+registry = Registry()
+
+
+def enable(on=True):
+    registry.enabled = on
+
+
+class Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter() if registry.enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            registry.observe(self.name, perf_counter() - self.start)
+            if exc_type is not None:
+                registry.incr(self.name + '.errors')
+
+    def __call__(self, func):
+        name = self.name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Disabled, this check is the whole cost of the instrumentation.
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                registry.incr(name + '.errors')
+                raise
+            finally:
+                registry.observe(name, perf_counter() - start)
+        return wrapper
+
+
+def timed(name):
+    # Use as @timed('db.load') on a function or as `with timed('db.load'):`.
+    return Timer(name)
+
+
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class Profiler:
+    # Before Python 3.12, cProfile only sees the thread it was enabled on, so
+    # work handed to other threads goes through runcall, which profiles it
+    # separately; the report merges them all. From 3.12 on, the main profile
+    # sees every thread and a second one cannot be enabled alongside it.
+    def __init__(self):
+        self.main = cProfile.Profile()
+        self.others = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.main.enable()
+
+    def runcall(self, func, *args, **kwargs):
+        if PROFILES_ALL_THREADS:
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.others.append(profile)
+
+    def report(self, path=None, limit=30, stream=sys.stderr):
+        self.main.disable()
+        with self._lock:
+            profiles = [self.main] + self.others
+        stats = None
+        for profile in profiles:
+            # pstats refuses a profile that never ran.
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile, stream=stream)
+            else:
+                stats.add(profile)
+        if stats is None:
+            print("No profile data was collected.", file=stream)
+            return
+        if path:
+            stats.dump_stats(path)
+            print(f"Profile written to {path} (open with: python -m pstats {path})", file=stream)
+        stats.sort_stats('cumulative').print_stats(limit)
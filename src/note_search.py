@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+from note_store import iter_records, parse_record
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY, note_id TEXT UNIQUE, patient_id TEXT, visit_id TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(note_text, content='', tokenize='porter unicode61');
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 0), offset INTEGER, tail_hash TEXT
+);
+"""
+TOKEN = re.compile(r'"[^"]*"\*?|\(|\)|[^\s()"]+')
+OPERATORS = ('AND', 'OR', 'NOT')
+TAIL_BYTES = 4096
+DEFAULT_LIMIT = 20
+
+
+def match_query(text):
+    # Turn a search box entry into an FTS5 query. Quoted phrases, AND, OR,
+    # NOT, parentheses and a trailing * for prefixes keep their meaning;
+    # every other word is quoted so that characters like '-' or ':' are
+    # searched for instead of being read as query syntax.
+    parts = []
+    for token in TOKEN.findall(text):
+        if token in OPERATORS or token in ('(', ')'):
+            parts.append(token)
+            continue
+        prefix = token.endswith('*')
+        word = token.rstrip('*')
+        if word.startswith('"') and word.endswith('"') and len(word) > 1:
+            word = word[1:-1]
+        if word:
+            parts.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    if not parts:
+        raise ValueError("Enter at least one search term.")
+    return ' '.join(parts)
+
+
+def file_tail_hash(path, offset):
+    # Hash of the bytes just before offset, to notice a file rewritten in
+    # place rather than appended to.
+    start = max(offset - TAIL_BYTES, 0)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+
+def is_complete(data, width):
+    # A last row without a newline is indexed once it parses to every column.
+    if data.count(b'"') % 2:
+        return False
+    try:
+        return len(parse_record(data)) >= width
+    except UnicodeDecodeError:
+        return False
+
+
+def ends_row(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(offset - 1)
+        return f.read(1) == b'\n'
+
+
+class NoteSearch:
+    # Full-text index over the Note_text column of Notes.csv, kept in a
+    # contentless SQLite FTS5 table (term -> notes with positions) so the
+    # note text is not stored twice. Rows appended to Notes.csv are indexed
+    # on the next search; any other change to the file rebuilds the index.
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path if index_path is not None else path + '.fts.db'
+        self.conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def _state(self):
+        row = self.conn.execute("SELECT offset, tail_hash FROM sync_state WHERE id = 0").fetchone()
+        return row if row is not None else (0, None)
+
+    def sync(self):
+        with self.lock:
+            offset, tail_hash = self._state()
+            size = os.path.getsize(self.path)
+            # The file was rewritten, or grew after a last row without a
+            # newline was indexed, which may have been only part of that row.
+            if offset and (size < offset or file_tail_hash(self.path, offset) != tail_hash
+                           or (size > offset and not ends_row(self.path, offset))):
+                with self.conn:
+                    self.conn.execute("DELETE FROM notes")
+                    self.conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('delete-all')")
+                    self.conn.execute("DELETE FROM sync_state")
+                offset = 0
+            if size == offset:
+                return 0
+            return self._index_from(offset)
+
+    def _index_from(self, offset):
+        with open(self.path, 'rb') as f:
+            header = next(iter_records(f), None)
+            columns = parse_record(header[1]) if header is not None else []
+            if 'Note_ID' not in columns or 'Note_text' not in columns:
+                return 0
+            note_col = columns.index('Note_ID')
+            text_col = columns.index('Note_text')
+            patient_col = columns.index('Patient_ID') if 'Patient_ID' in columns else None
+            visit_col = columns.index('Visit_ID') if 'Visit_ID' in columns else None
+            if offset == 0:
+                offset = len(header[1])
+            f.seek(offset)
+            added = 0
+            with self.conn:
+                for start, data in iter_records(f, offset):
+                    if not data.endswith(b'\n') and not is_complete(data, len(columns)):
+                        # A row still being written; pick it up next time.
+                        break
+                    offset = start + len(data)
+                    fields = parse_record(data)
+                    if len(fields) <= max(note_col, text_col):
+                        continue
+                    note_id = fields[note_col]
+                    # A later row with the same Note_ID replaces the earlier
+                    # one; its old postings no longer join to a note.
+                    self.conn.execute("DELETE FROM notes WHERE note_id = ?", (note_id,))
+                    cursor = self.conn.execute(
+                        "INSERT INTO notes (note_id, patient_id, visit_id) VALUES (?, ?, ?)",
+                        (note_id,
+                         fields[patient_col] if patient_col is not None and patient_col < len(fields) else '',
+                         fields[visit_col] if visit_col is not None and visit_col < len(fields) else ''))
+                    self.conn.execute("INSERT INTO notes_fts (rowid, note_text) VALUES (?, ?)",
+                                      (cursor.lastrowid, fields[text_col]))
+                    added += 1
+                self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (0, ?, ?)",
+                                  (offset, file_tail_hash(self.path, offset)))
+        return added
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        # Returns (note_id, patient_id, visit_id, score), best match first;
+        # the score is BM25, higher meaning more relevant.
+        self.sync()
+        with self.lock:
+            return search_fts(self.conn, "notes_fts", "notes", "id", query, limit)
+
+    def close(self):
+        self.conn.close()
+
+
+def search_fts(conn, fts_table, notes_table, key_column, query, limit=DEFAULT_LIMIT):
+    try:
+        rows = conn.execute(
+            f"SELECT n.note_id, n.patient_id, n.visit_id, -f.rank FROM {fts_table} f "
+            f"JOIN {notes_table} n ON n.{key_column} = f.rowid "
+            f"WHERE {fts_table} MATCH ? ORDER BY f.rank LIMIT ?", (match_query(query), limit)).fetchall()
+    except sqlite3.OperationalError as e:
+        raise ValueError(f"Invalid search query: {e}")
+    return [(note_id, patient_id, visit_id, round(score, 3)) for note_id, patient_id, visit_id, score in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search over Notes.csv")
+    parser.add_argument('--notes', default='./Notes.csv')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('sync', help="Index notes added since the last run")
+    search_parser = subparsers.add_parser('search', help="Search note text")
+    search_parser.add_argument('query', help='e.g. hydrocephalus OR chordoma, "spinal fluid" NOT shunt')
+    search_parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    index = NoteSearch(args.notes)
+    if args.command == 'sync':
+        print(f"Indexed {index.sync()} new note(s).")
+    else:
+        for note_id, patient_id, visit_id, score in index.search(args.query, args.limit):
+            print(f"Note {note_id} (patient {patient_id}, visit {visit_id}): score {score}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
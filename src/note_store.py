@@ -0,0 +1,248 @@
+import csv
+import io
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+MAGIC = b'NOTEIDX2'
+# magic, Notes.csv mtime_ns and size, Note_ID and Note_text columns (-1 when
+# absent), note count, slot count, offset of the JSON columns
+HEADER = struct.Struct('<8sqqiiQQQ')
+# crc32 of the Note_ID, row offset, row length (0 for an empty slot)
+SLOT = struct.Struct('<IQQ')
+
+
+def iter_records(f, offset=0):
+    # Yield (offset, bytes) for every CSV record in a binary file, starting
+    # at the file's current position, which is taken to be offset. A record
+    # ends at a newline that is not inside a quoted field, which is the case
+    # once the record holds an even number of quote characters.
+    start = offset
+    quotes = 0
+    parts = []
+    for line in f:
+        parts.append(line)
+        quotes += line.count(b'"')
+        offset += len(line)
+        if quotes % 2 == 0:
+            yield start, b''.join(parts)
+            start = offset
+            quotes = 0
+            parts = []
+    if parts:
+        yield start, b''.join(parts)
+
+
+def parse_record(data):
+    return next(csv.reader(io.StringIO(data.decode('utf-8'))), [])
+
+
+def group_notes(keys, note_ids):
+    groups = {}
+    for key, note_id in zip(keys, note_ids):
+        groups.setdefault(key, []).append(note_id)
+    return groups
+
+
+class IndexSnapshot:
+    # One opened version of the index, plus a lazily opened map of the
+    # Notes.csv it describes. NoteStore swaps in a new snapshot when
+    # Notes.csv changes instead of closing this one, so a thread still
+    # reading it is not cut off; its maps close once nothing refers to it.
+    def __init__(self, path, index):
+        self.path = path
+        self.index = index
+        _, mtime_ns, size, note_column, text_column, self.count, self.slot_count, self.columns_at = \
+            HEADER.unpack_from(index, 0)
+        self.signature = (mtime_ns, size)
+        self.note_column = None if note_column < 0 else note_column
+        self.text_column = None if text_column < 0 else text_column
+        self._map = None
+        self._lock = threading.Lock()
+        self._by_patient = None
+        self._by_visit = None
+
+    def _columns(self):
+        return json.loads(self.index[self.columns_at:])
+
+    @property
+    def by_patient(self):
+        if self._by_patient is None:
+            columns = self._columns()
+            self._by_patient = group_notes(columns['patient_ids'], columns['note_ids'])
+        return self._by_patient
+
+    @property
+    def by_visit(self):
+        if self._by_visit is None:
+            columns = self._columns()
+            self._by_visit = group_notes(columns['visit_ids'], columns['note_ids'])
+        return self._by_visit
+
+    def read(self, offset, length):
+        data = self._map
+        if data is None:
+            with self._lock:
+                if self._map is None:
+                    with open(self.path, 'rb') as f:
+                        self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                data = self._map
+        return data[offset:offset + length]
+
+    def find(self, note_id):
+        # Fields of the row holding note_id, or None. Slots only keep a hash
+        # of the ID, so the row itself confirms the match.
+        if self.note_column is None:
+            return None
+        wanted = zlib.crc32(note_id.encode('utf-8'))
+        slot = wanted % self.slot_count
+        for _ in range(self.slot_count):
+            stored, offset, length = SLOT.unpack_from(self.index, HEADER.size + slot * SLOT.size)
+            if not length:
+                return None
+            if stored == wanted:
+                fields = parse_record(self.read(offset, length))
+                if len(fields) > self.note_column and fields[self.note_column] == note_id:
+                    return fields
+            slot = (slot + 1) % self.slot_count
+        return None
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+        self.index.close()
+
+
+class NoteStore:
+    # Read-only view of Notes.csv. A persistent index maps each Note_ID to
+    # the byte range of its row, so a lookup reads one row through mmap
+    # instead of parsing the whole file. The index is an open-addressing
+    # hash table read through mmap as well, so opening it costs the same
+    # for ten notes as for a million; the note, patient and visit ID columns
+    # behind for_patient and for_visit follow it as JSON and are only
+    # decoded when first needed. Safe to share between threads: each call
+    # works on one IndexSnapshot, and only reloading takes a lock.
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path if index_path is not None else path + '.idx'
+        self._lock = threading.Lock()
+        self._snapshot = self._load_index()
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _open_index(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(index) < HEADER.size or HEADER.unpack_from(index, 0)[0] != MAGIC:
+            index.close()
+            return None
+        return index
+
+    def _load_index(self):
+        index = self._open_index()
+        if index is None or HEADER.unpack_from(index, 0)[1:3] != self._signature():
+            if index is not None:
+                index.close()
+            self.build_index()
+            index = self._open_index()
+        return IndexSnapshot(self.path, index)
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is None or self._signature() != snapshot.signature:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or self._signature() != snapshot.signature:
+                    snapshot = self._snapshot = self._load_index()
+        return snapshot
+
+    @property
+    def note_column(self):
+        return self._current().note_column
+
+    @property
+    def text_column(self):
+        return self._current().text_column
+
+    @property
+    def by_patient(self):
+        return self._current().by_patient
+
+    @property
+    def by_visit(self):
+        return self._current().by_visit
+
+    def build_index(self):
+        mtime_ns, size = self._signature()
+        note_ids, patient_ids, visit_ids, rows = [], [], [], {}
+        with open(self.path, 'rb') as f:
+            records = iter_records(f)
+            header = next(records, None)
+            columns = parse_record(header[1]) if header is not None else []
+            note_col = columns.index('Note_ID') if 'Note_ID' in columns else None
+            patient_col = columns.index('Patient_ID') if 'Patient_ID' in columns else None
+            visit_col = columns.index('Visit_ID') if 'Visit_ID' in columns else None
+            text_column = columns.index('Note_text') if 'Note_text' in columns else None
+            for offset, data in records:
+                fields = parse_record(data)
+                if note_col is None or len(fields) <= note_col:
+                    continue
+                note_ids.append(fields[note_col])
+                patient_ids.append(fields[patient_col] if patient_col is not None else '')
+                visit_ids.append(fields[visit_col] if visit_col is not None else '')
+                # A repeated Note_ID resolves to its last row.
+                rows[fields[note_col]] = (offset, len(data))
+        # Keep the table at most half full so probe chains stay short.
+        slot_count = max(2 * len(rows), 1)
+        slots = bytearray(slot_count * SLOT.size)
+        for note_id, (offset, length) in rows.items():
+            wanted = zlib.crc32(note_id.encode('utf-8'))
+            slot = wanted % slot_count
+            while SLOT.unpack_from(slots, slot * SLOT.size)[2]:
+                slot = (slot + 1) % slot_count
+            SLOT.pack_into(slots, slot * SLOT.size, wanted, offset, length)
+        # Per process, so two processes building at once do not share a file.
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, mtime_ns, size, -1 if note_col is None else note_col,
+                                -1 if text_column is None else text_column, len(rows), slot_count,
+                                HEADER.size + len(slots)))
+            f.write(slots)
+            f.write(json.dumps({'note_ids': note_ids, 'patient_ids': patient_ids,
+                                'visit_ids': visit_ids}).encode('utf-8'))
+        os.replace(tmp_path, self.index_path)
+
+    def get(self, note_id, default=None):
+        snapshot = self._current()
+        fields = snapshot.find(str(note_id))
+        if fields is None or snapshot.text_column is None or len(fields) <= snapshot.text_column:
+            return default
+        return fields[snapshot.text_column]
+
+    def for_patient(self, patient_id):
+        return list(self._current().by_patient.get(str(patient_id), []))
+
+    def for_visit(self, visit_id):
+        return list(self._current().by_visit.get(str(visit_id), []))
+
+    def __contains__(self, note_id):
+        return self._current().find(str(note_id)) is not None
+
+    def __len__(self):
+        return self._current().count
+
+    def close(self):
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
@@ -0,0 +1,99 @@
+import io
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from dates import parse_days, to_ordinal
+from streaming import format_daily_counts, tally_days
+
+DEFAULT_PARTITION_BYTES = 32 * 2 ** 20
+
+
+def partition_file(file_path, parts):
+    # Split the data rows into byte ranges. Boundaries are moved forward to
+    # the next line start, which assumes no field contains a newline (true
+    # for Patient_data.csv).
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        f.readline()
+        data_start = f.tell()
+        step = max((size - data_start) // max(parts, 1), 1)
+        bounds = [data_start]
+        for offset in range(data_start + step, size, step):
+            if offset <= bounds[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def count_partition(file_path, start, end):
+    # (visits per day, visit times without a date) for one byte range.
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read(end - start)
+    columns = pd.read_csv(io.BytesIO(header), nrows=0).columns
+    visit_columns = [col for col in columns if col.startswith("Visit_time_")]
+    counts = Counter()
+    unparsed = Counter()
+    if not visit_columns or not data.strip():
+        return counts, unparsed
+    df = pd.read_csv(io.BytesIO(header + data), usecols=visit_columns, dtype=str)
+    values = df.to_numpy(dtype=object).ravel()
+    return tally_days(parse_days(values[pd.notna(values)], unparsed), counts), unparsed
+
+
+def count_days(file_path, workers, partition_bytes=DEFAULT_PARTITION_BYTES, unparsed=None):
+    # Use at least one partition per worker, and small enough partitions that
+    # each worker only ever holds partition_bytes of the file at a time.
+    parts = max(workers, -(-os.path.getsize(file_path) // partition_bytes))
+    partitions = partition_file(file_path, parts)
+    counts = Counter()
+    unparsed = Counter() if unparsed is None else unparsed
+    if workers <= 1:
+        results = (count_partition(file_path, start, end) for start, end in partitions)
+        for partition_counts, partition_unparsed in results:
+            counts.update(partition_counts)
+            unparsed.update(partition_unparsed)
+        return counts
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(count_partition, file_path, start, end) for start, end in partitions]
+        for future in futures:
+            partition_counts, partition_unparsed = future.result()
+            counts.update(partition_counts)
+            unparsed.update(partition_unparsed)
+    return counts
+
+
+class ParallelStatistics:
+    # Same statistics methods as PatientDatabase, computed over partitions of
+    # the CSV snapshot on a process pool. Pending journal changes are not
+    # included. unparsed_visit_times holds the visit times without a date
+    # seen by the last scan.
+    def __init__(self, file_path, workers, partition_bytes=DEFAULT_PARTITION_BYTES):
+        self.file_path = file_path
+        self.workers = workers
+        self.partition_bytes = partition_bytes
+        self.unparsed_visit_times = Counter()
+
+    def count_days(self):
+        self.unparsed_visit_times = Counter()
+        return count_days(self.file_path, self.workers, self.partition_bytes, self.unparsed_visit_times)
+
+    def visits_per_day(self, start=None, end=None):
+        return format_daily_counts(self.count_days(), start, end)
+
+    def count_visits_between(self, start, end):
+        first, last = to_ordinal(start), to_ordinal(end)
+        return sum(count for day, count in self.count_days().items() if first <= day <= last)
+
+    def count_visits_on_date(self, target_date):
+        return self.count_visits_between(target_date, target_date)
@@ -0,0 +1,126 @@
+import json
+from datetime import datetime
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlencode
+from urllib.request import Request, urlopen
+
+from classes import Patient
+
+
+class RemoteError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def date_arg(value):
+    return value.strftime("%m/%d/%Y") if isinstance(value, datetime) else value
+
+
+class RemoteDatabase:
+    # Client for server.py with the PatientDatabase methods PatientApp uses,
+    # so the GUI can run against a shared server instead of loading the data
+    # itself. Requests that the server rejects raise RemoteError, or
+    # ValueError for bad input.
+    def __init__(self, base_url, token, username, role, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.username = username
+        self.role = role
+        self.timeout = timeout
+
+    @classmethod
+    def login(cls, base_url, username, password, timeout=30):
+        client = cls(base_url, None, username, None, timeout)
+        data = client._request('POST', '/login', body={'username': username, 'password': password})
+        client.token = data['token']
+        client.role = data['role']
+        return client
+
+    def _request(self, method, path, query=None, body=None):
+        url = self.base_url + path
+        query = {key: value for key, value in (query or {}).items() if value is not None}
+        if query:
+            url += '?' + urlencode(query)
+        headers = {'Content-Type': 'application/json'}
+        if self.token is not None:
+            headers['Authorization'] = f"Bearer {self.token}"
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        try:
+            with urlopen(Request(url, data=data, headers=headers, method=method), timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            if e.code == 400:
+                raise ValueError(message)
+            raise RemoteError(e.code, message)
+        except URLError as e:
+            raise RemoteError(None, f"Cannot reach {self.base_url}: {e.reason}")
+
+    def get_patient(self, patient_id):
+        try:
+            data = self._request('GET', f"/patients/{quote(str(patient_id), safe='')}")
+        except RemoteError as e:
+            if e.status == 404:
+                return None
+            raise
+        patient = Patient(data['patient_id'], data['gender'], data['race'], data['ethnicity'],
+                          data['age'], data['zip_code'], data['insurance'])
+        patient.add_visits((visit['Visit_ID'], visit['Visit_time']) for visit in data['visits'])
+        return patient
+
+    def add_patient(self, patient):
+        visits = list(patient.visits)
+        body = {'patient_id': patient.patient_id, 'gender': patient.gender, 'race': patient.race,
+                'ethnicity': patient.ethnicity, 'age': patient.age, 'zip_code': patient.zip_code,
+                'insurance': patient.insurance}
+        if visits:
+            body.update(visit_id=visits[0]['Visit_ID'], visit_time=visits[0]['Visit_time'])
+        self._request('POST', '/patients', body=body)
+        for visit in visits[1:]:
+            self.add_visit(patient.patient_id, visit['Visit_ID'], visit['Visit_time'])
+
+    def add_visit(self, patient_id, visit_id, visit_time):
+        self._request('POST', f"/patients/{quote(str(patient_id), safe='')}/visits",
+                      body={'visit_id': visit_id, 'visit_time': visit_time})
+
+    def remove_patient(self, patient_id):
+        self._request('DELETE', f"/patients/{quote(str(patient_id), safe='')}")
+
+    def count_visits_on_date(self, date):
+        return self._request('GET', '/visits/count', {'date': date_arg(date)})['count']
+
+    def count_visits_between(self, start, end):
+        return self._request('GET', '/visits/count', {'start': date_arg(start), 'end': date_arg(end)})['count']
+
+    def visits_per_day(self, start=None, end=None):
+        return self._request('GET', '/statistics', {'start': date_arg(start), 'end': date_arg(end)})['visits_per_day']
+
+    def visit_statistics(self, start=None, end=None, group_by=(), per_day=True):
+        data = self._request('GET', '/statistics', {'start': date_arg(start), 'end': date_arg(end),
+                                                    'group_by': ','.join(group_by), 'per_day': int(per_day)})
+        if 'rows' not in data:
+            return {(day,): count for day, count in data['visits_per_day'].items()}
+        return {tuple(row[:-1]): row[-1] for row in data['rows']}
+
+    def get_note_by_id(self, note_id):
+        try:
+            return self._request('GET', f"/notes/{quote(str(note_id), safe='')}")['note_text']
+        except RemoteError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def search_notes(self, query, limit=20):
+        return [result[:4] for result in self.search_note_snippets(query, limit)]
+
+    def search_note_snippets(self, query, limit=20):
+        results = self._request('GET', '/notes/search', {'q': query, 'limit': limit})['results']
+        return [(r['note_id'], r['patient_id'], r['visit_id'], r['score'], r.get('snippet', '')) for r in results]
+
+    def compact(self):
+        # The server compacts its own journal.
+        pass
@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import json
+import math
+import re
+import secrets
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from activity_log import ActivityLogger
+from authentication import find_user
+from classes import Patient, PatientDatabase
+from dates import format_day, summarize, to_ordinal
+from utils import generate_random_id
+
+# Same permissions as PatientApp.show_menu.
+CARE = ('nurse', 'clinician')
+STATUS_TEXT = {200: 'OK', 201: 'Created', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden',
+               404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+               500: 'Internal Server Error'}
+MAX_BODY = 2 ** 20
+BODY_METHODS = ('POST', 'PUT', 'PATCH')
+SESSION_TTL = 8 * 60 * 60
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def json_value(value):
+    # NaN from pandas is not valid JSON.
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def patient_json(patient):
+    return {
+        'patient_id': json_value(patient.patient_id),
+        'gender': json_value(patient.gender),
+        'race': json_value(patient.race),
+        'ethnicity': json_value(patient.ethnicity),
+        'age': json_value(patient.age),
+        'zip_code': json_value(patient.zip_code),
+        'insurance': json_value(patient.insurance),
+        'visits': [{'Visit_ID': json_value(visit['Visit_ID']), 'Visit_time': json_value(visit['Visit_time'])}
+                   for visit in patient.visits]
+    }
+
+
+def check_date(value, name='date'):
+    try:
+        return format_day(to_ordinal(value))
+    except (AttributeError, ValueError):
+        raise HTTPError(400, f"'{name}' must be a date in MM/DD/YYYY format")
+
+
+class Request:
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.params = {}
+        self.user = None
+
+    def arg(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "Request body must be JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return data
+
+
+async def read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    method = method.upper()
+    length = headers.get('content-length')
+    if length is None:
+        if method in BODY_METHODS:
+            raise HTTPError(400, "Content-Length is required")
+        length = '0'
+    if not length.isdigit():
+        raise HTTPError(400, "Content-Length must be a non-negative integer")
+    length = int(length)
+    if length > MAX_BODY:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    url = urlsplit(target)
+    return Request(method, unquote(url.path), parse_qs(url.query), headers, body)
+
+
+class PatientServer:
+    # One warm PatientDatabase behind a small HTTP/JSON API. Handlers run on
+    # a thread pool so reads proceed concurrently; writes additionally take
+    # an asyncio lock, so only one is in flight at a time. Clients log in
+    # once and send the returned token as "Authorization: Bearer <token>";
+    # a token expires session_ttl seconds after the login.
+    def __init__(self, patient_db, credentials_path='./Credentials.csv', log_path='./user_activity_log.txt',
+                 workers=4, session_ttl=SESSION_TTL):
+        self.patient_db = patient_db
+        self.session_ttl = session_ttl
+        self.credentials_path = credentials_path
+        self.logger = ActivityLogger(log_path)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api')
+        self.write_lock = asyncio.Lock()
+        self.sessions = {}
+        self.routes = []
+        self.route('POST', '/login', None, self.login)
+        self.route('GET', '/patients/(?P<patient_id>[^/]+)', CARE, self.get_patient)
+        self.route('DELETE', '/patients/(?P<patient_id>[^/]+)', CARE, self.remove_patient, write=True)
+        self.route('POST', '/patients', CARE, self.add_patient, write=True)
+        self.route('POST', '/patients/(?P<patient_id>[^/]+)/visits', CARE, self.add_visit, write=True)
+        self.route('GET', '/visits/count', CARE + ('admin',), self.count_visits)
+        self.route('GET', '/statistics', ('management',), self.statistics)
+        self.route('GET', '/notes/search', CARE, self.search_notes)
+        self.route('GET', '/notes/(?P<note_id>[^/]+)', CARE, self.get_note)
+
+    def route(self, method, pattern, roles, handler, write=False):
+        self.routes.append((method, re.compile(pattern + '$'), roles, handler, write))
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = request.headers.get('connection', '').lower() != 'close'
+                    status, payload = await self.dispatch(request)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                body = json.dumps(payload).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+                             + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request):
+        allowed = False
+        for method, pattern, roles, handler, write in self.routes:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            allowed = True
+            if method != request.method:
+                continue
+            request.params = match.groupdict()
+            if roles is not None:
+                request.user = self.session_user(request)
+                if request.user.role not in roles:
+                    raise HTTPError(403, f"Role '{request.user.role}' may not do this")
+            started = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            try:
+                if write:
+                    async with self.write_lock:
+                        result = await loop.run_in_executor(self.executor, handler, request)
+                else:
+                    result = await loop.run_in_executor(self.executor, handler, request)
+            except HTTPError:
+                raise
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+            except Exception as e:
+                raise HTTPError(500, f"{type(e).__name__}: {e}")
+            status, payload, action, details = result
+            if action is not None and request.user is not None:
+                self.logger.log(action, request.user.username, request.user.role,
+                                time.perf_counter() - started, **details)
+            return status, payload
+        if allowed:
+            raise HTTPError(405, f"{request.method} is not supported on {request.path}")
+        raise HTTPError(404, f"No such endpoint: {request.path}")
+
+    def session_user(self, request):
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        session = self.sessions.get(token.strip()) if scheme.lower() == 'bearer' else None
+        if session is None:
+            raise HTTPError(401, "Log in first and send 'Authorization: Bearer <token>'")
+        user, expires = session
+        if time.monotonic() >= expires:
+            self.sessions.pop(token.strip(), None)
+            raise HTTPError(401, "Session expired; log in again")
+        return user
+
+    # Handlers run on the executor and return (status, payload, logged action, details).
+
+    def login(self, request):
+        data = request.json()
+        username, password = str(data.get('username', '')), str(data.get('password', ''))
+        user = find_user(username, password, self.credentials_path)
+        if user is None:
+            self.logger.log('failed_login', username, 'Unknown', source='api')
+            raise HTTPError(401, "Invalid credentials")
+        now = time.monotonic()
+        # Drop expired sessions here so tokens that are never used again do
+        # not pile up.
+        for stale in [token for token, (_, expires) in list(self.sessions.items()) if now >= expires]:
+            self.sessions.pop(stale, None)
+        token = secrets.token_urlsafe(24)
+        self.sessions[token] = (user, now + self.session_ttl)
+        self.logger.log('login', username, user.role, source='api')
+        return 200, {'token': token, 'username': username, 'role': user.role}, None, {}
+
+    def find_patient(self, patient_id):
+        patient = self.patient_db.get_patient(patient_id)
+        if patient is None:
+            raise HTTPError(404, f"Patient {patient_id} not found")
+        return patient
+
+    def get_patient(self, request):
+        patient_id = request.params['patient_id']
+        patient = self.find_patient(patient_id)
+        return 200, patient_json(patient), 'retrieve_patient', {'patient_id': patient_id}
+
+    def add_patient(self, request):
+        data = request.json()
+        patient_id = str(data.get('patient_id', '')).strip()
+        if not patient_id:
+            raise HTTPError(400, "'patient_id' is required")
+        if self.patient_db.get_patient(patient_id) is not None:
+            raise HTTPError(400, f"Patient {patient_id} already exists; add a visit instead")
+        patient = Patient(patient_id, data.get('gender'), data.get('race'), data.get('ethnicity'),
+                          data.get('age'), data.get('zip_code'), data.get('insurance'))
+        if data.get('visit_time'):
+            patient.add_visit(data.get('visit_id') or generate_random_id(), data['visit_time'])
+        self.patient_db.add_patient(patient)
+        return 201, patient_json(self.find_patient(patient_id)), 'add_patient', {'patient_id': patient_id}
+
+    def add_visit(self, request):
+        data = request.json()
+        patient = self.find_patient(request.params['patient_id'])
+        if not data.get('visit_time'):
+            raise HTTPError(400, "'visit_time' is required")
+        visit_id = data.get('visit_id') or generate_random_id()
+        self.patient_db.add_visit(patient.patient_id, visit_id, data['visit_time'])
+        return 201, {'patient_id': json_value(patient.patient_id), 'Visit_ID': visit_id,
+                     'Visit_time': data['visit_time']}, 'add_patient', {'patient_id': request.params['patient_id']}
+
+    def remove_patient(self, request):
+        patient = self.find_patient(request.params['patient_id'])
+        self.patient_db.remove_patient(patient.patient_id)
+        return 200, {'removed': json_value(patient.patient_id)}, 'remove_patient', \
+            {'patient_id': request.params['patient_id']}
+
+    def count_visits(self, request):
+        if request.arg('date') is not None:
+            target_date = check_date(request.arg('date'))
+            count = self.patient_db.count_visits_on_date(target_date)
+            return 200, {'date': target_date, 'count': count}, 'count_visits', {'date': target_date}
+        start, end = check_date(request.arg('start'), 'start'), check_date(request.arg('end'), 'end')
+        count = self.patient_db.count_visits_between(start, end)
+        return 200, {'start': start, 'end': end, 'count': count}, 'count_visits', {'start': start, 'end': end}
+
+    def statistics(self, request):
+        start = request.arg('start')
+        end = request.arg('end')
+        start = None if start is None else check_date(start, 'start')
+        end = None if end is None else check_date(end, 'end')
+        group_by = [value for value in request.arg('group_by', '').split(',') if value]
+        per_day = request.arg('per_day', '1') not in ('0', 'false', 'no')
+        if not group_by and per_day:
+            counts = self.patient_db.visits_per_day(start, end)
+            return 200, {'visits_per_day': counts}, 'generate_statistics', {}
+        groups = self.patient_db.visit_statistics(start, end, group_by, per_day)
+        columns = (['date'] if per_day else []) + group_by + ['count']
+        rows = [list(group) + [count] for group, count in groups.items()]
+        return 200, {'columns': columns, 'rows': rows}, 'generate_statistics', {'group_by': ','.join(group_by)}
+
+    def get_note(self, request):
+        note_id = request.params['note_id']
+        note = self.patient_db.get_note_by_id(note_id)
+        if note is None:
+            raise HTTPError(404, f"Note {note_id} not found")
+        return 200, {'note_id': note_id, 'note_text': note}, 'view_note', {'note_id': note_id}
+
+    def search_notes(self, request):
+        query = request.arg('q', '')
+        limit = int(request.arg('limit', 20))
+        # Each hit carries a snippet, so listing results does not need a
+        # GET /notes/{id} per hit, which would be logged as a view.
+        results = [{'note_id': note_id, 'patient_id': patient_id, 'visit_id': visit_id, 'score': score,
+                    'snippet': snippet}
+                   for note_id, patient_id, visit_id, score, snippet
+                   in self.patient_db.search_note_snippets(query, limit)]
+        return 200, {'results': results}, 'search_notes', {'query': query, 'results': len(results)}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.patient_db.compact()
+        self.logger.close()
+
+
+async def serve(app, host, port):
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    # Stop cleanly on SIGTERM as well as Ctrl+C, so the journal is compacted
+    # and the activity log flushed.
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    print(f"Serving on http://{host}:{port}", flush=True)
+    async with server:
+        await stop.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON API for the patient database")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--patients', default='./Patient_data.csv')
+    parser.add_argument('--credentials', default='./Credentials.csv')
+    parser.add_argument('--log', default='./user_activity_log.txt')
+    parser.add_argument('--workers', type=int, default=4, help="Threads handling requests (default: %(default)s)")
+    parser.add_argument('--session-ttl', type=float, default=SESSION_TTL,
+                        help="Seconds a login token stays valid (default: %(default)s)")
+    # Rewriting a large Patient_data.csv stalls every request for seconds, so
+    # the server lets the journal grow longer than the GUI does; it is
+    # compacted on shutdown as well.
+    parser.add_argument('--compact-every', type=int, default=50000,
+                        help="Rewrite Patient_data.csv after this many journaled changes (default: %(default)s)")
+    args = parser.parse_args()
+
+    patient_db = PatientDatabase(args.patients, compact_every=args.compact_every)
+    # Build the visit index up front rather than on the first count request.
+    # SQLite counts with its own index instead.
+    if not patient_db.store.indexed:
+        patient_db.visit_index()
+    summary = summarize(patient_db.unparsed_visit_times)
+    if summary:
+        print(summary, file=sys.stderr)
+    app = PatientServer(patient_db, args.credentials, args.log, args.workers, args.session_ttl)
+    try:
+        asyncio.run(serve(app, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+import argparse
+import os
+import sqlite3
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from dates import visit_days
+from journal import PatientJournal, atomic_write_csv
+from metrics import timed
+from note_search import NoteSearch, search_fts
+from note_store import NoteStore
+
+PATIENT_COLUMNS = ['Patient_ID', 'Gender', 'Race', 'Ethnicity', 'Age', 'Zip_code', 'Insurance']
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def visit_columns(columns):
+    slots = []
+    for col in columns:
+        if col.startswith("Visit_ID_"):
+            index = col.split("_")[-1]
+            slots.append((col, f"Visit_time_{index}"))
+    return slots
+
+
+def load_visit_table(df):
+    # Melt the wide Visit_ID_n/Visit_time_n layout into one row per visit,
+    # ordered by patient row and then visit slot. Empty slots are dropped.
+    slots = visit_columns(df.columns)
+    if not slots:
+        return pd.DataFrame({'row': np.array([], dtype=np.int64), 'Visit_ID': [], 'Visit_time': []})
+    ids = df[[id_col for id_col, _ in slots]].to_numpy(dtype=object)
+    times = np.empty_like(ids)
+    for j, (_, time_col) in enumerate(slots):
+        times[:, j] = df[time_col].to_numpy(dtype=object) if time_col in df.columns else None
+    present = ~(pd.isna(ids) & pd.isna(times))
+    rows, cols = np.nonzero(present)
+    return pd.DataFrame({'row': rows, 'Visit_ID': ids[rows, cols], 'Visit_time': times[rows, cols]})
+
+
+def patient_record(patient):
+    return [patient.patient_id, patient.gender, patient.race, patient.ethnicity,
+            patient.age, patient.zip_code, patient.insurance]
+
+
+def iter_patients(rows, bounds, visit_ids, visit_times):
+    for i, row in enumerate(rows):
+        start, end = bounds[i], bounds[i + 1]
+        yield row, list(zip(visit_ids[start:end], visit_times[start:end]))
+
+
+class CSVStore:
+    # The original wide Patient_data.csv snapshot plus an append-only journal
+    # of changes made since the last compaction.
+    indexed = False
+
+    def __init__(self, file_path, notes_path='./Notes.csv'):
+        self.file_path = file_path
+        self.notes_path = notes_path
+        self.journal = PatientJournal(file_path + '.journal')
+        self._note_search = None
+        self.snapshot = None
+
+    @property
+    def pending(self):
+        return self.journal.count
+
+    def locked(self):
+        # Held while reading the snapshot and journal, appending, and
+        # compacting, so another process's changes are never lost in between.
+        return self.journal.locked()
+
+    def new_records(self):
+        # Changes other processes journaled since we last read or wrote.
+        return self.journal.read_new()
+
+    def changed(self):
+        # Whether another process rewrote the snapshot since we read it.
+        return self._signature() != self.snapshot
+
+    def _signature(self):
+        stat = os.stat(self.file_path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def load_patient_table(self):
+        # (patient rows, visit bounds, visit IDs, visit times): the visits of
+        # row i are positions bounds[i] to bounds[i + 1] of the two lists.
+        with timed('csv.read_patients'):
+            self.snapshot = self._signature()
+            df = pd.read_csv(self.file_path)
+            visits = load_visit_table(df)
+        rows = visits['row'].to_numpy()
+        bounds = np.searchsorted(rows, np.arange(len(df) + 1)).tolist()
+        columns = [df[col].tolist() for col in PATIENT_COLUMNS]
+        return list(zip(*columns)), bounds, visits['Visit_ID'].tolist(), visits['Visit_time'].tolist()
+
+    def load_patients(self):
+        return iter_patients(*self.load_patient_table())
+
+    def pending_records(self):
+        return self.journal.replay()
+
+    def load_notes(self):
+        return NoteStore(self.notes_path)
+
+    def record(self, record):
+        self.journal.append(record)
+
+    def search_notes(self, query, limit):
+        if self._note_search is None:
+            self._note_search = NoteSearch(self.notes_path)
+        return self._note_search.search(query, limit)
+
+    def save_patients(self, patients):
+        patient_data = []
+        for patient in patients.values():
+            row = dict(zip(PATIENT_COLUMNS, patient_record(patient)))
+            for idx, visit in enumerate(patient.visits, 1):
+                row[f"Visit_ID_{idx}"] = visit.get('Visit_ID')
+                row[f"Visit_time_{idx}"] = visit.get('Visit_time')
+            patient_data.append(row)
+        with timed('csv.write_patients'):
+            df = pd.DataFrame(patient_data)
+            atomic_write_csv(df, self.file_path)
+        self.snapshot = self._signature()
+        # Replaying the journal is idempotent, so a crash between the rename
+        # above and this clear does not duplicate any change.
+        self.journal.clear()
+
+    def close(self):
+        self.journal.close()
+        if self._note_search is not None:
+            self._note_search.close()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id PRIMARY KEY, gender, race, ethnicity, age, zip_code, insurance
+);
+CREATE TABLE IF NOT EXISTS visits (
+    id INTEGER PRIMARY KEY, patient_id, visit_id, visit_time, visit_day INTEGER
+);
+CREATE TABLE IF NOT EXISTS notes (
+    note_id TEXT PRIMARY KEY, patient_id, visit_id, note_text
+);
+CREATE INDEX IF NOT EXISTS visits_patient ON visits (patient_id);
+CREATE INDEX IF NOT EXISTS visits_day ON visits (visit_day);
+CREATE INDEX IF NOT EXISTS notes_patient ON notes (patient_id);
+CREATE INDEX IF NOT EXISTS notes_visit ON notes (visit_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    note_text, content='notes', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts (rowid, note_text) VALUES (new.rowid, new.note_text);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, note_text) VALUES ('delete', old.rowid, old.note_text);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, note_text) VALUES ('delete', old.rowid, old.note_text);
+    INSERT INTO notes_fts (rowid, note_text) VALUES (new.rowid, new.note_text);
+END;
+"""
+
+
+class SQLiteNotes:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def get(self, note_id, default=None):
+        row = self.conn.execute("SELECT note_text FROM notes WHERE note_id = ?", (str(note_id),)).fetchone()
+        return default if row is None else row[0]
+
+    def for_patient(self, patient_id):
+        rows = self.conn.execute("SELECT note_id FROM notes WHERE patient_id = ? ORDER BY rowid", (str(patient_id),))
+        return [row[0] for row in rows]
+
+    def for_visit(self, visit_id):
+        rows = self.conn.execute("SELECT note_id FROM notes WHERE visit_id = ? ORDER BY rowid", (str(visit_id),))
+        return [row[0] for row in rows]
+
+    def __contains__(self, note_id):
+        return self.get(note_id) is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def close(self):
+        # The connection belongs to the store, which closes it.
+        pass
+
+
+class SQLiteStore:
+    # Long-format storage: one row per patient, visit and note. Every change
+    # is committed immediately; pending counts the changes made since the
+    # visit aggregate was last saved, so compaction only has to save that.
+    # Single patients and visit counts come from indexed queries.
+    indexed = True
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.pending = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        has_search = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'").fetchone() is not None
+        self.conn.executescript(SCHEMA)
+        if not has_search:
+            # Databases migrated before note search existed.
+            with self.conn:
+                self.conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+
+    def load_patient_table(self):
+        visits = {}
+        for patient_id, visit_id, visit_time in self.conn.execute(
+                "SELECT patient_id, visit_id, visit_time FROM visits ORDER BY id"):
+            visits.setdefault(patient_id, []).append((visit_id, visit_time))
+        rows = self.conn.execute(
+            "SELECT patient_id, gender, race, ethnicity, age, zip_code, insurance FROM patients ORDER BY rowid").fetchall()
+        bounds, visit_ids, visit_times = [0], [], []
+        for row in rows:
+            for visit_id, visit_time in visits.get(row[0], ()):
+                visit_ids.append(visit_id)
+                visit_times.append(visit_time)
+            bounds.append(len(visit_ids))
+        return rows, bounds, visit_ids, visit_times
+
+    def load_patients(self):
+        return iter_patients(*self.load_patient_table())
+
+    def pending_records(self):
+        return []
+
+    def load_notes(self):
+        return SQLiteNotes(self.conn)
+
+    def record(self, record):
+        op = record['op']
+        patient_id = record['Patient_ID']
+        with self.conn:
+            if op == 'add_patient':
+                cursor = self.conn.execute("INSERT OR IGNORE INTO patients VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                           [record[col] for col in PATIENT_COLUMNS])
+                if cursor.rowcount:
+                    self._insert_visits((patient_id, visit_id, visit_time) for visit_id, visit_time in record['visits'])
+            elif op == 'add_visit':
+                if self.get_patient(patient_id) is not None:
+                    self._insert_visits([(patient_id, record['Visit_ID'], record['Visit_time'])])
+            elif op == 'remove_patient':
+                self.conn.execute("DELETE FROM visits WHERE patient_id = ?", (patient_id,))
+                self.conn.execute("DELETE FROM patients WHERE patient_id = ?", (patient_id,))
+        self.pending += 1
+
+    def checkpoint(self):
+        self.pending = 0
+
+    def locked(self):
+        return nullcontext()
+
+    def new_records(self):
+        return []
+
+    def changed(self):
+        return False
+
+    def save_patients(self, patients):
+        with self.conn:
+            self.conn.execute("DELETE FROM visits")
+            self.conn.execute("DELETE FROM patients")
+            self.conn.executemany("INSERT INTO patients VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                  (patient_record(patient) for patient in patients.values()))
+            self._insert_visits((patient.patient_id, visit.get('Visit_ID'), visit.get('Visit_time'))
+                                for patient in patients.values() for visit in patient.visits)
+        self.checkpoint()
+
+    def save_notes(self, notes):
+        # Delete before inserting, rather than INSERT OR REPLACE, so the
+        # triggers keep the search index in step.
+        with self.conn:
+            for note in notes:
+                self.conn.execute("DELETE FROM notes WHERE note_id = ?", (note[0],))
+                self.conn.execute("INSERT INTO notes VALUES (?, ?, ?, ?)", note)
+
+    def search_notes(self, query, limit):
+        return search_fts(self.conn, "notes_fts", "notes", "rowid", query, limit)
+
+    def _insert_visits(self, visits):
+        visits = list(visits)
+        days = visit_days([visit_time for _, _, visit_time in visits])
+        self.conn.executemany(
+            "INSERT INTO visits (patient_id, visit_id, visit_time, visit_day) VALUES (?, ?, ?, ?)",
+            (visit + (day,) for visit, day in zip(visits, days)))
+
+    def get_patient(self, patient_id):
+        row = self.conn.execute(
+            "SELECT patient_id, gender, race, ethnicity, age, zip_code, insurance FROM patients WHERE patient_id = ?",
+            (patient_id,)).fetchone()
+        if row is None:
+            return None
+        visits = self.conn.execute("SELECT visit_id, visit_time FROM visits WHERE patient_id = ? ORDER BY id",
+                                   (patient_id,)).fetchall()
+        return row, visits
+
+    def count_visits_between(self, start_day, end_day):
+        return self.conn.execute("SELECT COUNT(*) FROM visits WHERE visit_day BETWEEN ? AND ?",
+                                 (start_day, end_day)).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+def open_store(file_path, notes_path='./Notes.csv'):
+    if os.path.splitext(file_path)[1].lower() in SQLITE_EXTENSIONS:
+        return SQLiteStore(file_path)
+    return CSVStore(file_path, notes_path)
+
+
+def migrate(patients_path, notes_path, db_path):
+    from classes import PatientDatabase
+
+    source = PatientDatabase(patients_path, store=CSVStore(patients_path, notes_path))
+    target = SQLiteStore(db_path)
+    target.save_patients(source.patients)
+    notes = pd.read_csv(notes_path)
+    target.save_notes(zip(notes['Note_ID'].astype(str).tolist(), notes['Patient_ID'].astype(str).tolist(),
+                          notes['Visit_ID'].astype(str).tolist(), notes['Note_text'].tolist()))
+    visit_count = target.conn.execute("SELECT COUNT(*) FROM visits").fetchone()[0]
+    print(f"Migrated {len(source.patients)} patient(s), {visit_count} visit(s) "
+          f"and {len(target.load_notes())} note(s) into {db_path}")
+    target.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Patient data storage tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="Convert the CSV data files into a SQLite database")
+    migrate_parser.add_argument('database', help="Path of the SQLite database to create")
+    migrate_parser.add_argument('--patients', default='./Patient_data.csv')
+    migrate_parser.add_argument('--notes', default='./Notes.csv')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate(args.patients, args.notes, args.database)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from dates import format_day, parse_days, to_ordinal
+
+DEFAULT_CHUNKSIZE = 50000
+
+
+def visit_time_columns(file_path):
+    columns = pd.read_csv(file_path, nrows=0).columns
+    return [col for col in columns if col.startswith("Visit_time_")]
+
+
+def iter_visit_days(file_path, chunksize=DEFAULT_CHUNKSIZE, unparsed=None):
+    # Day ordinals per chunk; visit times without a date are left out and
+    # tallied in `unparsed` when it is given.
+    columns = visit_time_columns(file_path)
+    if not columns:
+        return
+    for chunk in pd.read_csv(file_path, usecols=columns, dtype=str, chunksize=chunksize):
+        values = chunk.to_numpy(dtype=object).ravel()
+        yield parse_days(values[pd.notna(values)], unparsed)
+
+
+def tally_days(days, counts):
+    unique, day_counts = np.unique(days, return_counts=True)
+    counts.update(dict(zip(unique.tolist(), day_counts.tolist())))
+    return counts
+
+
+def count_days(file_path, chunksize=DEFAULT_CHUNKSIZE, unparsed=None):
+    # Only one chunk and one counter per distinct day are held at a time.
+    counts = Counter()
+    for days in iter_visit_days(file_path, chunksize, unparsed):
+        tally_days(days, counts)
+    return counts
+
+
+def format_daily_counts(counts, start=None, end=None):
+    first = None if start is None else to_ordinal(start)
+    last = None if end is None else to_ordinal(end)
+    return {
+        format_day(day): count
+        for day, count in sorted(counts.items())
+        if (first is None or day >= first) and (last is None or day <= last)
+    }
+
+
+def visits_per_day(file_path, start=None, end=None, chunksize=DEFAULT_CHUNKSIZE, unparsed=None):
+    return format_daily_counts(count_days(file_path, chunksize, unparsed), start, end)
+
+
+def count_visits_between(file_path, start, end, chunksize=DEFAULT_CHUNKSIZE, unparsed=None):
+    first, last = to_ordinal(start), to_ordinal(end)
+    total = 0
+    for days in iter_visit_days(file_path, chunksize, unparsed):
+        total += int(np.count_nonzero((days >= first) & (days <= last)))
+    return total
+
+
+def count_visits_on_date(file_path, target_date, chunksize=DEFAULT_CHUNKSIZE, unparsed=None):
+    return count_visits_between(file_path, target_date, target_date, chunksize, unparsed)
+
+
+class StreamingStatistics:
+    # Same statistics methods as PatientDatabase, answered by streaming the
+    # CSV snapshot in chunks instead of loading it. Changes still pending in
+    # the journal are not included. unparsed_visit_times holds the visit
+    # times without a date seen by the last scan.
+    def __init__(self, file_path, chunksize=DEFAULT_CHUNKSIZE):
+        self.file_path = file_path
+        self.chunksize = chunksize
+        self.unparsed_visit_times = Counter()
+
+    def visits_per_day(self, start=None, end=None):
+        self.unparsed_visit_times = Counter()
+        return visits_per_day(self.file_path, start, end, self.chunksize, self.unparsed_visit_times)
+
+    def count_visits_between(self, start, end):
+        self.unparsed_visit_times = Counter()
+        return count_visits_between(self.file_path, start, end, self.chunksize, self.unparsed_visit_times)
+
+    def count_visits_on_date(self, target_date):
+        return self.count_visits_between(target_date, target_date)
@@ -1,24 +1,98 @@
 import tkinter as tk
-from tkinter import messagebox, simpledialog
+from tkinter import messagebox, simpledialog, ttk
+import argparse
+import functools
 import os
+import sys
+import time
 from datetime import datetime
-from classes import PatientDatabase, Patient, User
-from authentication import authenticate_user
+from activity_log import ActivityLogger
+from cache import get_database, shared_cache
+from classes import Patient, User
+from dates import summarize
+import metrics
+from authentication import find_user
+from remote import RemoteDatabase
 from utils import generate_random_id
-import pandas as pd
+from workers import BackgroundRunner
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 class PatientApp:
-    def __init__(self, root):
+    def __init__(self, root, server_url=None, profiler=None):
         self.root = root
+        self.server_url = server_url
+        self.profiler = profiler
         self.root.title("Patient Management System")
         self.username = None
         self.user = None
         self.patient_db = None
+        self.runner = BackgroundRunner(root)
+        self.progress_window = None
+        self.job = None
+        self.logger = ActivityLogger(os.path.join(BASE_DIR, "user_activity_log.txt"))
+        self.action_started = None
 
         self.login_screen()
 
+    def run_in_background(self, message, fn, *args, on_done=None, write=False, on_cancel=None):
+        self.show_progress(message, cancellable=not write, on_cancel=on_cancel)
+        # Work and rendering are timed apart, so a slow action shows whether
+        # the time went to the data or to Tk.
+        name = getattr(fn, '__name__', 'job')
+        work = metrics.timed('ui.work.' + name)(fn)
+        if self.profiler is not None:
+            work = functools.partial(self.profiler.runcall, work)
+
+        def done(result):
+            self.hide_progress()
+            if on_done is not None:
+                with metrics.timed('ui.render.' + name):
+                    on_done(result)
+
+        def failed(error):
+            self.hide_progress()
+            messagebox.showerror("Error", str(error))
+
+        self.job = self.runner.submit(work, *args, on_done=done, on_error=failed, write=write)
+
+    def lookup(self, message, fn, *args, on_done):
+        # In thin-client mode a lookup is an HTTP request, so it runs off the
+        # main thread like any other slow call. Local lookups answer at once.
+        if self.server_url is None:
+            on_done(fn(*args))
+        else:
+            self.run_in_background(message, fn, *args, on_done=on_done)
+
+    def show_progress(self, message, cancellable=True, on_cancel=None):
+        self.hide_progress()
+        window = tk.Toplevel(self.root)
+        window.title("Working")
+        window.transient(self.root)
+        window.protocol("WM_DELETE_WINDOW", lambda: None)
+        tk.Label(window, text=message).pack(padx=20, pady=(10, 5))
+        bar = ttk.Progressbar(window, mode="indeterminate", length=200)
+        bar.pack(padx=20, pady=5)
+        bar.start(10)
+        if cancellable:
+            tk.Button(window, text="Cancel", command=lambda: self.cancel_job(on_cancel)).pack(pady=(5, 10))
+        window.grab_set()
+        self.progress_window = window
+
+    def hide_progress(self):
+        if self.progress_window is not None:
+            self.progress_window.grab_release()
+            self.progress_window.destroy()
+            self.progress_window = None
+
+    def cancel_job(self, on_cancel=None):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+        self.hide_progress()
+        if on_cancel is not None:
+            on_cancel()
+
     def login_screen(self):
         for widget in self.root.winfo_children():
             widget.destroy()
@@ -32,68 +106,101 @@ class PatientApp:
         self.username_entry.grid(row=0, column=1)
         self.password_entry.grid(row=1, column=1)
 
-        tk.Button(self.root, text="Login", command=self.authenticate).grid(row=2, columnspan=2)
+        tk.Button(self.root, text="Login", command=self.action(self.authenticate)).grid(row=2, columnspan=2)
 
     def authenticate(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
 
-        users = User.from_csv(os.path.join(BASE_DIR, 'Credentials.csv'))
-        self.user = users.get(username)
+        if self.server_url is not None:
+            # Thin client: the server checks the password and holds the data.
+            self.username = username
+            self.run_in_background("Logging in...", RemoteDatabase.login, self.server_url, username, password,
+                                   on_done=self.finish_remote_login)
+            return
 
-        if self.user and self.user.authenticate(password):
+        self.user = find_user(username, password, os.path.join(BASE_DIR, 'Credentials.csv'))
+
+        if self.user:
             self.username = username
-            self.patient_db = PatientDatabase(os.path.join(BASE_DIR, 'Patient_data.csv'))
-            self.show_menu()
-            self.log_activity("login")
+            self.run_in_background("Loading patient data...", get_database,
+                                   os.path.join(BASE_DIR, 'Patient_data.csv'),
+                                   on_done=self.finish_login, on_cancel=self.login_screen)
         else:
             self.log_activity("failed_login", username=username)
             messagebox.showerror("Error", "Invalid credentials")
 
+    def finish_remote_login(self, patient_db):
+        self.user = User(patient_db.username, None, patient_db.role)
+        self.finish_login(patient_db)
+
+    def finish_login(self, patient_db):
+        self.patient_db = patient_db
+        self.show_menu()
+        self.log_activity("login")
+
+    def action(self, handler):
+        # Remember when the button was pressed so the log records how long the
+        # whole action took.
+        def run():
+            self.action_started = time.perf_counter()
+            handler()
+        return run
+
     def show_menu(self):
         for widget in self.root.winfo_children():
             widget.destroy()
 
         role = self.user.role
         if role == "management":
-            tk.Button(self.root, text="Generate key statistics", command=self.generate_statistics).pack(pady=5)
+            tk.Button(self.root, text="Generate key statistics", command=self.action(self.generate_statistics)).pack(pady=5)
             tk.Button(self.root, text="Exit", command=self.root.quit).pack(pady=5)
         elif role in ["nurse", "clinician"]:
-            tk.Button(self.root, text="Retrieve Patient", command=self.retrieve_patient).pack(pady=5)
-            tk.Button(self.root, text="Add Patient", command=self.add_patient).pack(pady=5)
-            tk.Button(self.root, text="Remove Patient", command=self.remove_patient).pack(pady=5)
-            tk.Button(self.root, text="Count Visits", command=self.count_visits).pack(pady=5)
-            tk.Button(self.root, text="View Note", command=self.view_note).pack(pady=5)
+            tk.Button(self.root, text="Retrieve Patient", command=self.action(self.retrieve_patient)).pack(pady=5)
+            tk.Button(self.root, text="Add Patient", command=self.action(self.add_patient)).pack(pady=5)
+            tk.Button(self.root, text="Remove Patient", command=self.action(self.remove_patient)).pack(pady=5)
+            tk.Button(self.root, text="Count Visits", command=self.action(self.count_visits)).pack(pady=5)
+            tk.Button(self.root, text="View Note", command=self.action(self.view_note)).pack(pady=5)
+            tk.Button(self.root, text="Search Notes", command=self.action(self.search_notes)).pack(pady=5)
             tk.Button(self.root, text="Exit", command=self.root.quit).pack(pady=5)
         elif role == "admin":
-            tk.Button(self.root, text="Count Visits", command=self.count_visits).pack(pady=5)
+            tk.Button(self.root, text="Count Visits", command=self.action(self.count_visits)).pack(pady=5)
+            tk.Button(self.root, text="Diagnostics", command=self.show_diagnostics).pack(pady=5)
             tk.Button(self.root, text="Exit", command=self.root.quit).pack(pady=5)
 
     def retrieve_patient(self):
         patient_id = simpledialog.askstring("Input", "Enter Patient ID:")
         if not patient_id:
             return
-        patient = self.patient_db.patients.get(patient_id)
-        if patient:
-            visits = '\n'.join([f"{v['Visit_ID']} at {v['Visit_time']}" for v in patient.visits])
-            info = (f"Patient ID: {patient.patient_id}\nGender: {patient.gender}\nRace: {patient.race}\n"
-                    f"Ethnicity: {patient.ethnicity}\nAge: {patient.age}\nZip Code: {patient.zip_code}\n"
-                    f"Insurance: {patient.insurance}\nVisits:\n{visits}")
-            messagebox.showinfo("Patient Info", info)
-        else:
-            messagebox.showerror("Error", "Patient not found.")
-        self.log_activity("retrieve_patient")
+
+        def show_patient(patient):
+            if patient:
+                visits = '\n'.join([f"{v['Visit_ID']} at {v['Visit_time']}" for v in patient.visits])
+                info = (f"Patient ID: {patient.patient_id}\nGender: {patient.gender}\nRace: {patient.race}\n"
+                        f"Ethnicity: {patient.ethnicity}\nAge: {patient.age}\nZip Code: {patient.zip_code}\n"
+                        f"Insurance: {patient.insurance}\nVisits:\n{visits}")
+                messagebox.showinfo("Patient Info", info)
+            else:
+                messagebox.showerror("Error", "Patient not found.")
+            self.log_activity("retrieve_patient", patient_id=patient_id)
+
+        self.lookup("Retrieving patient...", self.patient_db.get_patient, patient_id, on_done=show_patient)
 
     def add_patient(self):
         patient_id = simpledialog.askstring("Input", "Enter Patient ID:")
         if not patient_id:
             return
+        self.lookup("Looking up patient...", self.patient_db.get_patient, patient_id,
+                    on_done=lambda patient: self.add_patient_or_visit(patient_id, patient))
 
-        if patient_id in self.patient_db.patients:
+    def add_patient_or_visit(self, patient_id, patient):
+        if patient is not None:
             visit_time = simpledialog.askstring("Input", "Enter Visit Time:")
             visit_id = generate_random_id()
-            self.patient_db.patients[patient_id].add_visit(visit_id, visit_time)
-            messagebox.showinfo("Success", f"Visit added for patient {patient_id}")
+            self.run_in_background("Saving visit...", self.save_change, self.patient_db.add_visit,
+                                   patient.patient_id, visit_id, visit_time, write=True,
+                                   on_done=lambda _: self.finish_change(
+                                       "add_patient", f"Visit added for patient {patient_id}", patient_id=patient_id))
         else:
             gender = simpledialog.askstring("Input", "Enter Gender:")
             race = simpledialog.askstring("Input", "Enter Race:")
@@ -105,23 +212,36 @@ class PatientApp:
             visit_id = generate_random_id()
             new_patient = Patient(patient_id, gender, race, ethnicity, age, zip_code, insurance)
             new_patient.add_visit(visit_id, visit_time)
-            self.patient_db.patients[patient_id] = new_patient
-            messagebox.showinfo("Success", f"New patient {patient_id} added.")
+            self.run_in_background("Saving patient...", self.save_change, self.patient_db.add_patient,
+                                   new_patient, write=True,
+                                   on_done=lambda _: self.finish_change(
+                                       "add_patient", f"New patient {patient_id} added.", patient_id=patient_id))
 
-        self.patient_db.save_patient_data()
-        self.log_activity("add_patient")
+    def save_change(self, change, *args):
+        change(*args)
+        if self.server_url is None:
+            shared_cache.refresh(self.patient_db.file_path)
+
+    def finish_change(self, action, message, **details):
+        messagebox.showinfo("Success", message)
+        self.log_activity(action, **details)
 
     def remove_patient(self):
         patient_id = simpledialog.askstring("Input", "Enter Patient ID to remove:")
         if not patient_id:
             return
-        if patient_id in self.patient_db.patients:
-            del self.patient_db.patients[patient_id]
-            self.patient_db.save_patient_data()
-            messagebox.showinfo("Success", f"Patient {patient_id} removed.")
+        self.lookup("Looking up patient...", self.patient_db.get_patient, patient_id,
+                    on_done=lambda patient: self.remove_found_patient(patient_id, patient))
+
+    def remove_found_patient(self, patient_id, patient):
+        if patient is not None:
+            self.run_in_background("Removing patient...", self.save_change, self.patient_db.remove_patient,
+                                   patient.patient_id, write=True,
+                                   on_done=lambda _: self.finish_change(
+                                       "remove_patient", f"Patient {patient_id} removed.", patient_id=patient_id))
         else:
             messagebox.showerror("Error", "Patient not found.")
-        self.log_activity("remove_patient")
+            self.log_activity("remove_patient", patient_id=patient_id)
 
     def count_visits(self):
         date_input = simpledialog.askstring("Input", "Enter date (MM/DD/YYYY):")
@@ -133,67 +253,126 @@ class PatientApp:
             messagebox.showerror("Error", "Invalid date format.")
             return
 
-        df = pd.read_csv(os.path.join(BASE_DIR, 'Patient_data.csv'))
-        visit_time_columns = [col for col in df.columns if col.startswith("Visit_time")]
+        def show_count(visit_count):
+            messagebox.showinfo("Visit Count", f"Total visits on {target_date}: {visit_count}")
+            self.log_activity("count_visits", date=target_date)
 
-        visit_count = 0
-        for col in visit_time_columns:
-            for val in df[col].dropna():
-                val = str(val).strip()
-                try:
-                    visit_date = datetime.strptime(val.split()[0], "%m/%d/%Y").strftime("%m/%d/%Y")
-                    if visit_date == target_date:
-                        visit_count += 1
-                except:
-                    continue
-
-        messagebox.showinfo("Visit Count", f"Total visits on {target_date}: {visit_count}")
-        self.log_activity("count_visits")
+        self.run_in_background("Counting visits...", self.patient_db.count_visits_on_date, target_date,
+                               on_done=show_count)
 
     def view_note(self):
         note_id = simpledialog.askstring("Input", "Enter Note ID:")
         if not note_id:
             return
-        note = self.patient_db.get_note_by_id(note_id)
-        if note:
-            messagebox.showinfo(f"Note {note_id}", note)
-        else:
-            messagebox.showerror("Error", "Note not found.")
-        self.log_activity("view_note")
+
+        def show_note(note):
+            if note:
+                messagebox.showinfo(f"Note {note_id}", note)
+            else:
+                messagebox.showerror("Error", "Note not found.")
+            self.log_activity("view_note", note_id=note_id)
+
+        self.lookup("Loading note...", self.patient_db.get_note_by_id, note_id, on_done=show_note)
+
+    def search_notes(self):
+        query = simpledialog.askstring("Input", "Search notes (words, \"phrases\", AND, OR, NOT):")
+        if not query:
+            return
+
+        def show_results(results):
+            if results:
+                lines = [f"Note {note_id} (patient {patient_id}, visit {visit_id}, score {score}): {snippet}"
+                         for note_id, patient_id, visit_id, score, snippet in results]
+                messagebox.showinfo(f"Notes matching {query}", "\n".join(lines))
+            else:
+                messagebox.showinfo("Search Notes", "No matching notes.")
+            self.log_activity("search_notes", query=query, results=len(results))
+
+        self.run_in_background("Searching notes...", self.patient_db.search_note_snippets, query,
+                               on_done=show_results)
 
     def generate_statistics(self):
-        df = pd.read_csv(os.path.join(BASE_DIR, 'Patient_data.csv'))
-        visit_time_columns = [col for col in df.columns if col.startswith("Visit_time")]
-
-        visits_per_day = {}
-        for col in visit_time_columns:
-            for val in df[col].dropna():
-                val = str(val).strip()
-                try:
-                    visit_date = datetime.strptime(val.split()[0], "%m/%d/%Y").strftime("%m/%d/%Y")
-                    visits_per_day[visit_date] = visits_per_day.get(visit_date, 0) + 1
-                except:
-                    continue
+        self.run_in_background("Generating statistics...", self.patient_db.visits_per_day,
+                               on_done=self.show_statistics)
 
+    def show_statistics(self, visits_per_day):
         if not visits_per_day:
             messagebox.showinfo("Stats", "No visit times found.")
             return
 
-        stats_str = "\n".join([f"{date}: {count} visit(s)" for date, count in sorted(visits_per_day.items())])
+        stats_str = "\n".join([f"{date}: {count} visit(s)" for date, count in visits_per_day.items()])
+        summary = summarize(getattr(self.patient_db, 'unparsed_visit_times', {}))
+        if summary:
+            stats_str += "\n\n" + summary
         messagebox.showinfo("Key Statistics", stats_str)
         self.log_activity("generate_statistics")
 
-    def log_activity(self, action, username=None, role=None):
-        log_file = os.path.join(BASE_DIR, "user_activity_log.txt")
+    def show_diagnostics(self):
+        # Live p50/p95 per operation from the metrics registry, refreshed
+        # every second while the window is open.
+        window = tk.Toplevel(self.root)
+        window.title("Diagnostics")
+        enabled = tk.BooleanVar(value=metrics.registry.enabled)
+        tk.Checkbutton(window, text="Collect metrics", variable=enabled,
+                       command=lambda: metrics.enable(enabled.get())).pack(anchor="w", padx=10, pady=(10, 0))
+        columns = ("count", "p50", "p95", "max")
+        table = ttk.Treeview(window, columns=columns, height=15)
+        table.heading("#0", text="Operation")
+        for column in columns:
+            table.heading(column, text=column if column == "count" else f"{column} (ms)")
+            table.column(column, width=80, anchor="e")
+        table.pack(fill="both", expand=True, padx=10, pady=5)
+        tk.Button(window, text="Reset", command=metrics.registry.reset).pack(side="left", padx=10, pady=(0, 10))
+        tk.Button(window, text="Close", command=window.destroy).pack(side="right", padx=10, pady=(0, 10))
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            latencies, counters = metrics.registry.snapshot()
+            table.delete(*table.get_children())
+            for name, row in sorted(latencies.items()):
+                table.insert("", "end", text=name, values=(row['count'], f"{row['p50'] * 1000:.2f}",
+                                                          f"{row['p95'] * 1000:.2f}", f"{row['max'] * 1000:.2f}"))
+            for name, value in sorted(counters.items()):
+                table.insert("", "end", text=name, values=(value, "", "", ""))
+            window.after(1000, refresh)
+
+        refresh()
+
+    def log_activity(self, action, username=None, role=None, **details):
         log_username = username if username is not None else getattr(self, 'username', 'Unknown')
         log_role = role if role is not None else getattr(getattr(self, 'user', None), 'role', 'Unknown')
-    
-        with open(log_file, "a") as f:
-            f.write(f"{datetime.now()}, {log_username}, {log_role}, {action}\n")
+        duration = None if self.action_started is None else time.perf_counter() - self.action_started
+        if duration is not None:
+            metrics.registry.observe('ui.' + action, duration)
+        self.logger.log(action, log_username, log_role, duration, **details)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Patient Management System")
+    parser.add_argument('--server', help="Use a running server.py (e.g. http://127.0.0.1:8080) instead of "
+                                         "loading the data files")
+    parser.add_argument('--metrics', action='store_true',
+                        help="Record operation latencies from the start (admins can also turn this on "
+                             "under Diagnostics) and print them on exit")
+    parser.add_argument('--profile', nargs='?', const='', metavar='FILE',
+                        help="Profile the session with cProfile, print the slowest calls on exit and "
+                             "optionally save the stats to FILE")
+    args = parser.parse_args()
+
+    metrics.enable(args.metrics)
+    profiler = metrics.Profiler() if args.profile is not None else None
+    if profiler is not None:
+        profiler.start()
     root = tk.Tk()
-    app = PatientApp(root)
+    app = PatientApp(root, args.server, profiler)
     root.mainloop()
+    app.runner.shutdown()
+    app.logger.close()
+    if app.patient_db is not None:
+        app.patient_db.compact()
+    if profiler is not None:
+        profiler.report(args.profile)
+    if metrics.registry.enabled:
+        print(metrics.registry.report(), file=sys.stderr)
 
 #Comment added to make commit and show basic version control functionality
@@ -0,0 +1,118 @@
+import bisect
+import threading
+from array import array
+
+import numpy as np
+
+from dates import format_day, to_ordinal
+
+
+class VisitIndex:
+    # Columnar view of every visit, sorted by visit date (day ordinals) so that
+    # date and range counts are binary searches instead of full scans. Visits
+    # added later go to a small sorted buffer that is merged into the arrays
+    # once it grows past merge_every, so a write never copies the whole index.
+    def __init__(self, patient_ids, visit_ids, days, skipped=0, merge_every=4096):
+        order = np.argsort(days, kind='stable')
+        self.patient_ids = patient_ids[order]
+        self.visit_ids = visit_ids[order]
+        self.days = days[order]
+        self.skipped = skipped
+        self.merge_every = merge_every
+        self._recent = []
+        self._recent_days = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_patients(cls, patients):
+        # Patients of one database share a VisitStore, so the columns come
+        # from its typed arrays in one step per store.
+        groups = {}
+        for patient in patients.values():
+            visits = patient.visits
+            group = groups.get(id(visits.store))
+            if group is None:
+                group = groups[id(visits.store)] = (visits.store, [], [], array('q'))
+            group[1].append(patient.patient_id)
+            group[2].append(len(visits))
+            group[3].extend(visits.offsets)
+        patient_ids, visit_ids, days = [], [], []
+        skipped = 0
+        for store, owners, counts, offsets in groups.values():
+            owner_ids = np.empty(len(owners), dtype=object)
+            owner_ids[:] = owners
+            ids, store_days, dated = store.columns(offsets)
+            patient_ids.append(np.repeat(owner_ids, counts)[dated])
+            visit_ids.append(ids[dated])
+            days.append(store_days[dated])
+            skipped += int(len(dated) - np.count_nonzero(dated))
+        if not groups:
+            return cls(np.array([], dtype=object), np.array([], dtype=object), np.array([], dtype=np.int64))
+        return cls(np.concatenate(patient_ids), np.concatenate(visit_ids), np.concatenate(days), skipped)
+
+    def __len__(self):
+        return len(self.days) + len(self._recent_days)
+
+    def add(self, patient_id, visit_id, day):
+        if day is None:
+            self.skipped += 1
+            return
+        with self._lock:
+            self._recent.append((patient_id, visit_id, day))
+            bisect.insort(self._recent_days, day)
+            if len(self._recent) >= self.merge_every:
+                self._merge()
+
+    def _merge(self):
+        if not self._recent:
+            return
+        patient_ids, visit_ids, days = zip(*self._recent)
+        added_ids = np.empty(len(patient_ids), dtype=object)
+        added_ids[:] = patient_ids
+        added_visits = np.empty(len(visit_ids), dtype=object)
+        added_visits[:] = visit_ids
+        all_days = np.concatenate([self.days, np.array(days, dtype=np.int64)])
+        order = np.argsort(all_days, kind='stable')
+        self.patient_ids = np.concatenate([self.patient_ids, added_ids])[order]
+        self.visit_ids = np.concatenate([self.visit_ids, added_visits])[order]
+        self.days = all_days[order]
+        self._recent = []
+        self._recent_days = []
+
+    def remove_patient(self, patient_id, skipped=0):
+        with self._lock:
+            self._merge()
+            keep = self.patient_ids != patient_id
+            self.patient_ids = self.patient_ids[keep]
+            self.visit_ids = self.visit_ids[keep]
+            self.days = self.days[keep]
+            self.skipped -= skipped
+
+    def count_between(self, start, end):
+        first, last = to_ordinal(start), to_ordinal(end)
+        with self._lock:
+            lo = np.searchsorted(self.days, first, side='left')
+            hi = np.searchsorted(self.days, last, side='right')
+            recent = bisect.bisect_right(self._recent_days, last) - bisect.bisect_left(self._recent_days, first)
+        return int(max(hi - lo, 0)) + max(recent, 0)
+
+    def count_on(self, day):
+        return self.count_between(day, day)
+
+    def daily_counts(self, start=None, end=None):
+        with self._lock:
+            lo = 0 if start is None else np.searchsorted(self.days, to_ordinal(start), side='left')
+            hi = len(self.days) if end is None else np.searchsorted(self.days, to_ordinal(end), side='right')
+            days = self.days[lo:hi]
+            recent = [day for day in self._recent_days
+                      if (start is None or day >= to_ordinal(start)) and (end is None or day <= to_ordinal(end))]
+        if recent:
+            days = np.sort(np.concatenate([days, np.array(recent, dtype=np.int64)]))
+        if len(days) == 0:
+            return {}
+        first = int(days[0])
+        counts = np.bincount(days - first)
+        return {
+            format_day(first + int(offset)): int(counts[offset])
+            for offset in np.flatnonzero(counts)
+        }
@@ -0,0 +1,164 @@
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from dates import (EPOCH_ORDINAL, INVALID, MISSING, RAW, SECONDS_PER_DAY, day_of, format_time, has_date,
+                   parse_times, tally_unparsed)
+
+
+def encode_id(value):
+    # Returns the int to store, or None when the ID needs the side table.
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if -2 ** 63 <= value < 2 ** 63 else None
+    if isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 63:
+        # pandas reads an ID column with empty slots as floats.
+        return int(value)
+    if hasattr(value, 'dtype') and value.dtype.kind in 'iu':
+        return encode_id(int(value))
+    return None
+
+
+class VisitStore:
+    # Every visit of a database in three typed arrays indexed by offset:
+    # int64 visit IDs, int64 epoch seconds and a dates.py code per time.
+    # IDs that are not ints and times that would not print back unchanged
+    # are kept in side tables keyed by offset; such times still have their
+    # epoch when they contain a date. Removed patients leave their
+    # offsets unused until the data is loaded again.
+    def __init__(self):
+        self.ids = array('q')
+        self.times = array('q')
+        self.formats = array('b')
+        self.other_ids = {}
+        self.raw_times = {}
+        # Visit times without a date, counted as they are added.
+        self.unparsed = Counter()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, visit_id, visit_time):
+        return self.extend([(visit_id, visit_time)])[0]
+
+    def extend(self, visits):
+        visits = list(visits)
+        return self.extend_columns([visit_id for visit_id, _ in visits], [visit_time for _, visit_time in visits])
+
+    def extend_columns(self, visit_ids, visit_times):
+        # Bulk append of two parallel lists; returns the range of new offsets.
+        # Times are parsed as one column by dates.parse_times.
+        start = len(self.ids)
+        epochs, codes = parse_times(visit_times)
+        ids = []
+        for offset, visit_id in enumerate(visit_ids, start):
+            number = visit_id if type(visit_id) is int and -2 ** 63 <= visit_id < 2 ** 63 else encode_id(visit_id)
+            if number is None:
+                self.other_ids[offset] = visit_id
+                number = 0
+            ids.append(number)
+        for i in np.flatnonzero((codes == RAW) | (codes == INVALID)).tolist():
+            self.raw_times[start + i] = visit_times[i]
+        tally_unparsed(visit_times, codes, self.unparsed)
+        self.ids.extend(ids)
+        self.times.frombytes(epochs.astype(np.int64).tobytes())
+        self.formats.frombytes(codes.astype(np.int8).tobytes())
+        return range(start, len(self.ids))
+
+    def visit_id(self, offset):
+        if offset in self.other_ids:
+            return self.other_ids[offset]
+        return self.ids[offset]
+
+    def visit_time(self, offset):
+        code = self.formats[offset]
+        if code == MISSING:
+            return None
+        if code < 0:
+            return self.raw_times[offset]
+        return format_time(self.times[offset], code)
+
+    def columns(self, offsets):
+        # (visit IDs, day ordinals, has-date mask) for an array of offsets,
+        # read from the typed arrays without going through each visit.
+        offsets = np.asarray(offsets, dtype=np.int64)
+        ids = np.array(self.ids, dtype=np.int64)[offsets].astype(object)
+        for i in np.flatnonzero(np.isin(offsets, list(self.other_ids))).tolist():
+            ids[i] = self.other_ids[int(offsets[i])]
+        days = np.array(self.times, dtype=np.int64)[offsets] // SECONDS_PER_DAY + EPOCH_ORDINAL
+        dated = np.array(self.formats, dtype=np.int8)[offsets] >= RAW
+        return ids, days, dated
+
+    def day(self, offset):
+        if has_date(self.formats[offset]):
+            return day_of(self.times[offset])
+        return None
+
+
+class Visit:
+    # Read-only stand-in for the old {'Visit_ID': ..., 'Visit_time': ...} dict.
+    __slots__ = ('_store', '_offset')
+
+    def __init__(self, store, offset):
+        self._store = store
+        self._offset = offset
+
+    def __getitem__(self, key):
+        if key == 'Visit_ID':
+            return self._store.visit_id(self._offset)
+        if key == 'Visit_time':
+            return self._store.visit_time(self._offset)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ['Visit_ID', 'Visit_time']
+
+    def __repr__(self):
+        return repr({key: self[key] for key in self.keys()})
+
+
+class VisitList:
+    # Read-only sequence of one patient's visits.
+    __slots__ = ('_store', '_offsets')
+
+    def __init__(self, store, offsets):
+        self._store = store
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Visit(self._store, offset) for offset in self._offsets[index]]
+        return Visit(self._store, self._offsets[index])
+
+    def __iter__(self):
+        store = self._store
+        return (Visit(store, offset) for offset in self._offsets)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    def ids(self):
+        return [self._store.visit_id(offset) for offset in self._offsets]
+
+    def days(self):
+        # Day ordinals, or None for times that do not parse.
+        return [self._store.day(offset) for offset in self._offsets]
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    def __init__(self, future, on_done, on_error):
+        self.future = future
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancelled = False
+
+    def cancel(self):
+        # A job that already started keeps running, but its result is dropped.
+        self.cancelled = True
+        self.future.cancel()
+
+
+class BackgroundRunner:
+    # Runs slow work off the Tk main thread. Tk widgets may only be touched
+    # from the main thread, so finished jobs are picked up by polling with
+    # root.after and their callbacks run there. Writes go through a single
+    # worker so two of them never overlap.
+    def __init__(self, root, max_workers=2, poll_ms=50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._readers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ui-read')
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ui-write')
+        self._jobs = []
+        self._polling = False
+
+    def submit(self, fn, *args, on_done=None, on_error=None, write=False):
+        executor = self._writer if write else self._readers
+        job = Job(executor.submit(fn, *args), on_done, on_error)
+        self._jobs.append(job)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return job
+
+    def busy(self):
+        return any(not job.cancelled for job in self._jobs)
+
+    def _poll(self):
+        finished = [job for job in self._jobs if job.future.done()]
+        self._jobs = [job for job in self._jobs if not job.future.done()]
+        for job in finished:
+            if job.cancelled:
+                continue
+            error = job.future.exception()
+            if error is not None:
+                if job.on_error is not None:
+                    job.on_error(error)
+            elif job.on_done is not None:
+                job.on_done(job.future.result())
+        if self._jobs:
+            self.root.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        # Pending reads are abandoned, pending writes are allowed to finish.
+        self._readers.shutdown(wait=False, cancel_futures=True)
+        self._writer.shutdown(wait=True)
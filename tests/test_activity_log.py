@@ -0,0 +1,74 @@
+import glob
+import json
+import subprocess
+import sys
+
+from activity_log import ActivityLogger
+from conftest import SRC
+
+# Logs records and exits without close(), leaving the last batch to the
+# atexit hook. The long flush interval keeps the timer from writing it first.
+WRITER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from activity_log import ActivityLogger
+
+logger = ActivityLogger(sys.argv[2], batch_size=7, flush_interval=60, max_bytes=4096, backup_count=1000)
+for i in range(int(sys.argv[4])):
+    logger.log('test', sys.argv[3], 'nurse', seq=i)
+"""
+
+
+def test_records_survive_exit_and_rotation(tmp_path):
+    path = str(tmp_path / 'user_activity_log.txt')
+    processes, count = 4, 250
+    writers = [subprocess.Popen([sys.executable, '-c', WRITER, SRC, path, f'user{n}', str(count)])
+               for n in range(processes)]
+    for writer in writers:
+        assert writer.wait(timeout=60) == 0
+
+    files = glob.glob(path + '*')
+    assert len(files) > processes
+    records = []
+    for name in files:
+        with open(name) as f:
+            for line in f:
+                records.append(json.loads(line))
+    for n in range(processes):
+        assert sorted(record['seq'] for record in records if record['username'] == f'user{n}') == list(range(count))
+    assert len(records) == processes * count
+
+
+def test_failed_write_is_reported_and_retried(tmp_path, capsys):
+    path = tmp_path / 'user_activity_log.txt'
+    logger = ActivityLogger(str(path), batch_size=2, flush_interval=60)
+    write = logger._write
+    failures = []
+
+    def fail_once(records):
+        if not failures:
+            failures.append(len(records))
+            raise OSError(28, 'No space left on device')
+        write(records)
+
+    logger._write = fail_once
+    try:
+        logger.log('first', 'nurse1', 'nurse')
+        logger.log('second', 'nurse1', 'nurse')
+        # The failed batch is kept, and flush neither hangs nor loses it.
+        logger.flush()
+        logger.log('third', 'nurse1', 'nurse')
+        logger.flush()
+    finally:
+        logger.close()
+    assert failures == [2]
+    assert 'No space left on device' in capsys.readouterr().err
+    assert [json.loads(line)['action'] for line in path.read_text().splitlines()] == ['first', 'second', 'third']
+
+
+def test_close_returns_when_writes_keep_failing(tmp_path, capsys):
+    logger = ActivityLogger(str(tmp_path / 'missing' / 'user_activity_log.txt'), flush_interval=0.01)
+    logger.log('login', 'nurse1', 'nurse')
+    logger.flush()
+    logger.close()
+    assert 'dropped 1 record(s)' in capsys.readouterr().err
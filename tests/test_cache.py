@@ -0,0 +1,69 @@
+import threading
+
+from cache import DataCache
+from metrics import registry
+
+
+class Loaded:
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_slow_load_does_not_block_other_files(tmp_path):
+    slow, fast = tmp_path / 'slow.csv', tmp_path / 'fast.csv'
+    slow.write_text('a\n')
+    fast.write_text('b\n')
+    cache = DataCache()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_loader(path):
+        started.set()
+        release.wait(5)
+        return Loaded(path)
+
+    worker = threading.Thread(target=cache.get, args=('data', str(slow), slow_loader))
+    worker.start()
+    try:
+        assert started.wait(5)
+        # Loading another file goes through while the slow one is held up.
+        assert cache.get('data', str(fast), Loaded).path == str(fast)
+    finally:
+        release.set()
+        worker.join()
+    assert cache.stats() == {'hits': 0, 'misses': 2, 'entries': 2}
+
+
+def test_replaced_and_evicted_entries_are_closed(tmp_path):
+    paths = [tmp_path / f'{name}.csv' for name in 'abc']
+    for path in paths:
+        path.write_text('x\n')
+    cache = DataCache(max_entries=2)
+    first = cache.get('data', str(paths[0]), Loaded)
+    paths[0].write_text('changed\n')
+    second = cache.get('data', str(paths[0]), Loaded)
+    assert first.closed and not second.closed
+    cache.get('data', str(paths[1]), Loaded)
+    cache.get('data', str(paths[2]), Loaded)
+    assert second.closed
+
+
+def test_hits_and_misses_reach_the_registry(tmp_path):
+    path = tmp_path / 'a.csv'
+    path.write_text('x\n')
+    cache = DataCache()
+    registry.reset()
+    registry.enabled = True
+    try:
+        cache.get('data', str(path), Loaded)
+        cache.get('data', str(path), Loaded)
+        cache.get('data', str(path), Loaded)
+        counters = registry.snapshot()[1]
+    finally:
+        registry.enabled = False
+        registry.reset()
+    assert counters['cache.data.misses'] == 1
+    assert counters['cache.data.hits'] == 2
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+from conftest import SRC
+from classes import PatientDatabase
+
+CLI = os.path.join(SRC, 'cli.py')
+
+
+def write_data(directory):
+    # A non-numeric ID makes pandas read every Patient_ID as a string.
+    with open(os.path.join(directory, 'Patient_data.csv'), 'w') as f:
+        f.write("Patient_ID,Gender,Race,Ethnicity,Age,Zip_code,Insurance,Visit_ID_1,Visit_time_1\n"
+                "16755,Female,Asian,Hispanic,62,53449,Medicare,890528,01/02/2023\n"
+                "P-1,Male,Black,Hispanic,40,53634,Medicaid,118326,01/03/2023\n")
+    with open(os.path.join(directory, 'Notes.csv'), 'w') as f:
+        f.write(",Patient_ID,Visit_ID,Note_ID,Note_text\n0,16755,890528,1,Seen for a cough.\n")
+    with open(os.path.join(directory, 'Credentials.csv'), 'w') as f:
+        f.write(",username,password,role\n0,nurse1,secret,nurse\n")
+
+
+def cli(directory, *args):
+    return subprocess.run([sys.executable, CLI, '-u', 'nurse1', '-p', 'secret', *args], cwd=directory,
+                          capture_output=True, text=True, check=True).stdout
+
+
+def test_cli_visit_reaches_a_database_with_string_ids(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    write_data(directory)
+    monkeypatch.chdir(directory)
+    cli(directory, 'add-visit', '16755', '06/01/2023', '--visit-id', 'V1')
+    assert 'V1' in cli(directory, 'get-patient', '16755')
+
+    path = os.path.join(directory, 'Patient_data.csv')
+    patient_db = PatientDatabase(path)
+    assert list(patient_db.patients) == ['16755', 'P-1']
+    assert patient_db.get_patient('16755').visits.ids() == [890528, 'V1']
+    assert patient_db.count_visits_on_date('06/01/2023') == 1
+    patient_db.compact()
+    patient_db.store.close()
+    assert PatientDatabase(path).get_patient(16755).visits.ids() == [890528, 'V1']
+
+
+def test_open_database_keeps_cli_visits_when_it_compacts(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    write_data(directory)
+    monkeypatch.chdir(directory)
+    path = os.path.join(directory, 'Patient_data.csv')
+    patient_db = PatientDatabase(path, compact_every=3)
+    # cli.py writes while the database is open and compacting, which
+    # rewrites the snapshot and clears the journal.
+    writers = [subprocess.Popen([sys.executable, CLI, '-u', 'nurse1', '-p', 'secret', 'add-visit', 'P-1',
+                                 '06/01/2023', '--visit-id', f'C{i}'], cwd=directory) for i in range(6)]
+    added = 0
+    while any(writer.poll() is None for writer in writers):
+        patient_db.add_visit('16755', f'D{added}', '06/02/2023')
+        added += 1
+    assert all(writer.returncode == 0 for writer in writers)
+    patient_db.add_visit('16755', f'D{added}', '06/02/2023')
+    added += 1
+    patient_db.compact()
+    patient_db.store.close()
+    assert not os.path.exists(path + '.journal')
+
+    reloaded = PatientDatabase(path)
+    assert sorted(reloaded.get_patient('P-1').visits.ids()[1:]) == [f'C{i}' for i in range(6)]
+    assert reloaded.get_patient('16755').visits.ids()[1:] == [f'D{i}' for i in range(added)]
+    assert reloaded.count_visits_on_date('06/01/2023') == 6
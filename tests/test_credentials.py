@@ -0,0 +1,27 @@
+import os
+
+from authentication import find_user
+from credentials import CredentialIndex, index_path_for
+
+
+def write_credentials(path, password):
+    path.write_text(f",username,password,role\n0,nurse1,{password},nurse\n")
+
+
+def test_csv_edited_after_migration_is_not_ignored(tmp_path, capsys):
+    csv_path = tmp_path / 'Credentials.csv'
+    write_credentials(csv_path, 'old-secret')
+    index_path = index_path_for(str(csv_path))
+    CredentialIndex.build(index_path, [('nurse1', 'old-secret', 'nurse')], iterations=1000)
+    assert find_user('nurse1', 'old-secret', str(csv_path)).role == 'nurse'
+
+    write_credentials(csv_path, 'new-secret')
+    stat = os.stat(index_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert find_user('nurse1', 'old-secret', str(csv_path)) is None
+    assert find_user('nurse1', 'new-secret', str(csv_path)).role == 'nurse'
+    assert 'credentials.py migrate' in capsys.readouterr().err
+
+    CredentialIndex.build(index_path, [('nurse1', 'new-secret', 'nurse')], iterations=1000)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+    assert find_user('nurse1', 'new-secret', str(csv_path)).password is None
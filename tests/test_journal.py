@@ -0,0 +1,63 @@
+import json
+import signal
+import subprocess
+import sys
+
+from conftest import SRC
+from journal import PatientJournal, id_candidates, id_key
+
+# Appends numbered records forever and reports each one once append() has
+# fsynced it.
+WRITER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from journal import PatientJournal
+
+journal = PatientJournal(sys.argv[2])
+i = 0
+while True:
+    journal.append({'op': 'add_visit', 'Patient_ID': i, 'Visit_ID': 'v%d' % i, 'padding': 'x' * 500})
+    print(i, flush=True)
+    i += 1
+"""
+
+
+def test_killed_writer_keeps_fsynced_records(tmp_path):
+    path = str(tmp_path / 'Patient_data.csv.journal')
+    writer = subprocess.Popen([sys.executable, '-c', WRITER, SRC, path], stdout=subprocess.PIPE, text=True)
+    acknowledged = []
+    try:
+        for line in writer.stdout:
+            acknowledged.append(int(line))
+            if len(acknowledged) == 200:
+                break
+    finally:
+        writer.send_signal(signal.SIGKILL)
+        writer.wait()
+        writer.stdout.close()
+    # The kill may land between two appends, so leave a torn record behind
+    # the way an interrupted write would.
+    with open(path, 'ab') as f:
+        f.write(json.dumps({'op': 'add_visit', 'Patient_ID': -1}).encode('utf-8')[:20])
+
+    journal = PatientJournal(path)
+    records = journal.replay()
+
+    ids = [record['Patient_ID'] for record in records]
+    assert ids == list(range(len(ids)))
+    assert set(acknowledged) <= set(ids)
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert data.endswith(b'\n')
+    assert len(data.splitlines()) == len(records) == journal.count
+
+    # New appends start on a clean line and survive another reload.
+    journal.append({'op': 'remove_patient', 'Patient_ID': 'after'})
+    journal.close()
+    assert PatientJournal(path).replay()[-1] == {'op': 'remove_patient', 'Patient_ID': 'after'}
+
+
+def test_ids_are_stored_and_matched_in_one_form():
+    assert id_key(' 0042 ') == 42 and id_key('P-1') == 'P-1'
+    assert list(id_candidates('0042')) == ['0042', 42, '42']
+    assert list(id_candidates('P-1')) == ['P-1', 'P-1']
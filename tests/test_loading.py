@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+
+from classes import PatientDatabase, User
+from datagen import write_dataset
+
+
+def legacy_patients(path):
+    # The row-by-row loader PatientDatabase used before it was vectorized:
+    # {patient_id: (demographics, [(visit_id, visit_time), ...])}.
+    df = pd.read_csv(path)
+    patients = {}
+    for _, row in df.iterrows():
+        visits = []
+        for col in df.columns:
+            if col.startswith("Visit_ID"):
+                index = col.split("_")[-1]
+                visits.append((row[col], row.get(f"Visit_time_{index}", "")))
+        patients[row['Patient_ID']] = ([row['Gender'], row['Race'], row['Ethnicity'], row['Age'],
+                                        row['Zip_code'], row['Insurance']], visits)
+    return patients
+
+
+def blank(value):
+    return value is None or value != value
+
+
+def test_vectorized_load_matches_iterrows(tmp_path, monkeypatch):
+    write_dataset(str(tmp_path), patients=400, visits=6, notes=10, users=20, seed=3, messy=True)
+    monkeypatch.chdir(tmp_path)
+    path = os.path.join(str(tmp_path), 'Patient_data.csv')
+    expected = legacy_patients(path)
+    times = [time for _, visits in expected.values() for _, time in visits]
+    # The fixture has to contain what the test is about.
+    assert any(blank(time) for time in times) and any('-' in str(time) for time in times)
+
+    patients = PatientDatabase(path).patients
+    assert list(patients) == list(expected)
+    for patient_id, (demographics, visits) in expected.items():
+        patient = patients[patient_id]
+        assert [patient.gender, patient.race, patient.ethnicity, patient.age, patient.zip_code,
+                patient.insurance] == demographics
+        # The new loader leaves out padding slots with neither an ID nor a
+        # time; everything else comes back unchanged.
+        visits = [(visit_id, time) for visit_id, time in visits if not (blank(visit_id) and blank(time))]
+        loaded = [(visit['Visit_ID'], visit['Visit_time']) for visit in patient.visits]
+        assert len(loaded) == len(visits)
+        for (visit_id, time), (loaded_id, loaded_time) in zip(visits, loaded):
+            assert loaded_id == visit_id
+            assert loaded_time == time or blank(loaded_time) and blank(time)
+
+
+def test_users_match_iterrows(tmp_path):
+    write_dataset(str(tmp_path), patients=10, visits=1, notes=1, users=50)
+    path = os.path.join(str(tmp_path), 'Credentials.csv')
+    expected = {row['username']: (row['password'], row['role']) for _, row in pd.read_csv(path).iterrows()}
+    users = User.from_csv(path)
+    assert list(users) == list(expected)
+    assert {name: (user.password, user.role) for name, user in users.items()} == expected
@@ -0,0 +1,39 @@
+from note_search import NoteSearch
+
+HEADER = ",Patient_ID,Visit_ID,Note_ID,Note_text\n"
+
+
+def found(search, query):
+    return [note_id for note_id, _, _, _ in search.search(query)]
+
+
+def test_last_note_without_a_newline_is_indexed(tmp_path):
+    path = tmp_path / 'Notes.csv'
+    path.write_text(HEADER + "0,16755,890528,1,Seen for a cough.\n1,16755,890529,2,Follow-up on the rash")
+    search = NoteSearch(str(path))
+    try:
+        assert found(search, 'rash') == ['2']
+        # A row cut off inside a quoted field waits for the rest of it.
+        with open(path, 'a') as f:
+            f.write('\n2,P-1,118326,3,"Fever, seen')
+        assert found(search, 'fever') == []
+        with open(path, 'a') as f:
+            f.write(' again"\n')
+        assert found(search, 'fever') == ['3']
+        assert found(search, 'rash') == ['2']
+    finally:
+        search.close()
+
+
+def test_last_row_that_keeps_growing_is_reindexed(tmp_path):
+    path = tmp_path / 'Notes.csv'
+    path.write_text(HEADER + "0,16755,890528,1,Seen for a co")
+    search = NoteSearch(str(path))
+    try:
+        assert found(search, 'co') == ['1']
+        with open(path, 'a') as f:
+            f.write("ugh.\n")
+        assert found(search, 'cough') == ['1']
+        assert found(search, 'co') == []
+    finally:
+        search.close()
@@ -0,0 +1,68 @@
+import threading
+
+from note_store import NoteStore
+
+
+def write_notes(path, count, mode='w'):
+    with open(path, mode) as f:
+        if mode == 'w':
+            f.write(",Patient_ID,Visit_ID,Note_ID,Note_text\n")
+        for i in range(count):
+            f.write(f'{i},{i % 7},{i % 11},{i},"Note {i}, seen today."\n')
+
+
+def test_threads_share_a_store_while_notes_change(tmp_path):
+    path = str(tmp_path / 'Notes.csv')
+    write_notes(path, 200)
+    store = NoteStore(path)
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                for i in range(0, 200, 13):
+                    assert store.get(i) == f"Note {i}, seen today."
+                assert store.for_patient(3)
+        except Exception as error:
+            errors.append(error)
+            stop.set()
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    try:
+        # Each append changes Notes.csv, so every reader has to move to a
+        # new index while the others are still using the old one.
+        for _ in range(20):
+            write_notes(path, 5, mode='a')
+            store.get(0)
+    finally:
+        stop.set()
+        for thread in readers:
+            thread.join()
+    assert errors == []
+    assert len(store) == 200
+    store.close()
+
+
+def test_concurrent_first_reads_open_one_map(tmp_path):
+    path = str(tmp_path / 'Notes.csv')
+    write_notes(path, 50)
+    store = NoteStore(path)
+    snapshot = store._current()
+    maps = []
+    barrier = threading.Barrier(8)
+
+    def first_read():
+        barrier.wait()
+        store.get(1)
+        maps.append(snapshot._map)
+
+    threads = [threading.Thread(target=first_read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, maps))) == 1
+    store.close()
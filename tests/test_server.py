@@ -0,0 +1,102 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from classes import PatientDatabase
+from remote import RemoteDatabase, RemoteError
+from server import PatientServer
+
+
+def write_data(directory):
+    (directory / 'Patient_data.csv').write_text(
+        "Patient_ID,Gender,Race,Ethnicity,Age,Zip_code,Insurance,Visit_ID_1,Visit_time_1\n"
+        "16755,Female,Asian,Hispanic,62,53449,Medicare,890528,01/02/2023\n")
+    (directory / 'Notes.csv').write_text(
+        ",Patient_ID,Visit_ID,Note_ID,Note_text\n"
+        "0,16755,890528,1,\"Seen for a cough.\nNo fever.\"\n"
+        "1,16755,890528,2,Cough is better.\n")
+    (directory / 'Credentials.csv').write_text(",username,password,role\n0,nurse1,secret,nurse\n")
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # Runs the server on its own event loop thread, on a free port.
+    write_data(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    app = PatientServer(PatientDatabase(str(tmp_path / 'Patient_data.csv')), str(tmp_path / 'Credentials.csv'),
+                        str(tmp_path / 'user_activity_log.txt'))
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    stop = asyncio.Event()
+
+    async def run():
+        server = await asyncio.start_server(app.handle_connection, '127.0.0.1', 0)
+        app.url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        started.set()
+        async with server:
+            await stop.wait()
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(run(),))
+    thread.start()
+    assert started.wait(5)
+    yield app
+    loop.call_soon_threadsafe(stop.set)
+    thread.join()
+    loop.close()
+    app.close()
+
+
+def logged_actions(app):
+    app.logger.flush()
+    with open(app.logger.path) as f:
+        return [json.loads(line)['action'] for line in f]
+
+
+def test_search_results_carry_snippets_without_logging_views(server):
+    client = RemoteDatabase.login(server.url, 'nurse1', 'secret')
+    results = client.search_note_snippets('cough')
+    assert sorted((note_id, snippet) for note_id, _, _, _, snippet in results) == \
+        [('1', 'Seen for a cough.'), ('2', 'Cough is better.')]
+    assert logged_actions(server) == ['login', 'search_notes']
+    assert client.get_note_by_id('2') == 'Cough is better.'
+    assert logged_actions(server)[-1] == 'view_note'
+
+
+def raw_request(app, data):
+    host, port = app.url[len('http://'):].split(':')
+    with socket.create_connection((host, int(port)), timeout=5) as conn:
+        conn.sendall(data)
+        response = b''
+        while chunk := conn.recv(4096):
+            response += chunk
+    return response.split(b' ', 2)[1], json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+
+def test_bad_or_missing_content_length_is_a_bad_request(server):
+    status, payload = raw_request(server, b"POST /login HTTP/1.1\r\nContent-Length: ten\r\n\r\n")
+    assert status == b'400' and 'Content-Length' in payload['error']
+    status, payload = raw_request(server, b"POST /login HTTP/1.1\r\nContent-Length: -5\r\n\r\n")
+    assert status == b'400'
+    status, payload = raw_request(server, b"POST /login HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert status == b'400' and 'Content-Length is required' in payload['error']
+    body = b'{"username": "nurse1", "password": "secret"}'
+    status, payload = raw_request(server, b"POST /login HTTP/1.1\r\nConnection: close\r\nContent-Length: "
+                                  + str(len(body)).encode() + b"\r\n\r\n" + body)
+    assert status == b'200' and payload['role'] == 'nurse'
+
+
+def test_session_tokens_expire(server):
+    server.session_ttl = 0.2
+    client = RemoteDatabase.login(server.url, 'nurse1', 'secret')
+    assert client.get_patient('16755') is not None
+    time.sleep(0.3)
+    with pytest.raises(RemoteError) as error:
+        client.get_patient('16755')
+    assert error.value.status == 401
+    # Logging in again drops the expired session.
+    RemoteDatabase.login(server.url, 'nurse1', 'secret')
+    assert len(server.sessions) == 1
@@ -0,0 +1,81 @@
+import argparse
+import tracemalloc
+
+from classes import Patient, PatientDatabase
+from datagen import write_patient_file
+from FINAL_modularized import statistics_source
+from parallel import ParallelStatistics
+from streaming import StreamingStatistics
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def write_data(directory, patients, visits, seed, messy=False):
+    # PatientDatabase also opens ./Notes.csv, which these tests leave empty.
+    (directory / 'Notes.csv').write_text(",Patient_ID,Visit_ID,Note_ID,Note_text\n")
+    path = str(directory / 'Patient_data.csv')
+    write_patient_file(path, patients, visits, seed=seed, messy=messy)
+    return path
+
+
+def options(stream=False, workers=1, chunksize=500):
+    return argparse.Namespace(stream=stream, workers=workers, chunksize=chunksize)
+
+
+def test_streamed_counts_match_the_database_in_less_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = write_data(tmp_path, 5000, 6, seed=4, messy=True)
+
+    def in_memory():
+        patient_db = PatientDatabase(path)
+        return patient_db.visits_per_day(), patient_db.count_visits_on_date('03/15/2023')
+
+    def streamed():
+        stats = StreamingStatistics(path, chunksize=500)
+        return stats.visits_per_day(), stats.count_visits_on_date('03/15/2023')
+
+    expected, database_peak = peak_memory(in_memory)
+    result, streamed_peak = peak_memory(streamed)
+    assert result == expected
+    assert streamed_peak < database_peak / 2
+
+
+def test_parallel_counts_match_the_database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = write_data(tmp_path, 2000, 5, seed=6, messy=True)
+    patient_db = PatientDatabase(path)
+    # Small partitions, so rows are split across several workers.
+    stats = ParallelStatistics(path, 2, partition_bytes=20000)
+    assert stats.visits_per_day() == patient_db.visits_per_day()
+    assert stats.count_visits_on_date('03/15/2023') == patient_db.count_visits_on_date('03/15/2023')
+    assert stats.unparsed_visit_times == patient_db.unparsed_visit_times
+
+
+def test_file_statistics_fall_back_to_the_database_when_the_journal_has_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = write_data(tmp_path, 200, 3, seed=5)
+    patient_db, stats = statistics_source(options(stream=True), 'management', path)
+    assert patient_db is None and isinstance(stats, StreamingStatistics)
+    patient_db, stats = statistics_source(options(workers=2), 'admin', path)
+    assert patient_db is None and isinstance(stats, ParallelStatistics)
+
+    writer = PatientDatabase(path)
+    patient = Patient('NEW-1', 'Female', 'Asian', 'Hispanic', 30, '53449', 'Medicare')
+    patient.add_visit('V-NEW', '03/15/2023')
+    writer.add_patient(patient)
+    writer.close()
+
+    patient_db, stats = statistics_source(options(stream=True), 'management', path)
+    assert stats is patient_db
+    assert isinstance(statistics_source(options(workers=2), 'admin', path)[1], PatientDatabase)
+    assert stats.count_visits_on_date('03/15/2023') == PatientDatabase(path).count_visits_on_date('03/15/2023')
+    # Nurses write, so their counts always come from the database.
+    patient_db, stats = statistics_source(options(stream=True), 'nurse', path)
+    assert stats is patient_db
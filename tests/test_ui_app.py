@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+
+import pytest
+
+import ui_app
+
+
+class Widget:
+    # Any Tk widget or variable: accepts every call and does nothing.
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class Tk:
+    Toplevel = Label = Entry = Button = Checkbutton = BooleanVar = Widget
+
+
+class Ttk:
+    Progressbar = Treeview = Widget
+
+
+class Root(Widget):
+    # Headless Tk root. after() queues callbacks and pump() plays the main
+    # loop on the test thread.
+    def __init__(self):
+        self.queue = []
+
+    def after(self, ms, callback):
+        self.queue.append(callback)
+
+    def winfo_children(self):
+        return []
+
+    def pump(self, until, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not until() and time.monotonic() < deadline:
+            if self.queue:
+                self.queue.pop(0)()
+            time.sleep(0.001)
+        assert until(), "timed out waiting on the background job"
+
+
+class SlowDatabase:
+    def __init__(self):
+        self.release = threading.Event()
+        self.threads = []
+
+    def count_visits_on_date(self, date):
+        self.threads.append(threading.current_thread())
+        self.release.wait(5)
+        return 7
+
+
+class Dialogs:
+    def __init__(self, answer):
+        self.answer = answer
+        self.shown = []
+
+    def askstring(self, *args, **kwargs):
+        return self.answer
+
+    def showinfo(self, title, message):
+        self.shown.append((title, message, threading.current_thread()))
+
+    showerror = showinfo
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    dialogs = Dialogs('01/02/2024')
+    monkeypatch.setattr(ui_app, 'BASE_DIR', str(tmp_path))
+    monkeypatch.setattr(ui_app, 'tk', Tk)
+    monkeypatch.setattr(ui_app, 'ttk', Ttk)
+    monkeypatch.setattr(ui_app, 'messagebox', dialogs)
+    monkeypatch.setattr(ui_app, 'simpledialog', dialogs)
+    app = ui_app.PatientApp(Root())
+    app.dialogs = dialogs
+    yield app
+    app.runner.shutdown()
+    app.logger.close()
+
+
+def test_slow_database_call_runs_off_the_main_thread(app, tmp_path):
+    db = SlowDatabase()
+    app.patient_db = db
+    app.username = 'nurse1'
+    app.user = ui_app.User('nurse1', None, 'nurse')
+    app.count_visits()
+    # The button handler returned while the count is still running, so the
+    # main loop keeps going.
+    app.root.pump(lambda: db.threads)
+    assert db.threads[0] is not threading.main_thread()
+    assert app.dialogs.shown == [] and app.progress_window is not None
+    db.release.set()
+    app.root.pump(lambda: app.dialogs.shown)
+    title, message, thread = app.dialogs.shown[0]
+    # The result comes back through root.after, on the main thread.
+    assert thread is threading.main_thread()
+    assert message == "Total visits on 01/02/2024: 7"
+    assert app.progress_window is None
+    app.logger.flush()
+    record = json.loads((tmp_path / 'user_activity_log.txt').read_text())
+    assert record['action'] == 'count_visits' and record['date'] == '01/02/2024'
@@ -0,0 +1,92 @@
+import threading
+import time
+
+from workers import BackgroundRunner
+
+
+class StubRoot:
+    # Stands in for the Tk root: after() queues the callback and pump() plays
+    # the main loop, running queued callbacks on this thread.
+    def __init__(self):
+        self.queue = []
+        self.calls = 0
+
+    def after(self, ms, callback):
+        self.queue.append(callback)
+
+    def pump(self, until, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not until() and time.monotonic() < deadline:
+            if self.queue:
+                self.calls += 1
+                self.queue.pop(0)()
+            time.sleep(0.001)
+        assert until(), "timed out waiting on the background job"
+
+
+def test_main_loop_keeps_polling_while_a_job_runs():
+    root = StubRoot()
+    runner = BackgroundRunner(root, poll_ms=1)
+    release = threading.Event()
+    results = []
+    try:
+        runner.submit(release.wait, 5, on_done=results.append)
+        root.pump(lambda: root.calls >= 20, timeout=2)
+        assert runner.busy() and results == []
+        release.set()
+        root.pump(lambda: results)
+        assert results == [True]
+        assert not runner.busy()
+        # Polling stops once no job is left.
+        assert root.queue == []
+    finally:
+        release.set()
+        runner.shutdown()
+
+
+def test_result_and_error_callbacks_run_on_the_main_thread():
+    root = StubRoot()
+    runner = BackgroundRunner(root, poll_ms=1)
+    done, errors, threads = [], [], []
+
+    def on_done(result):
+        threads.append(threading.current_thread())
+        done.append(result)
+
+    def on_error(error):
+        threads.append(threading.current_thread())
+        errors.append(error)
+
+    try:
+        runner.submit(sum, [1, 2, 3], on_done=on_done, on_error=on_error)
+        runner.submit(int, 'not a number', on_done=on_done, on_error=on_error, write=True)
+        root.pump(lambda: done and errors)
+        assert done == [6]
+        assert isinstance(errors[0], ValueError)
+        assert threads == [threading.main_thread()] * 2
+    finally:
+        runner.shutdown()
+
+
+def test_cancelled_job_drops_its_result():
+    root = StubRoot()
+    runner = BackgroundRunner(root, poll_ms=1)
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'late'
+
+    try:
+        job = runner.submit(slow, on_done=results.append, on_error=results.append)
+        started.wait(5)
+        job.cancel()
+        assert not runner.busy()
+        release.set()
+        root.pump(lambda: job.future.done() and not root.queue)
+        assert results == []
+    finally:
+        release.set()
+        runner.shutdown()